@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from .databases import database_config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -44,6 +47,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "renovation.instrumentation.RequestMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -52,6 +56,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "renovation.routers.PrimaryAfterWriteMiddleware",
 ]
 
 ROOT_URLCONF = "bidii_project.urls"
@@ -77,13 +82,81 @@ WSGI_APPLICATION = "bidii_project.wsgi.application"
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# DATABASE_URL selects the primary (PostgreSQL in production, a local SQLite
+# file otherwise); DATABASE_REPLICA_URL adds a read replica for the read-only
+# views. Connection reuse and pooling: see bidii_project/databases.py.
 
 DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+    "default": database_config(
+        os.environ.get("DATABASE_URL", f"sqlite:///{BASE_DIR / 'db.sqlite3'}")
+    ),
+}
+if os.environ.get("DATABASE_REPLICA_URL"):
+    DATABASES["replica"] = {
+        **database_config(os.environ["DATABASE_REPLICA_URL"]),
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ["renovation.routers.ReplicaRouter"]
+
+# Seconds a user's reads stay on the primary after they write, to cover the
+# replica's replication lag
+RENOVATION_REPLICA_LAG = int(os.environ.get("RENOVATION_REPLICA_LAG", 5))
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Redis in production, a file cache or per-process memory locally.
+
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+        }
     }
+elif os.environ.get("CACHE_DIR"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.environ["CACHE_DIR"],
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Sessions
+# https://docs.djangoproject.com/en/5.2/topics/http/sessions/
+# SESSION_BACKEND picks where sessions live:
+# - db: a row read on every request.
+# - cached_db: read from the cache and written through to the database, so
+#   most requests skip the session query. This is the default with Redis.
+#   A per-process cache would serve other processes' stale sessions.
+# - signed_cookies: kept in the browser, with no server-side storage. A
+#   logout only clears the browser it happens in.
+
+SESSION_BACKENDS = {
+    "db": "django.contrib.sessions.backends.db",
+    "cached_db": "django.contrib.sessions.backends.cached_db",
+    "signed_cookies": "django.contrib.sessions.backends.signed_cookies",
 }
+SESSION_ENGINE = SESSION_BACKENDS[
+    os.environ.get(
+        "SESSION_BACKEND", "cached_db" if os.environ.get("REDIS_URL") else "db"
+    )
+]
+
+# Seconds a cached dashboard may be served before it is recomputed, even
+# if no change signal arrived (e.g. after a bulk queryset update).
+RENOVATION_DASHBOARD_CACHE_TIMEOUT = 300
+
+# Seconds a rendered list table or detail page is kept. Fragments are keyed
+# by per-user data versions, so this only bounds how long unused ones stay.
+RENOVATION_FRAGMENT_CACHE_TIMEOUT = 24 * 60 * 60
 
 
 # Password validation
@@ -144,6 +217,32 @@ CORS_ALLOWED_ORIGINS = [
     "http://127.0.0.1:3000",
 ]
 
+# Keyset pagination for the renovation list views
+RENOVATION_PAGE_SIZE = 50
+RENOVATION_MAX_PAGE_SIZE = 500
+
+# Change feed (renovation.changes): rows per response, and seconds the feed
+# stays behind now so that rows written by transactions still in flight are
+# not skipped.
+RENOVATION_CHANGES_BATCH_SIZE = 500
+RENOVATION_CHANGES_LAG = int(os.environ.get("RENOVATION_CHANGES_LAG", 10))
+
+# Request instrumentation (renovation.instrumentation): requests slower than
+# this are logged, as are requests repeating one query this many times.
+RENOVATION_SLOW_REQUEST_MS = int(os.environ.get("RENOVATION_SLOW_REQUEST_MS", 500))
+RENOVATION_DUPLICATE_QUERY_THRESHOLD = 5
+RENOVATION_SERVER_TIMING = True
+
+# Let async views (dashboard, lead/job detail, reports) run their independent
+# queries on separate connections at the same time (renovation.concurrency).
+RENOVATION_CONCURRENT_QUERIES = True
+
+# Background tasks (renovation.tasks): seconds a worker may hold a task
+# before another may take it over, and the first retry delay, doubled on
+# each further attempt.
+RENOVATION_TASK_VISIBILITY_TIMEOUT = 300
+RENOVATION_TASK_RETRY_DELAY = 30
+
 # REST Framework settings
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
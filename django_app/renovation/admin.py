@@ -1,75 +1,200 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.functional import cached_property
 from .models import (
-    Profile, Customer, Lead, SiteVisit, Estimate,
-    EstimateItem, Job, Material, Invoice, Payment
+    Profile, Customer, Lead, SiteVisit, SiteVisitPhoto, Estimate,
+    EstimateItem, Job, Material, Invoice, Payment, Task
 )
+from .bulk import set_status
+from .changes import batched_tombstones
+
+# Rows above which an unfiltered changelist shows PostgreSQL's row estimate
+# instead of counting
+ESTIMATED_COUNT_THRESHOLD = 100_000
+
+
+class EstimatedCountPaginator(Paginator):
+    """Page-number paginator for the admin that avoids COUNT(*) on big tables.
+
+    An unfiltered queryset on PostgreSQL is counted from the planner's
+    statistics (pg_class.reltuples, refreshed by autovacuum), which is free
+    but approximate. Filtered querysets, small tables and other databases
+    are counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where and not queryset.query.distinct:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT reltuples FROM pg_class WHERE oid = to_regclass(%s)', [queryset.model._meta.db_table])
+                row = cursor.fetchone()
+            if row and row[0] >= ESTIMATED_COUNT_THRESHOLD:
+                return int(row[0])
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelists that stay fast at millions of rows.
+
+    Subclasses fetch the related rows they display with list_select_related,
+    pick foreign keys with autocomplete widgets instead of dropdowns of the
+    whole table, and use date_hierarchy only on indexed fields. The total is
+    estimated on PostgreSQL and the unfiltered count is never run. Rollup
+    totals are shown read-only.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_readonly_fields(self, request, obj=None):
+        # Totals kept by renovation.rollups, which RollupModel.save() never writes
+        return [*super().get_readonly_fields(request, obj), *getattr(self.model, 'ROLLUP_FIELDS', ())]
+
+    def delete_queryset(self, request, queryset):
+        with batched_tombstones():
+            super().delete_queryset(request, queryset)
+
+
+def status_action(status, label, **values):
+    """Admin action moving the selected rows to `status` with one UPDATE"""
+    def action(modeladmin, request, queryset):
+        changed = set_status(queryset, status, **values)
+        modeladmin.message_user(request, f'{changed} {queryset.model._meta.verbose_name_plural} marked {label}.')
+
+    action.__name__ = f'mark_{status}'
+    return admin.action(description=f'Mark selected %(verbose_name_plural)s as {label}')(action)
 
 
 @admin.register(Profile)
-class ProfileAdmin(admin.ModelAdmin):
+class ProfileAdmin(LargeTableAdmin):
     list_display = ['full_name', 'email', 'role', 'company_name', 'created_at']
     list_filter = ['role', 'created_at']
     search_fields = ['full_name', 'email', 'company_name']
+    autocomplete_fields = ['user']
 
 
 @admin.register(Customer)
-class CustomerAdmin(admin.ModelAdmin):
+class CustomerAdmin(LargeTableAdmin):
     list_display = ['name', 'email', 'phone', 'city', 'state', 'created_at']
     list_filter = ['state', 'created_at']
     search_fields = ['name', 'email', 'phone', 'city']
+    autocomplete_fields = ['user']
+    date_hierarchy = 'created_at'
 
 
 @admin.register(Lead)
-class LeadAdmin(admin.ModelAdmin):
+class LeadAdmin(LargeTableAdmin):
     list_display = ['project_name', 'customer', 'status', 'estimated_value', 'created_at']
     list_filter = ['status', 'created_at']
+    list_select_related = ['customer']
     search_fields = ['project_name', 'description', 'customer__name']
+    autocomplete_fields = ['user', 'customer']
+    date_hierarchy = 'created_at'
+    actions = [status_action(value, label) for value, label in Lead.STATUS_CHOICES]
 
 
 @admin.register(SiteVisit)
-class SiteVisitAdmin(admin.ModelAdmin):
+class SiteVisitAdmin(LargeTableAdmin):
     list_display = ['lead', 'visit_date', 'created_at']
     list_filter = ['visit_date', 'created_at']
+    list_select_related = ['lead']
     search_fields = ['lead__project_name', 'notes']
+    autocomplete_fields = ['user', 'lead']
+
+
+@admin.register(SiteVisitPhoto)
+class SiteVisitPhotoAdmin(LargeTableAdmin):
+    list_display = ['name', 'site_visit', 'width', 'height', 'size', 'variants_ready', 'created_at']
+    list_filter = ['variants_ready', 'created_at']
+    list_select_related = ['site_visit__lead']
+    search_fields = ['name', 'sha256']
+    autocomplete_fields = ['user', 'site_visit']
 
 
 @admin.register(Estimate)
-class EstimateAdmin(admin.ModelAdmin):
+class EstimateAdmin(LargeTableAdmin):
     list_display = ['estimate_number', 'lead', 'status', 'total_amount', 'valid_until', 'created_at']
     list_filter = ['status', 'created_at']
+    list_select_related = ['lead']
     search_fields = ['estimate_number', 'lead__project_name']
+    autocomplete_fields = ['user', 'lead']
+    date_hierarchy = 'created_at'
 
 
 @admin.register(EstimateItem)
-class EstimateItemAdmin(admin.ModelAdmin):
+class EstimateItemAdmin(LargeTableAdmin):
     list_display = ['estimate', 'description', 'quantity', 'unit_price', 'total_price', 'category']
     list_filter = ['category', 'created_at']
+    list_select_related = ['estimate']
     search_fields = ['description', 'estimate__estimate_number']
+    autocomplete_fields = ['estimate']
 
 
 @admin.register(Job)
-class JobAdmin(admin.ModelAdmin):
+class JobAdmin(LargeTableAdmin):
     list_display = ['job_number', 'estimate', 'status', 'start_date', 'end_date', 'created_at']
     list_filter = ['status', 'start_date', 'created_at']
+    list_select_related = ['estimate']
     search_fields = ['job_number', 'estimate__estimate_number']
+    autocomplete_fields = ['user', 'estimate']
+    date_hierarchy = 'created_at'
 
 
 @admin.register(Material)
-class MaterialAdmin(admin.ModelAdmin):
+class MaterialAdmin(LargeTableAdmin):
     list_display = ['name', 'job', 'quantity', 'unit', 'cost_per_unit', 'total_cost', 'supplier']
-    list_filter = ['supplier', 'created_at']
+    # Suppliers are searched rather than filtered; listing the filter's
+    # choices would read every distinct supplier in the table
+    list_filter = ['created_at']
+    list_select_related = ['job']
     search_fields = ['name', 'job__job_number', 'supplier']
+    autocomplete_fields = ['user', 'job']
 
 
 @admin.register(Invoice)
-class InvoiceAdmin(admin.ModelAdmin):
+class InvoiceAdmin(LargeTableAdmin):
     list_display = ['invoice_number', 'job', 'status', 'total_amount', 'paid_amount', 'due_date', 'created_at']
     list_filter = ['status', 'due_date', 'created_at']
+    list_select_related = ['job']
     search_fields = ['invoice_number', 'job__job_number']
+    autocomplete_fields = ['user', 'job']
+    date_hierarchy = 'created_at'
+    actions = ['mark_paid', status_action('overdue', 'Overdue')]
+
+    @admin.action(description='Mark selected invoices as Paid')
+    def mark_paid(self, request, queryset):
+        changed = set_status(queryset, 'paid', paid_date=Coalesce('paid_date', Value(timezone.localdate())))
+        self.message_user(request, f'{changed} invoices marked Paid.')
 
 
 @admin.register(Payment)
-class PaymentAdmin(admin.ModelAdmin):
+class PaymentAdmin(LargeTableAdmin):
     list_display = ['invoice', 'amount', 'payment_method', 'payment_date', 'reference_number']
     list_filter = ['payment_method', 'payment_date', 'created_at']
+    list_select_related = ['invoice']
     search_fields = ['invoice__invoice_number', 'reference_number']
+    autocomplete_fields = ['user', 'invoice']
+    date_hierarchy = 'payment_date'
+
+
+@admin.register(Task)
+class TaskAdmin(LargeTableAdmin):
+    list_display = ['name', 'user', 'status', 'attempts', 'available_at', 'created_at', 'finished_at']
+    list_filter = ['status', 'name']
+    list_select_related = ['user']
+    search_fields = ['name', 'user__username']
+    autocomplete_fields = ['user']
+    readonly_fields = ['attempts', 'locked_by', 'result', 'error', 'created_at', 'updated_at', 'finished_at']
+    actions = ['retry']
+
+    @admin.action(description='Run again now')
+    def retry(self, request, queryset):
+        updated = queryset.exclude(status='running').update(
+            status='queued', attempts=0, available_at=timezone.now(), finished_at=None,
+        )
+        self.message_user(request, f'{updated} task(s) queued.')
@@ -0,0 +1,319 @@
+import hashlib
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count, Max
+from django.http import FileResponse
+from django.utils.cache import get_conditional_response
+from django.utils.decorators import method_decorator
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.gzip import gzip_page
+from rest_framework import exceptions, routers, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+from .models import (
+    Customer, Lead, Estimate, EstimateItem,
+    Job, Material, Invoice, Payment, Task
+)
+from .bulk import bulk_upsert
+from .changes import InvalidCursor, changes
+from .fragments import bump_versions
+from .history import time_in_stage, transition_counts
+from .rollups import recompute
+from .search import SEARCH_LIMIT, SEARCHABLE, search
+from .serializers import (
+    CustomerSerializer, LeadSerializer, EstimateSerializer, EstimateItemSerializer,
+    JobSerializer, MaterialSerializer, InvoiceSerializer, PaymentSerializer,
+    EstimateItemBulkSerializer, MaterialBulkSerializer, SparseFieldsetMixin,
+    ChangesRequestSerializer, ExportRequestSerializer, HistoryRequestSerializer, TaskSerializer,
+)
+from .tasks import enqueue
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """Newest-first cursor pagination, matching the HTML list views"""
+
+    ordering = ('-created_at', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = settings.RENOVATION_MAX_PAGE_SIZE
+
+
+class ConditionalGetMixin:
+    """ETag/Last-Modified support so polling clients get cheap 304s.
+
+    A list's validator is derived from the newest updated_at and the row
+    count of the filtered queryset (one aggregate query), a detail's from the
+    object's own updated_at. Both are checked before anything is serialized.
+    """
+
+    def list(self, request, *args, **kwargs):
+        state = self.filter_queryset(self.get_queryset()).order_by().aggregate(
+            last_modified=Max('updated_at'), count=Count('pk')
+        )
+        fingerprint = f'{request.user.pk}:{request.get_full_path()}:{state["last_modified"]}:{state["count"]}'
+        etag = quote_etag(hashlib.md5(fingerprint.encode()).hexdigest())
+        return self.conditional(request, etag, state['last_modified'], super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        fingerprint = f'{request.get_full_path()}:{instance.updated_at.isoformat()}'
+        etag = quote_etag(hashlib.md5(fingerprint.encode()).hexdigest())
+        return self.conditional(request, etag, instance.updated_at, self.render_instance, instance)
+
+    def render_instance(self, instance):
+        return Response(self.get_serializer(instance).data)
+
+    def conditional(self, request, etag, last_modified, render, *args, **kwargs):
+        timestamp = last_modified.timestamp() if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = render(*args, **kwargs)
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        return response
+
+
+class OwnedModelViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
+    """CRUD for one renovation model, scoped to the requesting user.
+
+    ``filter_fields`` lists the fields clients may filter on with exact
+    ``?field=value`` matches; ``prefetch`` maps serializer fields to the
+    related lookups that must be prefetched when that field is rendered.
+    """
+
+    model = None
+    filter_fields = []
+    prefetch = {}
+    pagination_class = CreatedAtCursorPagination
+
+    def get_queryset(self):
+        queryset = self.model.objects.for_user(self.request.user)
+        requested = SparseFieldsetMixin.requested_fields({'request': self.request})
+        if requested is not None:
+            concrete = {field.name for field in self.model._meta.concrete_fields}
+            queryset = queryset.only(*((requested & concrete) | {'id', 'created_at', 'updated_at'}))
+        lookups = [lookup for field, lookup in self.prefetch.items() if requested is None or field in requested]
+        return queryset.prefetch_related(*lookups)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        for name in self.filter_fields:
+            value = self.request.query_params.get(name)
+            if value is None:
+                continue
+            try:
+                queryset = queryset.filter(**{name: value})
+            except (DjangoValidationError, ValueError):
+                raise exceptions.ValidationError({name: ['Invalid filter value.']})
+        return queryset
+
+
+class CustomerViewSet(OwnedModelViewSet):
+    model = Customer
+    serializer_class = CustomerSerializer
+
+
+class LeadViewSet(OwnedModelViewSet):
+    model = Lead
+    serializer_class = LeadSerializer
+    filter_fields = ['status', 'customer']
+
+
+class BulkChildrenMixin:
+    """POST (upsert) or PUT (replace) a whole list of child rows at once"""
+
+    def bulk_write(self, request, related_name, serializer_class, extra=None):
+        parent = self.get_object()
+        rows = serializer_class(data=request.data, many=True)
+        rows.is_valid(raise_exception=True)
+        with transaction.atomic():
+            created, updated, deleted = bulk_upsert(
+                parent, related_name, rows.validated_data, serializer_class.writable_fields(),
+                replace=request.method == 'PUT', extra=extra,
+            )
+            self.after_bulk_write(parent)
+            # Bulk writes skip the signals that move cached pages to a new version
+            entities = (parent._meta.model_name, getattr(parent, related_name).model._meta.model_name)
+            transaction.on_commit(lambda: bump_versions(parent.user_id, *entities))
+        return parent, {'created': created, 'updated': updated, 'deleted': deleted}
+
+    def after_bulk_write(self, parent):
+        pass
+
+
+class EstimateViewSet(BulkChildrenMixin, OwnedModelViewSet):
+    model = Estimate
+    serializer_class = EstimateSerializer
+    filter_fields = ['status', 'lead']
+    prefetch = {'items': 'items'}
+
+    @action(detail=True, methods=['post', 'put'], url_path='items/bulk')
+    def bulk_items(self, request, pk=None):
+        estimate, counts = self.bulk_write(request, 'items', EstimateItemBulkSerializer)
+        return Response({**counts, 'estimate': self.get_serializer(estimate).data})
+
+    def after_bulk_write(self, estimate):
+        estimate.recalculate_totals()
+
+
+class EstimateItemViewSet(OwnedModelViewSet):
+    model = EstimateItem
+    serializer_class = EstimateItemSerializer
+    filter_fields = ['estimate', 'category']
+
+    def recalculate(self, estimate_id):
+        # The estimate embeds its items and carries their totals
+        Estimate.objects.get(pk=estimate_id).recalculate_totals()
+
+    @transaction.atomic
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        self.recalculate(serializer.instance.estimate_id)
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        previous = serializer.instance.estimate_id
+        super().perform_update(serializer)
+        self.recalculate(serializer.instance.estimate_id)
+        if previous != serializer.instance.estimate_id:
+            self.recalculate(previous)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        self.recalculate(instance.estimate_id)
+
+
+class JobViewSet(BulkChildrenMixin, OwnedModelViewSet):
+    model = Job
+    serializer_class = JobSerializer
+    filter_fields = ['status', 'estimate']
+
+    @action(detail=True, methods=['post', 'put'], url_path='materials/bulk')
+    def bulk_materials(self, request, pk=None):
+        job, counts = self.bulk_write(request, 'materials', MaterialBulkSerializer, extra={'user': request.user})
+        materials = MaterialSerializer(job.materials.all(), many=True, context=self.get_serializer_context())
+        return Response({**counts, 'materials': materials.data})
+
+    def after_bulk_write(self, job):
+        # bulk_create()/bulk_update() skip the signals that keep the cost current
+        recompute(Job.objects.filter(pk=job.pk), 'material_cost')
+
+
+class MaterialViewSet(OwnedModelViewSet):
+    model = Material
+    serializer_class = MaterialSerializer
+    filter_fields = ['job', 'supplier']
+
+
+class InvoiceViewSet(OwnedModelViewSet):
+    model = Invoice
+    serializer_class = InvoiceSerializer
+    filter_fields = ['status', 'job']
+
+
+class PaymentViewSet(OwnedModelViewSet):
+    model = Payment
+    serializer_class = PaymentSerializer
+    filter_fields = ['invoice', 'payment_method']
+
+
+class SearchViewSet(viewsets.ViewSet):
+    """Ranked full-text search: ``?q=words&types=customer,lead&limit=20``"""
+
+    def list(self, request):
+        kinds = [kind for kind in request.query_params.get('types', '').split(',') if kind]
+        unknown = set(kinds) - set(SEARCHABLE)
+        if unknown:
+            raise exceptions.ValidationError({'types': [f'Unknown type {kind}.' for kind in sorted(unknown)]})
+        try:
+            limit = int(request.query_params.get('limit', SEARCH_LIMIT))
+        except ValueError:
+            raise exceptions.ValidationError({'limit': ['A whole number is required.']})
+        limit = max(1, min(limit, settings.RENOVATION_MAX_PAGE_SIZE))
+        query = request.query_params.get('q', '')
+        hits = search(request.user, query, kinds or None, limit)
+        return Response({'query': query, 'results': [hit.as_dict() for hit in hits]})
+
+
+@method_decorator(gzip_page, name='dispatch')
+class ChangesViewSet(viewsets.ViewSet):
+    """Rows changed or deleted since ``?since=<cursor>``, in batches of ``?limit=``, gzipped on request"""
+
+    def list(self, request):
+        params = ChangesRequestSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        try:
+            return Response(changes(request.user, **params.validated_data))
+        except InvalidCursor as exc:
+            raise exceptions.ValidationError({'since': [str(exc)]})
+
+
+class HistoryViewSet(viewsets.ViewSet):
+    """Status history: ``transitions/`` and ``time-in-stage/``, both taking ``?entity=&since=&until=``"""
+
+    def params(self, request):
+        params = HistoryRequestSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        return params.validated_data
+
+    @action(detail=False)
+    def transitions(self, request):
+        return Response({'results': transition_counts(request.user, **self.params(request))})
+
+    @action(detail=False, url_path='time-in-stage')
+    def time_in_stage(self, request):
+        return Response({'results': time_in_stage(request.user, **self.params(request))})
+
+
+class TaskViewSet(viewsets.ReadOnlyModelViewSet):
+    """The requesting user's background tasks; ``POST export/`` queues a CSV export"""
+
+    model = Task
+    serializer_class = TaskSerializer
+    pagination_class = CreatedAtCursorPagination
+
+    def get_queryset(self):
+        return Task.objects.for_user(self.request.user)
+
+    @action(detail=False, methods=['post'])
+    def export(self, request):
+        params = ExportRequestSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        since, until = params.validated_data.get('since'), params.validated_data.get('until')
+        task = enqueue(
+            'export_csv', request.user,
+            export=params.validated_data['export'], user_id=request.user.pk,
+            since=since and since.isoformat(), until=until and until.isoformat(),
+        )
+        return Response(TaskSerializer(task).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True)
+    def download(self, request, pk=None):
+        task = self.get_object()
+        if task.name != 'export_csv' or task.status != 'done':
+            raise exceptions.NotFound('No finished export for this task.')
+        return FileResponse(
+            default_storage.open(task.result['file'], 'rb'),
+            as_attachment=True, filename=f'{task.args["export"]}.csv', content_type='text/csv',
+        )
+
+
+router = routers.DefaultRouter()
+router.register('customers', CustomerViewSet, basename='api-customer')
+router.register('leads', LeadViewSet, basename='api-lead')
+router.register('estimates', EstimateViewSet, basename='api-estimate')
+router.register('estimate-items', EstimateItemViewSet, basename='api-estimate-item')
+router.register('jobs', JobViewSet, basename='api-job')
+router.register('materials', MaterialViewSet, basename='api-material')
+router.register('invoices', InvoiceViewSet, basename='api-invoice')
+router.register('payments', PaymentViewSet, basename='api-payment')
+router.register('search', SearchViewSet, basename='api-search')
+router.register('changes', ChangesViewSet, basename='api-changes')
+router.register('history', HistoryViewSet, basename='api-history')
+router.register('tasks', TaskViewSet, basename='api-task')
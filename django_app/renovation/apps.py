@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class RenovationConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "renovation"
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .search import install_fts_tables
+
+        post_migrate.connect(install_fts_tables, sender=self, dispatch_uid='renovation_fts_tables')
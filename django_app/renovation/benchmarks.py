@@ -0,0 +1,186 @@
+"""Timing harness for the renovation views.
+
+Every named GET route in renovation/urls.py (including the REST API) is
+requested through the test client as a logged-in user. Timed runs are kept
+free of instrumentation; one extra run per view counts the SQL queries and
+records the peak Python memory with tracemalloc.
+
+measure_logins() times the login form instead, each attempt from a fresh
+client with no session, which is dominated by the password hasher.
+"""
+import statistics
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, reverse
+
+from . import urls
+from .exports import EXPORTS
+from .models import Customer, Lead, Estimate, Job, Invoice
+
+# Routes that change state when requested, or are not for regular users
+SKIPPED_ROUTES = {'logout', 'metrics', 'site_visit_photos'}
+
+# URL keyword -> model whose newest row fills it in
+SAMPLE_MODELS = {
+    'customer_id': Customer,
+    'lead_id': Lead,
+    'estimate_id': Estimate,
+    'job_id': Job,
+    'invoice_id': Invoice,
+}
+
+
+def iter_patterns(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from iter_patterns(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern):
+            yield pattern
+
+
+def _route_kwargs(pattern):
+    route = pattern.pattern
+    if hasattr(route, 'converters') and route.converters:
+        return set(route.converters)
+    return set(getattr(route, 'regex').groupindex)
+
+
+def _sample_pk(model, user):
+    return model.objects.for_user(user).order_by('-created_at').values_list('pk', flat=True).first()
+
+
+def view_cases(user):
+    """[(name, url)] for every GET route, or (name, None) when it cannot be filled in"""
+    cases = []
+    for pattern in iter_patterns(urls.urlpatterns):
+        name = pattern.name
+        if not name or name in SKIPPED_ROUTES:
+            continue
+        kwargs = _route_kwargs(pattern)
+        if 'format' in kwargs:
+            # The router's .json/.api suffix duplicates
+            continue
+        view = getattr(pattern.callback, 'cls', None)
+        actions = getattr(pattern.callback, 'actions', None)
+        if actions is not None and 'get' not in actions:
+            continue
+
+        if kwargs == {'export'}:
+            cases.extend((f'{name}:{export}', reverse(name, kwargs={'export': export})) for export in EXPORTS)
+            continue
+        values = {}
+        for kwarg in kwargs:
+            model = SAMPLE_MODELS.get(kwarg) or (getattr(view, 'model', None) if kwarg == 'pk' else None)
+            values[kwarg] = _sample_pk(model, user) if model is not None else None
+        if any(value is None for value in values.values()):
+            cases.append((name, None))
+        else:
+            cases.append((name, reverse(name, kwargs=values)))
+    return cases
+
+
+def _request(client, url):
+    response = client.get(url)
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    return response
+
+
+def percentile(timings, pct):
+    if len(timings) == 1:
+        return timings[0]
+    return statistics.quantiles(timings, n=100, method='inclusive')[pct - 1]
+
+
+def measure_view(client, url, repeat=20, warmup=2):
+    """Latency percentiles, query count and peak traced memory for one URL"""
+    for _ in range(warmup):
+        _request(client, url)
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = _request(client, url)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    with CaptureQueriesContext(connection) as ctx:
+        tracemalloc.start()
+        try:
+            _request(client, url)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    return {
+        'url': url,
+        'status': response.status_code,
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'max_ms': round(max(timings), 3),
+        'queries': len(ctx.captured_queries),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def _client():
+    """A test client that passes the ALLOWED_HOSTS check"""
+    host = next((host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'), 'localhost')
+    return Client(HTTP_HOST=host)
+
+
+def benchmark_client(user):
+    """A test client logged in as `user`"""
+    client = _client()
+    client.force_login(user)
+    return client
+
+
+def _login(username, password):
+    return _client().post(reverse('login'), {'username': username, 'password': password})
+
+
+def measure_logins(username, password, repeat=10, warmup=1):
+    """Logins per second through the login form, with latency percentiles and query count"""
+    for _ in range(warmup):
+        _login(username, password)
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = _login(username, password)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    with CaptureQueriesContext(connection) as ctx:
+        _login(username, password)
+
+    hasher = get_hasher()
+    start = time.perf_counter()
+    hasher.encode(password, hasher.salt())
+    hash_ms = (time.perf_counter() - start) * 1000
+
+    return {
+        'status': response.status_code,
+        'logins_per_second': round(len(timings) / (sum(timings) / 1000), 2),
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'queries': len(ctx.captured_queries),
+        'hash_ms': round(hash_ms, 3),
+    }
+
+
+def run_benchmarks(user, repeat=20, warmup=2, only=None):
+    """{case name: measurement}; cases without sample data map to None"""
+    client = benchmark_client(user)
+    results = {}
+    for name, url in view_cases(user):
+        if only and not any(name.startswith(prefix) for prefix in only):
+            continue
+        results[name] = measure_view(client, url, repeat, warmup) if url else None
+    return results
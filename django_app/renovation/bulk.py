@@ -0,0 +1,152 @@
+"""Set-based writes.
+
+A client sends the whole list of line items (or materials) in one request.
+The list is validated in a single pass, existing rows are matched by id with
+one query, and everything is written with bulk_create()/bulk_update() inside
+one transaction instead of one save() per row.
+
+set_status() moves any number of leads, estimates, jobs or invoices to a new
+status with one UPDATE, for the admin's bulk actions.
+"""
+from django.db import router, transaction
+from django.db.models import Count, DecimalField, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from rest_framework import exceptions
+
+from .models import Invoice, Job
+from .changes import batched_tombstones
+from .fragments import bump_versions
+from .history import record_moves
+from .reporting import SUMMARY_SOURCES, apply_delta, bucket_day
+from .rollups import apply
+from .stats import invalidate_dashboard
+from .tasks import enqueue
+
+BULK_BATCH_SIZE = 500
+# Summary buckets or jobs set_status() adjusts in place; a move touching more
+# queues a rebuild instead
+INLINE_REFRESH_LIMIT = 1000
+
+
+def bulk_upsert(parent, related_name, rows, writable_fields, replace=False, extra=None):
+    """Create or update the children of `parent` from validated `rows`.
+
+    Rows carrying an ``id`` update that child, the rest are created with
+    `extra` as additional field values. With ``replace`` any existing child
+    missing from `rows` is deleted, so the request becomes the complete list.
+    Returns (created, updated, deleted).
+    """
+    manager = getattr(parent, related_name)
+    parent_field = manager.field.name
+    model = manager.model
+    now = timezone.now()
+
+    with transaction.atomic():
+        # Serialize concurrent bulk writes to the same parent
+        type(parent)._base_manager.select_for_update().filter(pk=parent.pk).exists()
+
+        ids = [row['id'] for row in rows if row.get('id')]
+        existing = manager.in_bulk(ids)
+        errors, seen = [], set()
+        for row in rows:
+            row_id = row.get('id')
+            if row_id and row_id not in existing:
+                errors.append({'id': ['No such row on this record.']})
+            elif row_id and row_id in seen:
+                errors.append({'id': ['Row appears more than once.']})
+            else:
+                errors.append({})
+            seen.add(row_id)
+        if any(errors):
+            raise exceptions.ValidationError(errors)
+
+        to_create, to_update = [], []
+        for row in rows:
+            if row.get('id'):
+                obj = existing[row['id']]
+                for name in writable_fields:
+                    if name in row:
+                        setattr(obj, name, row[name])
+                obj.updated_at = now
+                to_update.append(obj)
+            else:
+                values = {name: row[name] for name in writable_fields if name in row}
+                to_create.append(model(**{parent_field: parent}, **(extra or {}), **values))
+
+        deleted = 0
+        if replace:
+            with batched_tombstones():
+                deleted, _ = manager.exclude(pk__in=ids).delete()
+        model.objects.bulk_create(to_create, batch_size=BULK_BATCH_SIZE)
+        if to_update:
+            model.objects.bulk_update(to_update, list(writable_fields) + ['updated_at'], batch_size=BULK_BATCH_SIZE)
+    return len(to_create), len(to_update), deleted
+
+
+def _sum(field):
+    output = DecimalField(max_digits=14, decimal_places=2)
+    return Coalesce(Sum(field), Value(0), output_field=output) if field else Value(0, output_field=output)
+
+
+def set_status(queryset, status, **values):
+    """Give every row of `queryset` `status` (and `values`); returns how many changed.
+
+    update() sends no model signals, so what they keep in step is refreshed
+    here. The status history, the status summaries and, when invoices enter
+    or leave 'cancelled', their jobs' invoiced totals are updated in the same
+    transaction. Each is worked out from one grouped query taken before the
+    UPDATE. The owners' cached pages and dashboards are refreshed once the
+    change commits. A move spread over more than INLINE_REFRESH_LIMIT buckets
+    or jobs queues the summary rebuild or rollup reconcile instead.
+    """
+    model = queryset.model
+    entity, amount_field = SUMMARY_SOURCES[model]
+    with transaction.atomic(using=router.db_for_write(model)):
+        changing = queryset.exclude(status=status).order_by()
+        buckets = list(
+            changing.values(
+                'user_id', 'status', day=bucket_day(model), new_day=bucket_day(model, status, values.get('paid_date')),
+            ).annotate(n=Count('pk'), total=_sum(amount_field))[:INLINE_REFRESH_LIMIT + 1]
+        )
+        rebuild = len(buckets) > INLINE_REFRESH_LIMIT
+        if rebuild:
+            user_ids = sorted(set(changing.values_list('user_id', flat=True).distinct()))
+        else:
+            user_ids = sorted({bucket['user_id'] for bucket in buckets})
+        invoiced = []
+        if model is Invoice:
+            # Cancelled invoices do not count towards their job's invoiced_total
+            crossing = changing if status == 'cancelled' else changing.filter(status='cancelled')
+            invoiced = list(
+                crossing.values('job_id').annotate(total=_sum('total_amount'))[:INLINE_REFRESH_LIMIT + 1]
+            )
+
+        now = timezone.now()
+        record_moves(changing, status, at=now)
+        changed = changing.update(status=status, updated_at=now, **values)
+        if not changed:
+            return 0
+        if rebuild:
+            enqueue('rebuild_summaries', user_ids=user_ids)
+        else:
+            for bucket in buckets:
+                user_id, count, total = bucket['user_id'], bucket['n'], bucket['total']
+                apply_delta(entity, (user_id, bucket['status'], bucket['day'], total), -1, count=count)
+                apply_delta(entity, (user_id, status, bucket['new_day'], total), 1, count=count)
+        if len(invoiced) > INLINE_REFRESH_LIMIT:
+            enqueue('reconcile_rollups', user_ids=user_ids)
+        elif invoiced:
+            totals = {(Job, 'pk', row['job_id']): {'invoiced_total': row['total']} for row in invoiced}
+            if status == 'cancelled':
+                apply(totals, {})
+            else:
+                apply({}, totals)
+
+        def refresh_pages():
+            for user_id in user_ids:
+                bump_versions(user_id, entity)
+                invalidate_dashboard(user_id)
+
+        transaction.on_commit(refresh_pages)
+    return changed
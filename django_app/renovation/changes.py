@@ -0,0 +1,175 @@
+"""Incremental sync for the web app and field tablets.
+
+GET /api/changes/?since=<cursor> returns the user's rows of every synced
+model written after the cursor, oldest first, with a tombstone for each
+record deleted since. The response also carries the cursor for the next
+request. A client applies each batch in order and keeps asking while `more`
+is true, so its traffic grows with the number of changes rather than with
+the size of its data. Without a cursor the feed starts from the beginning,
+which is also how a client does its first full download.
+
+Changes are ordered across models by (updated_at, entity, id). Each model
+is read from its (user, updated_at, id) index from the cursor on, and only
+the first `limit` rows per model are fetched, so a poll is one short index
+range scan per model.
+
+updated_at is set when a row is written, not when its transaction commits.
+A row can therefore become visible with a timestamp older than a cursor
+already handed out. To avoid skipping such rows, the feed stops
+RENOVATION_CHANGES_LAG seconds before now, so any transaction shorter than
+that cannot be missed.
+
+Each deleted record leaves a Tombstone, written by a post_delete signal.
+Bulk deletes wrap themselves in batched_tombstones(), so that all of their
+tombstones are inserted together.
+"""
+import base64
+import heapq
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import (
+    Customer, Lead, SiteVisit, SiteVisitPhoto, Estimate,
+    EstimateItem, Job, Material, Invoice, Payment, Tombstone
+)
+from .serializers import (
+    CustomerSerializer, LeadSerializer, SiteVisitSerializer, SiteVisitPhotoSerializer, EstimateSerializer,
+    EstimateItemSerializer, JobSerializer, MaterialSerializer, InvoiceSerializer, PaymentSerializer,
+)
+
+# entity -> (model, serializer, lookups prefetched for the serializer)
+SYNCED = {
+    'customer': (Customer, CustomerSerializer, ()),
+    'lead': (Lead, LeadSerializer, ()),
+    'sitevisit': (SiteVisit, SiteVisitSerializer, ()),
+    'sitevisitphoto': (SiteVisitPhoto, SiteVisitPhotoSerializer, ()),
+    'estimate': (Estimate, EstimateSerializer, ('items',)),
+    'estimateitem': (EstimateItem, EstimateItemSerializer, ()),
+    'job': (Job, JobSerializer, ()),
+    'material': (Material, MaterialSerializer, ()),
+    'invoice': (Invoice, InvoiceSerializer, ()),
+    'payment': (Payment, PaymentSerializer, ()),
+}
+SYNCED_MODELS = {model: entity for entity, (model, _, _) in SYNCED.items()}
+# Sorts after every entity changed at the same moment
+TOMBSTONES = 'tombstone'
+TOMBSTONE_BATCH_SIZE = 500
+
+# Tombstones held back by batched_tombstones()
+pending_tombstones = ContextVar('renovation_pending_tombstones', default=None)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(key):
+    at, entity, pk = key
+    return base64.urlsafe_b64encode(f'{at.isoformat()}|{entity}|{pk}'.encode()).decode()
+
+
+def decode_cursor(value):
+    """(changed_at, entity, pk) from a cursor the feed handed out"""
+    try:
+        at, entity, pk = base64.urlsafe_b64decode(value.encode()).decode().split('|')
+        model = Tombstone if entity == TOMBSTONES else SYNCED[entity][0]
+        at = datetime.fromisoformat(at)
+        if timezone.is_naive(at):
+            raise ValueError
+        return at, entity, model._meta.pk.to_python(pk)
+    except Exception:
+        raise InvalidCursor(f'Invalid cursor {value!r}.')
+
+
+def _after(queryset, field, entity, cursor):
+    """Rows of `queryset` whose (field, entity, pk) key sorts after the cursor"""
+    if cursor is None:
+        return queryset
+    at, cursor_entity, pk = cursor
+    if entity > cursor_entity:
+        return queryset.filter(**{f'{field}__gte': at})
+    if entity < cursor_entity:
+        return queryset.filter(**{f'{field}__gt': at})
+    return queryset.filter(Q(**{f'{field}__gt': at}) | Q(**{field: at, 'pk__gt': pk}))
+
+
+def _changed(user, entity, cursor, horizon, limit):
+    model, _, prefetch = SYNCED[entity]
+    rows = _after(model.objects.for_user(user).filter(updated_at__lte=horizon), 'updated_at', entity, cursor)
+    rows = rows.order_by('updated_at', 'pk').prefetch_related(*prefetch)[:limit]
+    return [((row.updated_at, entity, row.pk), row) for row in rows]
+
+
+def _deleted(user, cursor, horizon, limit):
+    rows = _after(Tombstone.objects.filter(user=user, deleted_at__lte=horizon), 'deleted_at', TOMBSTONES, cursor)
+    rows = rows.order_by('deleted_at', 'pk')[:limit]
+    return [((row.deleted_at, TOMBSTONES, row.pk), row) for row in rows]
+
+
+def changes(user, since=None, limit=None):
+    """{'results': [...], 'cursor': ..., 'more': bool} for the changes after the `since` cursor"""
+    limit = limit or settings.RENOVATION_CHANGES_BATCH_SIZE
+    cursor = decode_cursor(since) if since else None
+    horizon = timezone.now() - timedelta(seconds=settings.RENOVATION_CHANGES_LAG)
+    # One row past the batch from each source tells whether there is more
+    sources = [_changed(user, entity, cursor, horizon, limit + 1) for entity in SYNCED]
+    if cursor is not None:
+        # A client starting from scratch has nothing to delete
+        sources.append(_deleted(user, cursor, horizon, limit + 1))
+    merged = list(heapq.merge(*sources, key=lambda change: change[0]))
+    batch = merged[:limit]
+
+    # Serialized per model, which builds each serializer's fields only once
+    rows = defaultdict(list)
+    for (_, entity, _), row in batch:
+        rows[entity].append(row)
+    data = {
+        entity: iter(SYNCED[entity][1](entity_rows, many=True).data)
+        for entity, entity_rows in rows.items() if entity != TOMBSTONES
+    }
+    results = []
+    for (at, entity, _), row in batch:
+        if entity == TOMBSTONES:
+            results.append({
+                'entity': row.entity, 'id': str(row.object_id), 'changed_at': at, 'deleted': True, 'data': None,
+            })
+        else:
+            results.append({
+                'entity': entity, 'id': str(row.pk), 'changed_at': at, 'deleted': False, 'data': next(data[entity]),
+            })
+    return {
+        'results': results,
+        'cursor': encode_cursor(batch[-1][0]) if batch else since,
+        'more': len(merged) > limit,
+    }
+
+
+def record_deletion(instance, user_id):
+    """Leave a tombstone for a deleted synced record"""
+    tombstone = Tombstone(user_id=user_id, entity=SYNCED_MODELS[type(instance)], object_id=instance.pk)
+    pending = pending_tombstones.get()
+    if pending is None:
+        tombstone.save()
+    else:
+        pending.append(tombstone)
+
+
+@contextmanager
+def batched_tombstones():
+    """Insert the tombstones of the deletions made in the block together, as it ends"""
+    if pending_tombstones.get() is not None:
+        yield
+        return
+    pending = []
+    token = pending_tombstones.set(pending)
+    try:
+        yield
+    finally:
+        pending_tombstones.reset(token)
+    Tombstone.objects.bulk_create(pending, batch_size=TOMBSTONE_BATCH_SIZE)
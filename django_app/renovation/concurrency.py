@@ -0,0 +1,38 @@
+"""Overlapping independent ORM queries from async views.
+
+Django's async ORM methods (``acount()``, ``aaggregate()``, ``async for``)
+hand every query to the thread-sensitive executor, so a view that gathers
+several of them still runs them one after another on a single connection.
+gather_queries() runs each blocking callable on a worker thread with that
+thread's own database connection instead, so the page waits roughly as long
+as its slowest query rather than the sum of all of them.
+
+With RENOVATION_CONCURRENT_QUERIES off the callables run one at a time on
+the request's connection, inside its transaction (the test suite relies on
+this).
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+
+def _on_worker_connection(func):
+    def run():
+        try:
+            return func()
+        finally:
+            # Worker threads outlive the request; let CONN_MAX_AGE decide
+            # whether their connection is kept for the next one
+            close_old_connections()
+    return run
+
+
+async def gather_queries(*funcs):
+    """Results of the blocking callables `funcs`, evaluated concurrently"""
+    if not settings.RENOVATION_CONCURRENT_QUERIES:
+        return [await sync_to_async(func)() for func in funcs]
+    return await asyncio.gather(*(
+        sync_to_async(_on_worker_connection(func), thread_sensitive=False)() for func in funcs
+    ))
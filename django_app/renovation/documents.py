@@ -0,0 +1,344 @@
+"""PDF estimates and invoices.
+
+A document is drawn from one query for the row and the names it prints,
+plus one prefetch query for its lines. The finished PDF is stored in the
+default storage under its version. The version is a hash of the updated_at
+of every row the document prints, plus the number of lines and the newest
+of them, read with a single aggregate query. An unchanged document is
+therefore served straight from the stored file. The same version is the
+response's ETag, and the newest stamp its Last-Modified, so a client that
+already has the PDF is answered 304 after just that query.
+
+generate() renders many documents for month-end runs. It splits them into
+chunks and renders them in a pool of worker processes, skipping those
+already stored at their current version. The workers are spawned rather
+than forked, since forking a process with other threads running can
+deadlock on locks those threads hold.
+"""
+import hashlib
+import logging
+import multiprocessing
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import django
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from .models import Estimate, Invoice
+from .pdf import PAGE_HEIGHT, PAGE_WIDTH, PDFDocument, wrap
+
+logger = logging.getLogger(__name__)
+
+GENERATE_CHUNK_SIZE = 100
+
+MARGIN = 50
+RIGHT = PAGE_WIDTH - MARGIN
+BOTTOM = MARGIN + 20  # above the footer
+LEADING = 12
+
+Version = namedtuple('Version', ['etag', 'last_modified', 'filename'])
+Column = namedtuple('Column', ['heading', 'x', 'width', 'align'])
+
+
+# Layout
+def money(value):
+    return f'${value or 0:,.2f}'
+
+
+def day(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'tzinfo'):
+        value = timezone.localtime(value)
+    return value.strftime('%b %d, %Y')
+
+
+def _company(user):
+    profile = getattr(user, 'profile', None)
+    if profile is not None and (profile.company_name or profile.full_name):
+        return profile.company_name or profile.full_name
+    return user.get_full_name() or user.username
+
+
+def _contact(customer):
+    if customer is None:
+        return []
+    place = ' '.join(part for part in [customer.city and f'{customer.city},', customer.state, customer.zip_code] if part)
+    return [line for line in [customer.name, customer.address, place, customer.email, customer.phone] if line]
+
+
+class Sheet:
+    """Top-down layout on a PDFDocument with page breaks and repeated table headings"""
+
+    def __init__(self, title):
+        self.title = title
+        self.doc = PDFDocument(title)
+        self.y = PAGE_HEIGHT - MARGIN
+        self.columns = None
+
+    def space(self, height):
+        """Make room for `height` points, on a new page if this one is full"""
+        if self.y - height >= BOTTOM:
+            return
+        self.doc.new_page()
+        self.y = PAGE_HEIGHT - MARGIN
+        if self.columns:
+            self.table_heading()
+
+    def heading(self, company, kind):
+        self.doc.text(MARGIN, self.y - 18, company, size=18, bold=True)
+        self.doc.text(RIGHT, self.y - 18, kind, size=18, bold=True, align='right')
+        self.y -= 40
+
+    def details(self, label, lines, facts):
+        """`lines` (an address) on the left, (label, value) `facts` on the right"""
+        top = self.y
+        self.doc.text(MARGIN, self.y, label, size=8, bold=True)
+        for line in lines:
+            self.y -= LEADING
+            self.doc.text(MARGIN, self.y, line)
+        right = top
+        for name, value in facts:
+            self.doc.text(RIGHT - 110, right, name, size=9, bold=True, align='right')
+            self.doc.text(RIGHT, right, value, size=9, align='right')
+            right -= LEADING
+        self.y = min(self.y, right + LEADING) - 2 * LEADING
+
+    def paragraph(self, text, label=None, size=10):
+        if label:
+            self.space(LEADING * 2)
+            self.doc.text(MARGIN, self.y, label, size=8, bold=True)
+            self.y -= LEADING
+        for line in wrap(text, RIGHT - MARGIN, size) if text else []:
+            self.space(LEADING)
+            self.doc.text(MARGIN, self.y, line, size=size)
+            self.y -= LEADING
+        self.y -= LEADING / 2
+
+    def table(self, columns, rows):
+        self.columns = columns
+        self.space(LEADING * 3)
+        self.table_heading()
+        for cells in rows:
+            self.table_row(cells)
+        self.columns = None
+        self.y -= LEADING / 2
+
+    def table_heading(self):
+        self.doc.box(MARGIN, self.y - 4, RIGHT - MARGIN, LEADING + 4)
+        for column in self.columns:
+            self._cell(column, column.heading, self.y, size=8, bold=True)
+        self.y -= LEADING + 6
+
+    def table_row(self, cells):
+        wrapped = [
+            wrap(cell, column.width - 6, 9) if column.align == 'left' else [cell]
+            for column, cell in zip(self.columns, cells)
+        ]
+        height = max(len(lines) for lines in wrapped) * LEADING
+        self.space(height + 4)
+        for column, lines in zip(self.columns, wrapped):
+            for index, line in enumerate(lines):
+                self._cell(column, line, self.y - index * LEADING, size=9)
+        self.y -= height
+        self.doc.line(MARGIN, self.y + 8, RIGHT, self.y + 8, width=0.25)
+        self.y -= 4
+
+    def _cell(self, column, text, y, size, bold=False):
+        if column.align == 'right':
+            self.doc.text(column.x + column.width - 3, y, text, size=size, bold=bold, align='right')
+        else:
+            self.doc.text(column.x + 3, y, text, size=size, bold=bold)
+
+    def totals(self, lines):
+        """Right-aligned (label, amount, bold) lines under a table"""
+        for label, amount, bold in lines:
+            self.space(LEADING + 2)
+            self.doc.text(RIGHT - 110, self.y, label, size=10, bold=bold, align='right')
+            self.doc.text(RIGHT, self.y, amount, size=10, bold=bold, align='right')
+            self.y -= LEADING + 2
+        self.y -= LEADING
+
+    def render(self):
+        total = len(self.doc.pages)
+        for number, ops in enumerate(self.doc.pages, 1):
+            self.doc.ops = ops
+            footer = f'{self.title} - page {number} of {total}'
+            self.doc.text(PAGE_WIDTH / 2, MARGIN - 10, footer, size=8, align='center')
+        if self.doc.missing:
+            logger.warning(
+                '%s has characters its fonts cannot print, shown without accents or as "?": %s',
+                self.title, ' '.join(sorted(self.doc.missing)),
+            )
+        return self.doc.render()
+
+
+def _columns(*specs):
+    """Columns from (heading, width, align), laid out left to right"""
+    columns, x = [], MARGIN
+    for heading, width, align in specs:
+        columns.append(Column(heading, x, width, align))
+        x += width
+    return columns
+
+
+ITEM_COLUMNS = _columns(
+    ('Description', 232, 'left'), ('Category', 80, 'left'), ('Qty', 50, 'right'),
+    ('Unit price', 75, 'right'), ('Amount', 75, 'right'),
+)
+PAYMENT_COLUMNS = _columns(
+    ('Date', 110, 'left'), ('Method', 110, 'left'), ('Reference', 177, 'left'), ('Amount', 115, 'right'),
+)
+
+
+def draw_estimate(estimate):
+    sheet = Sheet(f'Estimate {estimate.estimate_number}')
+    sheet.heading(_company(estimate.user), 'ESTIMATE')
+    sheet.details('PREPARED FOR', _contact(estimate.lead.customer), [
+        ('Estimate #', estimate.estimate_number),
+        ('Date', day(estimate.created_at)),
+        ('Valid until', day(estimate.valid_until)),
+        ('Status', estimate.get_status_display()),
+    ])
+    sheet.paragraph(estimate.lead.project_name, label='PROJECT')
+    sheet.table(ITEM_COLUMNS, [
+        (item.description, item.category or '', f'{item.quantity.normalize():f}', money(item.unit_price),
+         money(item.total_price))
+        for item in estimate.items.all()
+    ])
+    subtotal = (estimate.total_amount or 0) - (estimate.tax_amount or 0)
+    sheet.totals([
+        ('Labor', money(estimate.labor_cost), False),
+        ('Materials', money(estimate.material_cost), False),
+        ('Subtotal', money(subtotal), False),
+        ('Tax', money(estimate.tax_amount), False),
+        ('Total', money(estimate.total_amount), True),
+    ])
+    if estimate.notes:
+        sheet.paragraph(estimate.notes, label='NOTES', size=9)
+    return sheet.render()
+
+
+def draw_invoice(invoice):
+    job = invoice.job
+    lead = job.estimate.lead
+    sheet = Sheet(f'Invoice {invoice.invoice_number}')
+    sheet.heading(_company(invoice.user), 'INVOICE')
+    sheet.details('BILL TO', _contact(lead.customer), [
+        ('Invoice #', invoice.invoice_number),
+        ('Date', day(invoice.created_at)),
+        ('Due', day(invoice.due_date)),
+        ('Status', invoice.get_status_display()),
+    ])
+    sheet.paragraph(f'{lead.project_name} (job {job.job_number})', label='PROJECT')
+    tax = invoice.tax_amount or 0
+    sheet.totals([
+        ('Amount', money(invoice.total_amount - tax), False),
+        ('Tax', money(tax), False),
+        ('Total', money(invoice.total_amount), True),
+        ('Paid', money(invoice.paid_amount), False),
+        ('Balance due', money(invoice.total_amount - invoice.paid_amount), True),
+    ])
+    payments = list(invoice.payments.all())
+    if payments:
+        sheet.paragraph(None, label='PAYMENTS')
+        sheet.table(PAYMENT_COLUMNS, [
+            (day(payment.payment_date), payment.get_payment_method_display(),
+             payment.reference_number or '', money(payment.amount))
+            for payment in payments
+        ])
+    if invoice.notes:
+        sheet.paragraph(invoice.notes, label='NOTES', size=9)
+    return sheet.render()
+
+
+# kind -> (model, number field, relations whose rows the document prints, line relation, draw)
+DOCUMENTS = {
+    'estimate': (
+        Estimate, 'estimate_number', ['user__profile', 'lead', 'lead__customer'], 'items', draw_estimate,
+    ),
+    'invoice': (
+        Invoice, 'invoice_number',
+        ['user__profile', 'job', 'job__estimate__lead', 'job__estimate__lead__customer'],
+        'payments', draw_invoice,
+    ),
+}
+
+
+# Versions and storage
+def versions(kind, pks, user=None):
+    """{pk: Version} of the documents of `kind` among `pks` (owned by `user`)"""
+    model, number, related, lines, _ = DOCUMENTS[kind]
+    stamps = ['updated_at', *(f'{path}__updated_at' for path in related)]
+    rows = model._base_manager.filter(pk__in=pks)
+    if user is not None:
+        rows = rows.filter(user=user)
+    rows = rows.order_by().values('pk', number, *stamps).annotate(
+        lines=Count(lines), lines_updated=Max(f'{lines}__updated_at'),
+    )
+    found = {}
+    for row in rows:
+        moments = [row[stamp] for stamp in [*stamps, 'lines_updated'] if row[stamp] is not None]
+        fingerprint = ':'.join([kind, str(row['pk']), str(row['lines']), *(moment.isoformat() for moment in moments)])
+        found[row['pk']] = Version(
+            hashlib.md5(fingerprint.encode()).hexdigest(), max(moments), f'{kind}-{row[number]}.pdf',
+        )
+    return found
+
+
+def storage_name(kind, pk, version):
+    return f'pdfs/{kind}/{pk}/{version.etag}.pdf'
+
+
+def store(kind, obj, version):
+    """Render `obj` and store it under `version`; returns the PDF bytes"""
+    data = DOCUMENTS[kind][4](obj)
+    name = storage_name(kind, obj.pk, version)
+    directory = os.path.dirname(name)
+    if not default_storage.exists(name):
+        default_storage.save(name, ContentFile(data))
+    # Drop the versions this one replaces
+    for stale in default_storage.listdir(directory)[1]:
+        if stale != os.path.basename(name):
+            default_storage.delete(f'{directory}/{stale}')
+    return data
+
+
+def pdf_bytes(kind, pk, version):
+    """The PDF of one document at `version`, rendered only if not stored yet"""
+    try:
+        with default_storage.open(storage_name(kind, pk, version), 'rb') as fh:
+            return fh.read()
+    except FileNotFoundError:
+        model = DOCUMENTS[kind][0]
+        return store(kind, model.objects.for_pdf().get(pk=pk), version)
+
+
+def render_chunk(kind, pks):
+    """Store the documents among `pks` that are out of date; returns (rendered, current)"""
+    current = versions(kind, pks)
+    stale = [pk for pk, version in current.items() if not default_storage.exists(storage_name(kind, pk, version))]
+    model = DOCUMENTS[kind][0]
+    for obj in model.objects.for_pdf().filter(pk__in=stale).order_by():
+        store(kind, obj, current[obj.pk])
+    return len(stale), len(current) - len(stale)
+
+
+def generate(kind, queryset, processes=None, chunk_size=GENERATE_CHUNK_SIZE):
+    """Store the PDFs of every document in `queryset`; returns (rendered, current)"""
+    pks = list(queryset.order_by().values_list('pk', flat=True))
+    chunks = [pks[start:start + chunk_size] for start in range(0, len(pks), chunk_size)]
+    work = partial(render_chunk, kind)
+    if processes == 1 or len(chunks) < 2:
+        results = list(map(work, chunks))
+    else:
+        # Set up before the work is unpickled: importing this module loads the models
+        spawn = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(processes, mp_context=spawn, initializer=django.setup) as pool:
+            results = list(pool.map(work, chunks))
+    return sum(rendered for rendered, _ in results), sum(current for _, current in results)
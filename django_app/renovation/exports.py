@@ -0,0 +1,93 @@
+"""Streaming CSV exports.
+
+Each export is a single joined values_list() query read with iterator(), so
+rows go straight from the database cursor to the CSV writer without model
+instances or per-row lookups, and memory stays flat however many rows the
+export has.
+"""
+import csv
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from .models import Lead, Job, Invoice, Payment
+
+EXPORT_CHUNK_SIZE = 2000
+
+# name -> (model, date field used by since/until, [(header, lookup), ...])
+EXPORTS = {
+    'leads': (Lead, 'created_at', [
+        ('Project', 'project_name'),
+        ('Customer', 'customer__name'),
+        ('Customer Email', 'customer__email'),
+        ('Status', 'status'),
+        ('Estimated Value', 'estimated_value'),
+        ('Created', 'created_at'),
+    ]),
+    'jobs': (Job, 'created_at', [
+        ('Job Number', 'job_number'),
+        ('Estimate Number', 'estimate__estimate_number'),
+        ('Project', 'estimate__lead__project_name'),
+        ('Customer', 'estimate__lead__customer__name'),
+        ('Status', 'status'),
+        ('Start Date', 'start_date'),
+        ('End Date', 'end_date'),
+        ('Created', 'created_at'),
+    ]),
+    'invoices': (Invoice, 'created_at', [
+        ('Invoice Number', 'invoice_number'),
+        ('Job Number', 'job__job_number'),
+        ('Customer', 'job__estimate__lead__customer__name'),
+        ('Status', 'status'),
+        ('Total Amount', 'total_amount'),
+        ('Tax Amount', 'tax_amount'),
+        ('Paid Amount', 'paid_amount'),
+        ('Due Date', 'due_date'),
+        ('Paid Date', 'paid_date'),
+        ('Created', 'created_at'),
+    ]),
+    'payments': (Payment, 'payment_date', [
+        ('Payment Date', 'payment_date'),
+        ('Invoice Number', 'invoice__invoice_number'),
+        ('Job Number', 'invoice__job__job_number'),
+        ('Customer', 'invoice__job__estimate__lead__customer__name'),
+        ('Amount', 'amount'),
+        ('Method', 'payment_method'),
+        ('Reference', 'reference_number'),
+    ]),
+}
+
+
+class Echo:
+    """File-like object whose write() hands the line back to the caller"""
+
+    def write(self, value):
+        return value
+
+
+def export_queryset(name, user=None, since=None, until=None, using=None):
+    model, date_field, columns = EXPORTS[name]
+    queryset = model._base_manager.using(using)
+    if user is not None:
+        queryset = queryset.filter(user=user)
+    # Compare against day boundaries so an index on the date column stays usable
+    if since is not None:
+        start = timezone.make_aware(datetime.combine(since, time.min))
+        queryset = queryset.filter(**{f'{date_field}__gte': start})
+    if until is not None:
+        end = timezone.make_aware(datetime.combine(until + timedelta(days=1), time.min))
+        queryset = queryset.filter(**{f'{date_field}__lt': end})
+    return queryset.order_by(date_field, 'pk').values_list(*[lookup for _, lookup in columns])
+
+
+def export_rows(name, user=None, since=None, until=None, using=None):
+    """Yield the header and then every row of an export as lists"""
+    yield [header for header, _ in EXPORTS[name][2]]
+    yield from export_queryset(name, user, since, until, using).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def stream_csv(rows):
+    """Yield one CSV-encoded line per row"""
+    writer = csv.writer(Echo())
+    for row in rows:
+        yield writer.writerow(row)
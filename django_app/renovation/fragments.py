@@ -0,0 +1,98 @@
+"""Versioned caching of rendered list tables and detail pages.
+
+Every user has a version counter per entity (model name) in the cache.
+The model signals bump the counter of the saved model once the change
+is committed; code that writes in bulk bumps it itself. A fragment is
+cached under the current versions of all the entities it shows, so any
+change to one of them moves it to a new key. Nothing is ever deleted,
+and stale fragments simply expire. A cache hit costs one get_many() of the
+counters and one get() of the HTML, with no database queries and no
+template rendering.
+
+Only the page content is cached. The surrounding page (navigation,
+flash messages) is still rendered on every request.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+VERSION_KEY = 'renovation:version:{user_id}:{entity}'
+FRAGMENT_KEY = 'renovation:fragment:{name}:{user_id}:{versions}:{vary}'
+
+ENTITIES = (
+    'customer', 'lead', 'sitevisit', 'sitevisitphoto', 'estimate', 'estimateitem',
+    'job', 'material', 'invoice', 'payment',
+)
+
+
+def _fresh_version():
+    # A counter lost to eviction restarts above any value it had before,
+    # so it never returns to a version an older fragment was cached under
+    return time.time_ns()
+
+
+def bump_versions(user_id, *entities):
+    """Move `entities` (default: all) of `user_id` to a new version"""
+    for entity in entities or ENTITIES:
+        key = VERSION_KEY.format(user_id=user_id, entity=entity)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _fresh_version(), None)
+
+
+def _version_keys(user_id, entities):
+    return [VERSION_KEY.format(user_id=user_id, entity=entity) for entity in entities]
+
+
+def _fragment_key(name, user_id, keys, found, vary):
+    return FRAGMENT_KEY.format(
+        name=name, user_id=user_id,
+        versions='.'.join(str(found.get(key, 0)) for key in keys),
+        vary=hashlib.md5(vary.encode()).hexdigest(),
+    )
+
+
+def fragment_key(name, user_id, entities, vary=''):
+    """Cache key of a fragment at the current versions of `entities`"""
+    keys = _version_keys(user_id, entities)
+    found = cache.get_many(keys)
+    if len(found) < len(keys):
+        for key in keys:
+            if key not in found:
+                cache.add(key, _fresh_version(), None)
+        found = cache.get_many(keys)
+    return _fragment_key(name, user_id, keys, found, vary)
+
+
+async def afragment_key(name, user_id, entities, vary=''):
+    keys = _version_keys(user_id, entities)
+    found = await cache.aget_many(keys)
+    if len(found) < len(keys):
+        for key in keys:
+            if key not in found:
+                await cache.aadd(key, _fresh_version(), None)
+        found = await cache.aget_many(keys)
+    return _fragment_key(name, user_id, keys, found, vary)
+
+
+def cached_fragment(user, name, entities, render, vary=''):
+    """render() for `user`, cached until one of `entities` changes"""
+    key = fragment_key(name, user.pk, entities, vary)
+    fragment = cache.get(key)
+    if fragment is None:
+        fragment = render()
+        cache.set(key, fragment, settings.RENOVATION_FRAGMENT_CACHE_TIMEOUT)
+    return fragment
+
+
+async def acached_fragment(user, name, entities, render, vary=''):
+    """cached_fragment() for async views; `render` is a coroutine function"""
+    key = await afragment_key(name, user.pk, entities, vary)
+    fragment = await cache.aget(key)
+    if fragment is None:
+        fragment = await render()
+        await cache.aset(key, fragment, settings.RENOVATION_FRAGMENT_CACHE_TIMEOUT)
+    return fragment
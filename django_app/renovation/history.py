@@ -0,0 +1,145 @@
+"""Status history of leads, estimates, jobs and invoices.
+
+A record's status is overwritten in place, so StatusEvent keeps an
+append-only row for each change: when the record is created, when its
+status changes, and when it is deleted. The model signals record a single
+save with one INSERT in the same transaction as the save. Writes that skip
+the signals record their changes in bulk. set_status() and the overdue sweep
+use one INSERT ... SELECT over the rows they move, and imports and seeding
+bulk_create() the creations in batches of HISTORY_BATCH_SIZE.
+
+time_in_stage() and transition_counts() are computed from the events
+alone, through the (user, entity, at) index, without reading the live
+tables.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import connections, router
+from django.db.models import Count, DateTimeField, F, Value, Window
+from django.db.models.functions import Lead as NextValue
+from django.utils import timezone
+
+from .models import Lead, Estimate, Job, Invoice, StatusEvent
+
+HISTORY_ENTITIES = {Lead: 'lead', Estimate: 'estimate', Job: 'job', Invoice: 'invoice'}
+HISTORY_BATCH_SIZE = 1000
+
+# Seconds between two timestamp columns, per database vendor
+SECONDS_BETWEEN = {
+    'postgresql': 'EXTRACT(EPOCH FROM {end} - {start})',
+    'sqlite': '(julianday({end}) - julianday({start})) * 86400',
+}
+
+
+def record_change(instance, from_status, to_status, at=None):
+    """Record one record's status change, if it is one; for the model signals"""
+    if from_status == to_status:
+        return
+    StatusEvent.objects.create(
+        user_id=instance.user_id, entity=HISTORY_ENTITIES[type(instance)], object_id=instance.pk,
+        from_status=from_status, to_status=to_status, at=at or timezone.now(),
+    )
+
+
+def record_created(instances, batch_size=HISTORY_BATCH_SIZE):
+    """Record the creation of bulk-created records, as of their created_at"""
+    StatusEvent.objects.bulk_create([
+        StatusEvent(
+            user_id=instance.user_id, entity=HISTORY_ENTITIES[type(instance)], object_id=instance.pk,
+            to_status=instance.status, at=instance.created_at,
+        )
+        for instance in instances
+    ], batch_size=batch_size)
+
+
+def record_moves(queryset, to_status, from_status=None, at=None):
+    """Record every row of `queryset` moving to `to_status`, with one INSERT ... SELECT.
+
+    The rows' current status is taken as where they came from unless
+    `from_status` says otherwise, so call it before the UPDATE, or after it
+    with `from_status`. Returns the number of events recorded.
+    """
+    model = queryset.model
+    using = router.db_for_write(StatusEvent)
+    rows = queryset.order_by().values(
+        event_user=F('user_id'),
+        event_entity=Value(HISTORY_ENTITIES[model]),
+        event_object=F('pk'),
+        event_from=Value(from_status) if from_status else F('status'),
+        event_to=Value(to_status),
+        event_at=Value(at or timezone.now(), output_field=DateTimeField()),
+    )
+    sql, params = rows.query.get_compiler(using).as_sql()
+    connection = connections[using]
+    columns = ', '.join(
+        connection.ops.quote_name(StatusEvent._meta.get_field(name).column)
+        for name in ('user', 'entity', 'object_id', 'from_status', 'to_status', 'at')
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO {connection.ops.quote_name(StatusEvent._meta.db_table)} ({columns}) {sql}', params)
+        return cursor.rowcount
+
+
+def _events(user, entity=None, since=None, until=None):
+    events = StatusEvent.objects.filter(user=user)
+    if entity is not None:
+        events = events.filter(entity=entity)
+    # Compare against day boundaries so the (user, entity, at) index stays usable
+    if since is not None:
+        events = events.filter(at__gte=timezone.make_aware(datetime.combine(since, time.min)))
+    if until is not None:
+        events = events.filter(at__lt=timezone.make_aware(datetime.combine(until + timedelta(days=1), time.min)))
+    return events
+
+
+def transition_counts(user, entity=None, since=None, until=None):
+    """[{'entity', 'from_status', 'to_status', 'count'}] for the changes made between the two days.
+
+    A from_status of None counts records created in to_status, a to_status
+    of None records deleted from from_status.
+    """
+    rows = (
+        _events(user, entity, since, until)
+        .values('entity', 'from_status', 'to_status')
+        .annotate(count=Count('id'))
+        .order_by('entity', 'from_status', 'to_status')
+    )
+    return list(rows)
+
+
+def time_in_stage(user, entity=None, since=None, until=None):
+    """{entity: {status: {'count', 'average_seconds', 'longest_seconds'}}}.
+
+    Each stint runs from the event that put a record in a status to its
+    next event. Only stints that ended between the two days are counted,
+    so records still in a status do not pull its average down.
+    """
+    # A stint may have begun before `since`, so only the end bounds the scan
+    stints = _events(user, entity, None, until).annotate(
+        left_at=Window(NextValue('at'), partition_by=F('object_id'), order_by=[F('at').asc(), F('id').asc()]),
+    ).values('entity', 'to_status', 'at', 'left_at')
+    using = router.db_for_read(StatusEvent)
+    connection = connections[using]
+    inner, params = stints.query.get_compiler(using).as_sql()
+    seconds = SECONDS_BETWEEN[connection.vendor].format(end='stints.left_at', start='stints.at')
+    sql = (
+        f'SELECT stints.entity, stints.to_status, COUNT(*), AVG({seconds}), MAX({seconds}) '
+        f'FROM ({inner}) stints WHERE stints.to_status IS NOT NULL AND stints.left_at IS NOT NULL'
+    )
+    params = list(params)
+    if since is not None:
+        sql += ' AND stints.left_at >= %s'
+        start = timezone.make_aware(datetime.combine(since, time.min))
+        params.append(connection.ops.adapt_datetimefield_value(start))
+    sql += ' GROUP BY stints.entity, stints.to_status ORDER BY stints.entity, stints.to_status'
+
+    stages = {}
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        for row_entity, status, count, average, longest in cursor.fetchall():
+            stages.setdefault(row_entity, {})[status] = {
+                'count': count,
+                'average_seconds': round(float(average), 1),
+                'longest_seconds': round(float(longest), 1),
+            }
+    return stages
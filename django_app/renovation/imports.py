@@ -0,0 +1,229 @@
+"""Batched CSV import of customers and leads.
+
+The file is read one row at a time; rows are validated and de-duplicated
+in memory against the user's existing records and the rows seen so far,
+then written with bulk_create() in chunks, each chunk in its own
+transaction, so a large import makes steady progress and a failure only
+loses the chunk in flight.
+"""
+import csv
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+
+from .models import Customer, Lead
+from .fragments import bump_versions
+from .history import record_created
+from .stats import invalidate_dashboard
+from .tasks import enqueue
+
+IMPORT_BATCH_SIZE = 1000
+NOT_UTF8 = 'The file is not UTF-8 text. Save it as "CSV UTF-8" and import it again.'
+LEAD_STATUSES = {value for value, _ in Lead.STATUS_CHOICES}
+
+
+class ImportResult:
+    """Running totals and per-row errors of one import"""
+
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.duplicates = 0
+        self.errors = []
+
+    def error(self, line, message):
+        self.errors.append((line, message))
+
+    def __str__(self):
+        return (
+            f'{self.rows} rows: {self.created} created, {self.duplicates} duplicates, '
+            f'{len(self.errors)} errors'
+        )
+
+
+def normalize_email(value):
+    return value.strip().lower()
+
+
+def normalize_phone(value):
+    return re.sub(r'\D', '', value or '')
+
+
+def _clean(row, name, max_length=None):
+    value = (row.get(name) or '').strip()
+    if max_length and len(value) > max_length:
+        raise ValidationError(f'{name} is longer than {max_length} characters.')
+    return value or None
+
+
+class BaseImporter:
+    model = None
+    required_columns = set()
+
+    def __init__(self, user, batch_size=IMPORT_BATCH_SIZE, progress=None):
+        self.user = user
+        self.batch_size = batch_size
+        self.progress = progress
+        self.result = ImportResult()
+        self.pending = []
+        self.load_existing()
+
+    def load_existing(self):
+        pass
+
+    def build(self, row):
+        """Return an unsaved instance, or None for a duplicate; raise ValidationError for bad rows"""
+        raise NotImplementedError
+
+    def run(self, lines):
+        reader = csv.DictReader(lines)
+        try:
+            missing = self.required_columns - set(reader.fieldnames or [])
+            if missing:
+                self.result.error(1, f'Missing required columns: {", ".join(sorted(missing))}')
+                return self.result
+
+            for row in reader:
+                self.result.rows += 1
+                try:
+                    obj = self.build(row)
+                except ValidationError as exc:
+                    self.result.error(reader.line_num, ' '.join(exc.messages))
+                    continue
+                if obj is None:
+                    self.result.duplicates += 1
+                    continue
+                self.pending.append(obj)
+                if len(self.pending) >= self.batch_size:
+                    self.flush()
+        except UnicodeDecodeError:
+            # Excel's plain "CSV" format is cp1252; the rows before this line are kept
+            self.result.error(reader.line_num + 1, NOT_UTF8)
+        self.flush()
+        self.finish()
+        return self.result
+
+    def flush(self):
+        if not self.pending:
+            return
+        with transaction.atomic():
+            self.write(self.pending)
+        self.result.created += len(self.pending)
+        self.pending = []
+        if self.progress:
+            self.progress(self.result)
+
+    def write(self, objs):
+        self.model.objects.bulk_create(objs, batch_size=self.batch_size)
+
+    def finish(self):
+        # bulk_create() skips the signals that keep these in step
+        invalidate_dashboard(self.user.pk)
+        bump_versions(self.user.pk, self.model._meta.model_name)
+
+
+class CustomerImporter(BaseImporter):
+    """Columns: name, email, phone, address, city, state, zip_code, notes"""
+
+    model = Customer
+    required_columns = {'name', 'email'}
+
+    def load_existing(self):
+        self.emails, self.phones = set(), set()
+        for email, phone in Customer.objects.for_user(self.user).values_list('email', 'phone').iterator():
+            self.emails.add(normalize_email(email))
+            if phone:
+                self.phones.add(normalize_phone(phone))
+
+    def build(self, row):
+        name = _clean(row, 'name', 255)
+        email = _clean(row, 'email', 254)
+        if not name or not email:
+            raise ValidationError('name and email are required.')
+        validate_email(email)
+        phone = _clean(row, 'phone', 50)
+
+        email_key, phone_key = normalize_email(email), normalize_phone(phone)
+        if email_key in self.emails or (phone_key and phone_key in self.phones):
+            return None
+        self.emails.add(email_key)
+        if phone_key:
+            self.phones.add(phone_key)
+
+        return Customer(
+            user=self.user, name=name, email=email, phone=phone,
+            address=_clean(row, 'address'), city=_clean(row, 'city', 100),
+            state=_clean(row, 'state', 50), zip_code=_clean(row, 'zip_code', 20),
+            notes=_clean(row, 'notes'),
+        )
+
+
+class LeadImporter(BaseImporter):
+    """Columns: project_name, customer_email, description, status, estimated_value"""
+
+    model = Lead
+    required_columns = {'project_name'}
+
+    def load_existing(self):
+        self.customers = {
+            normalize_email(email): pk
+            for pk, email in Customer.objects.for_user(self.user).values_list('pk', 'email').iterator()
+        }
+        self.seen = {
+            (customer_id, name.strip().lower())
+            for customer_id, name in Lead.objects.for_user(self.user).values_list('customer_id', 'project_name').iterator()
+        }
+
+    def build(self, row):
+        project_name = _clean(row, 'project_name', 255)
+        if not project_name:
+            raise ValidationError('project_name is required.')
+
+        customer_id = None
+        customer_email = _clean(row, 'customer_email')
+        if customer_email:
+            customer_id = self.customers.get(normalize_email(customer_email))
+            if customer_id is None:
+                raise ValidationError(f'No customer with email {customer_email}.')
+
+        status = _clean(row, 'status') or 'new'
+        if status not in LEAD_STATUSES:
+            raise ValidationError(f'Unknown status {status}.')
+
+        estimated_value = _clean(row, 'estimated_value')
+        if estimated_value is not None:
+            try:
+                amount = Decimal(estimated_value.replace(',', '').lstrip('$'))
+                if not amount.is_finite() or abs(amount) >= 10 ** 8:
+                    raise InvalidOperation
+                estimated_value = amount.quantize(Decimal('0.01'))
+            except InvalidOperation:
+                raise ValidationError(f'Invalid estimated_value {estimated_value}.')
+
+        key = (customer_id, project_name.lower())
+        if key in self.seen:
+            return None
+        self.seen.add(key)
+
+        return Lead(
+            user=self.user, customer_id=customer_id, project_name=project_name,
+            description=_clean(row, 'description'), status=status, estimated_value=estimated_value,
+        )
+
+    def write(self, objs):
+        super().write(objs)
+        record_created(objs, self.batch_size)
+
+    def finish(self):
+        super().finish()
+        # Recounting every lead of the user is too slow to wait for here
+        enqueue('rebuild_summaries', self.user, user_ids=[self.user.pk])
+
+
+IMPORTERS = {
+    'customers': CustomerImporter,
+    'leads': LeadImporter,
+}
@@ -0,0 +1,282 @@
+"""Per-request timing and query instrumentation.
+
+Every database connection gets a permanent execute_wrapper (installed on
+connection_created) that reports to the QueryRecorder of the current
+request, found through a context variable. The variable follows the request
+into async views and into the worker threads of gather_queries(), so queries
+run on other connections are counted too, without DEBUG's query log.
+RequestMetricsMiddleware records wall time, query count and
+time spent in the database, adds a Server-Timing header, logs slow requests
+and repeated queries (the usual sign of an N+1 loop), and feeds per-view
+histograms that the metrics view renders in the Prometheus text format.
+
+A streaming response (the CSV exports) runs most of its queries after the
+view has returned, as the server pulls each chunk. The middleware wraps its
+streaming_content so those queries report to the request's recorder, and
+records the request once the stream ends or the client goes away. Its
+Server-Timing header is sent before the body, so it covers the view alone.
+
+The histograms live in process memory: each worker process exposes its own
+series, which Prometheus sums when scraping every worker.
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# Collapse IN lists so the same lookup with a different number of ids
+# counts as one query shape
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+
+
+class QueryRecorder:
+    """execute_wrapper that counts queries, their time and repeated statements"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+        # Concurrent queries of one request report from several threads
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.duration += elapsed
+                self.count += 1
+                self.statements[IN_LIST.sub('IN (...)', sql)] += 1
+
+    def duplicates(self, threshold):
+        """[(sql, times)] for statements run at least `threshold` times"""
+        return [(sql, times) for sql, times in self.statements.most_common() if times >= threshold]
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+
+
+class MetricsRegistry:
+    """Thread-safe per-view histograms and counters"""
+
+    HISTOGRAMS = {
+        'renovation_request_duration_seconds': ('Wall time of a request.', DURATION_BUCKETS),
+        'renovation_request_db_seconds': ('Time a request spent in database queries.', DURATION_BUCKETS),
+        'renovation_request_queries': ('Database queries run by a request.', QUERY_BUCKETS),
+    }
+    COUNTERS = {
+        'renovation_requests_total': 'Requests handled, by status class.',
+        'renovation_duplicate_query_requests_total': 'Requests that repeated one query past the threshold.',
+        'renovation_slow_requests_total': 'Requests slower than RENOVATION_SLOW_REQUEST_MS.',
+    }
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {name: {} for name in self.HISTOGRAMS}
+            self.counters = {name: Counter() for name in self.COUNTERS}
+
+    def observe(self, name, labels, value):
+        with self.lock:
+            series = self.histograms[name]
+            if labels not in series:
+                series[labels] = Histogram(self.HISTOGRAMS[name][1])
+            series[labels].observe(value)
+
+    def increment(self, name, labels):
+        with self.lock:
+            self.counters[name][labels] += 1
+
+    def render(self):
+        """The registry in the Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            for name, (help_text, _) in self.HISTOGRAMS.items():
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+                for labels, histogram in sorted(self.histograms[name].items()):
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f'{name}_bucket{_labels(labels + (("le", str(bound)),))} {count}')
+                    lines.append(f'{name}_bucket{_labels(labels + (("le", "+Inf"),))} {histogram.total}')
+                    lines.append(f'{name}_sum{_labels(labels)} {histogram.sum:.6f}')
+                    lines.append(f'{name}_count{_labels(labels)} {histogram.total}')
+            for name, help_text in self.COUNTERS.items():
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+                for labels, count in sorted(self.counters[name].items()):
+                    lines.append(f'{name}{_labels(labels)} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(pairs):
+    escaped = (
+        (key, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in pairs
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+registry = MetricsRegistry()
+current_recorder = ContextVar('renovation_query_recorder', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    recorder = current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+# Marks the end of a wrapped stream
+_DONE = object()
+
+
+def _recorded_chunks(content, recorder):
+    """Yield the chunks of `content`, reporting the queries each one runs to `recorder`"""
+    iterator = iter(content)
+    while True:
+        token = current_recorder.set(recorder)
+        try:
+            chunk = next(iterator, _DONE)
+        finally:
+            current_recorder.reset(token)
+        if chunk is _DONE:
+            return
+        yield chunk
+
+
+async def _arecorded_chunks(content, recorder):
+    iterator = aiter(content)
+    while True:
+        token = current_recorder.set(recorder)
+        try:
+            chunk = await anext(iterator, _DONE)
+        finally:
+            current_recorder.reset(token)
+        if chunk is _DONE:
+            return
+        yield chunk
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """connection_created receiver adding record_query to every new connection"""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class RequestMetricsMiddleware:
+    """Time each request and its queries; see the module docstring"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, 'RENOVATION_SLOW_REQUEST_MS', 500)
+        self.duplicate_threshold = getattr(settings, 'RENOVATION_DUPLICATE_QUERY_THRESHOLD', 5)
+        self.server_timing = getattr(settings, 'RENOVATION_SERVER_TIMING', True)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        token = current_recorder.set(recorder)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        return self.finish(request, response, start, recorder)
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        token = current_recorder.set(recorder)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        return self.finish(request, response, start, recorder)
+
+    def finish(self, request, response, start, recorder):
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        elapsed = time.perf_counter() - start
+        if response.streaming:
+            response.streaming_content = self.stream(request, response, view, start, recorder)
+        else:
+            self.record(request, response, view, elapsed, recorder)
+        if self.server_timing:
+            response['Server-Timing'] = (
+                f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} queries", '
+                f'app;dur={(elapsed - recorder.duration) * 1000:.1f}, '
+                f'total;dur={elapsed * 1000:.1f}'
+            )
+        return response
+
+    def stream(self, request, response, view, start, recorder):
+        """The response's streaming_content, counted into `recorder` and recorded when it ends"""
+        content = response.streaming_content
+        if response.is_async:
+            async def chunks():
+                try:
+                    async for chunk in _arecorded_chunks(content, recorder):
+                        yield chunk
+                finally:
+                    self.record(request, response, view, time.perf_counter() - start, recorder)
+        else:
+            def chunks():
+                try:
+                    yield from _recorded_chunks(content, recorder)
+                finally:
+                    self.record(request, response, view, time.perf_counter() - start, recorder)
+        return chunks()
+
+    def record(self, request, response, view, elapsed, recorder):
+        labels = (('view', view), ('method', request.method))
+        registry.observe('renovation_request_duration_seconds', labels, elapsed)
+        registry.observe('renovation_request_db_seconds', labels, recorder.duration)
+        registry.observe('renovation_request_queries', labels, recorder.count)
+        registry.increment('renovation_requests_total', labels + (('status', f'{response.status_code // 100}xx'),))
+
+        duplicates = recorder.duplicates(self.duplicate_threshold)
+        if duplicates:
+            registry.increment('renovation_duplicate_query_requests_total', labels)
+            sql, times = duplicates[0]
+            logger.warning(
+                'Possible N+1 in %s %s (%s): %d statements repeated, worst %d times: %s',
+                request.method, request.path, view, len(duplicates), times, sql,
+            )
+        if elapsed * 1000 >= self.slow_ms:
+            registry.increment('renovation_slow_requests_total', labels)
+            logger.warning(
+                'Slow request %s %s (%s): %.0f ms, %d queries in %.0f ms',
+                request.method, request.path, view, elapsed * 1000, recorder.count, recorder.duration * 1000,
+            )
@@ -0,0 +1,118 @@
+import json
+import statistics
+import time
+from datetime import date
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+
+from renovation.models import Customer, Lead, Estimate, Job, Invoice, Payment
+from renovation.seeding import seed_portfolio
+
+
+class Rollback(Exception):
+    """Raised to undo the temporary index drops"""
+
+
+def benchmark_cases(user):
+    """The hot queries issued by renovation/views.py, keyed by a short name"""
+    return {
+        'customer_list': Customer.objects.for_user(user).for_list().order_by('-created_at', '-id')[:51],
+        'lead_list': Lead.objects.for_user(user).for_list().order_by('-created_at', '-id')[:51],
+        'estimate_list': Estimate.objects.for_user(user).for_list().order_by('-created_at', '-id')[:51],
+        'job_list': Job.objects.for_user(user).for_list().order_by('-created_at', '-id')[:51],
+        'invoice_list': Invoice.objects.for_user(user).for_list().order_by('-created_at', '-id')[:51],
+        'open_leads': Lead.objects.for_user(user).filter(status__in=['new', 'contacted']).order_by('-created_at')[:50],
+        'active_jobs': Job.objects.for_user(user).filter(status='in_progress').values('user').annotate(n=Count('id')),
+        'paid_revenue': Invoice.objects.for_user(user).filter(status='paid').values('user').annotate(
+            total=Sum('paid_amount')
+        ),
+        'past_due_invoices': Invoice.objects.for_user(user).filter(
+            status__in=['sent', 'overdue'], due_date__lt=date.today()
+        ).order_by('due_date').values('id', 'due_date'),
+        'lead_status_report': Lead.objects.for_user(user).values('status').annotate(count=Count('id')).order_by(),
+        'recent_payments': Payment.objects.for_user(user).summary()[:50],
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed realistic volumes and compare query plans and timings of the hot '
+        'renovation queries with and without the composite indexes. Indexes are '
+        'dropped inside a transaction that is rolled back, so do not run this '
+        'against a live database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=3, help='Number of benchmark users to seed.')
+        parser.add_argument('--customers', type=int, default=2000, help='Customers seeded per user.')
+        parser.add_argument('--no-seed', action='store_true', help='Reuse previously seeded benchmark users.')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed executions per query.')
+        parser.add_argument('--json', dest='json_path', help='Write the results to this file as JSON.')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for the data generator.')
+
+    def handle(self, *args, **options):
+        users = []
+        for i in range(options['users']):
+            user, _ = User.objects.get_or_create(username=f'bench-user-{i}')
+            users.append(user)
+            if not options['no_seed']:
+                counts = seed_portfolio(user, customers=options['customers'], seed=options['seed'])
+                self.stdout.write(f'Seeded {user.username}: {counts}')
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        cases = benchmark_cases(users[0])
+        results = {name: {'after': self.measure(qs, options['repeat'])} for name, qs in cases.items()}
+
+        try:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    for index in self.declared_indexes():
+                        cursor.execute(f'DROP INDEX {connection.ops.quote_name(index.name)}')
+                    cursor.execute('ANALYZE')
+                for name, qs in benchmark_cases(users[0]).items():
+                    results[name]['before'] = self.measure(qs, options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+        self.report(results)
+        if options['json_path']:
+            payload = {'vendor': connection.vendor, 'customers_per_user': options['customers'], 'results': results}
+            with open(options['json_path'], 'w') as fh:
+                json.dump(payload, fh, indent=2)
+            self.stdout.write(f'Wrote {options["json_path"]}')
+
+    def declared_indexes(self):
+        for model in apps.get_app_config('renovation').get_models():
+            yield from model._meta.indexes
+
+    def measure(self, queryset, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            list(queryset.all())
+            timings.append((time.perf_counter() - start) * 1000)
+        return {
+            'median_ms': round(statistics.median(timings), 3),
+            'min_ms': round(min(timings), 3),
+            'plan': queryset.explain(),
+        }
+
+    def report(self, results):
+        self.stdout.write(f'\n{"query":<22}{"before ms":>12}{"after ms":>12}{"speedup":>10}')
+        for name, result in results.items():
+            before, after = result['before']['median_ms'], result['after']['median_ms']
+            speedup = f'{before / after:.1f}x' if after else '-'
+            self.stdout.write(f'{name:<22}{before:>12.3f}{after:>12.3f}{speedup:>10}')
+        for name, result in results.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(f'\n{name}'))
+            for label in ('before', 'after'):
+                self.stdout.write(f'  {label}:')
+                for line in result[label]['plan'].splitlines():
+                    self.stdout.write(f'    {line}')
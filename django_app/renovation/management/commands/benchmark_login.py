@@ -0,0 +1,47 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from renovation.benchmarks import measure_logins
+
+from .benchmark_views import git_revision
+
+
+class Command(BaseCommand):
+    help = (
+        'Time logins through the login form and report logins per second, latency and '
+        'queries per login, next to the cost of one password hash. Creates the benchmark '
+        'user if it does not exist.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', default='bench-login', help='Username to log in as.')
+        parser.add_argument('--password', default='bench-login-password', help='Password of that user.')
+        parser.add_argument('--repeat', type=int, default=10, help='Timed logins.')
+        parser.add_argument('--warmup', type=int, default=1, help='Untimed logins.')
+        parser.add_argument('--json', dest='json_path', help='Write the result to this file as JSON.')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1')
+        user, created = User.objects.get_or_create(username=options['user'])
+        if created:
+            user.set_password(options['password'])
+            user.save(update_fields=['password'])
+
+        result = measure_logins(user.username, options['password'], options['repeat'], options['warmup'])
+        if result['status'] != 302:
+            raise CommandError(f'Login failed with status {result["status"]}; check --password')
+        self.stdout.write(
+            f'{result["logins_per_second"]:.2f} logins/s, p50 {result["p50_ms"]:.1f} ms, '
+            f'p95 {result["p95_ms"]:.1f} ms, {result["queries"]} queries per login, '
+            f'{result["hash_ms"]:.1f} ms per password hash'
+        )
+
+        if options['json_path']:
+            payload = {'revision': git_revision(), 'recorded_at': timezone.now().isoformat(), 'result': result}
+            with open(options['json_path'], 'w') as fh:
+                json.dump(payload, fh, indent=2)
+            self.stdout.write(f'Wrote {options["json_path"]}')
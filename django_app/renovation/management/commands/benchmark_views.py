@@ -0,0 +1,88 @@
+import json
+import subprocess
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from renovation.benchmarks import run_benchmarks
+from renovation.models import Customer, Lead, Estimate, Job, Invoice, Payment
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Time every GET view in renovation/urls.py as a seeded user and report p50/p95 '
+        'latency, query counts and peak memory. Seed data first with generate_data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', default='bench-user-0', help='Username to request the views as.')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed requests per view.')
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed requests per view.')
+        parser.add_argument('--only', nargs='+', help='Only run views whose name starts with one of these.')
+        parser.add_argument('--json', dest='json_path', help='Write the results to this file as JSON.')
+        parser.add_argument('--compare', help='Earlier --json output to show deltas against.')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1')
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f'Unknown user: {options["user"]}')
+
+        baseline = {}
+        if options['compare']:
+            with open(options['compare']) as fh:
+                baseline = json.load(fh)['results']
+
+        results = run_benchmarks(user, options['repeat'], options['warmup'], options['only'])
+        self.report(results, baseline)
+
+        if options['json_path']:
+            payload = {
+                'revision': git_revision(),
+                'recorded_at': timezone.now().isoformat(),
+                'vendor': connection.vendor,
+                'repeat': options['repeat'],
+                'rows': {
+                    model._meta.db_table: model.objects.for_user(user).count()
+                    for model in (Customer, Lead, Estimate, Job, Invoice, Payment)
+                },
+                'results': results,
+            }
+            with open(options['json_path'], 'w') as fh:
+                json.dump(payload, fh, indent=2)
+            self.stdout.write(f'Wrote {options["json_path"]}')
+
+    def report(self, results, baseline):
+        self.stdout.write(
+            f'{"view":<32}{"status":>7}{"p50 ms":>10}{"p95 ms":>10}{"queries":>9}{"peak KB":>10}'
+            + (f'{"p50 vs base":>13}' if baseline else '')
+        )
+        for name, result in results.items():
+            if result is None:
+                self.stdout.write(f'{name:<32}  skipped: no sample data')
+                continue
+            line = (
+                f'{name:<32}{result["status"]:>7}{result["p50_ms"]:>10.2f}{result["p95_ms"]:>10.2f}'
+                f'{result["queries"]:>9}{result["peak_kb"]:>10.1f}'
+            )
+            before = baseline.get(name)
+            if before:
+                change = (result['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0
+                queries = result['queries'] - before['queries']
+                line += f'{change:>+12.0f}%' + (f' ({queries:+d} queries)' if queries else '')
+            if result['status'] != 200:
+                line = self.style.WARNING(line)
+            self.stdout.write(line)
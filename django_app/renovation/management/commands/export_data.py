@@ -0,0 +1,43 @@
+import csv
+import sys
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from renovation.exports import EXPORTS, export_rows
+
+
+class Command(BaseCommand):
+    help = 'Stream a CSV export of leads, jobs, invoices or payments in constant memory.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('export', choices=sorted(EXPORTS))
+        parser.add_argument('--user', help='Only export records owned by this username.')
+        parser.add_argument('--since', type=date.fromisoformat, help='First day to include (YYYY-MM-DD).')
+        parser.add_argument('--until', type=date.fromisoformat, help='Last day to include (YYYY-MM-DD).')
+        parser.add_argument('--output', '-o', help='Write to this file instead of stdout.')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f'Unknown user: {options["user"]}')
+
+        rows = export_rows(options['export'], user, options['since'], options['until'])
+        if options['output']:
+            with open(options['output'], 'w', newline='') as fh:
+                written = self.write(fh, rows)
+            self.stderr.write(f'Wrote {written} rows to {options["output"]}')
+        else:
+            self.write(sys.stdout, rows)
+
+    def write(self, fh, rows):
+        writer = csv.writer(fh)
+        written = -1  # the header is not a data row
+        for row in rows:
+            writer.writerow(row)
+            written += 1
+        return written
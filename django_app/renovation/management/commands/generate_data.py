@@ -0,0 +1,70 @@
+import argparse
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from renovation.seeding import seed_portfolio
+
+
+def count_range(value):
+    """Parse ``N`` or ``LOW:HIGH`` into an inclusive (low, high) pair"""
+    low, _, high = value.partition(':')
+    try:
+        low, high = int(low), int(high or low)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'Expected N or LOW:HIGH, got {value!r}')
+    if low < 0 or high < low:
+        raise argparse.ArgumentTypeError(f'Invalid range {value!r}')
+    return low, high
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate synthetic users with customers, leads, estimates, line items, jobs, '
+        'materials, invoices and payments for load testing and benchmarks.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1, help='Number of users to create or top up.')
+        parser.add_argument('--prefix', default='bench-user', help='Usernames are <prefix>-<n>.')
+        parser.add_argument('--password', default='bench-password', help='Password set on new users.')
+        parser.add_argument('--customers', type=int, default=500, help='Customers per user.')
+        parser.add_argument('--leads-per-customer', type=count_range, default=(1, 3))
+        parser.add_argument('--items-per-estimate', type=int, default=8)
+        parser.add_argument('--materials-per-job', type=count_range, default=(2, 6))
+        parser.add_argument('--invoices-per-job', type=count_range, default=(1, 2))
+        parser.add_argument('--split-payment-rate', type=float, default=0.4,
+                            help='Share of paid invoices settled in two payments.')
+        parser.add_argument('--days', type=int, default=730, help='History spread over this many days.')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--seed', type=int, default=None, help='Random seed, for repeatable datasets.')
+
+    def handle(self, *args, **options):
+        totals = {}
+        started = time.monotonic()
+        for i in range(options['users']):
+            user, created = User.objects.get_or_create(username=f'{options["prefix"]}-{i}')
+            if created:
+                user.set_password(options['password'])
+                user.save(update_fields=['password'])
+            user_started = time.monotonic()
+            counts = seed_portfolio(
+                user,
+                customers=options['customers'],
+                days=options['days'],
+                items_per_estimate=options['items_per_estimate'],
+                batch_size=options['batch_size'],
+                seed=None if options['seed'] is None else options['seed'] + i,
+                leads_per_customer=options['leads_per_customer'],
+                materials_per_job=options['materials_per_job'],
+                invoices_per_job=options['invoices_per_job'],
+                split_payment_rate=options['split_payment_rate'],
+            )
+            for name, count in counts.items():
+                totals[name] = totals.get(name, 0) + count
+            self.stdout.write(f'{user.username}: {counts} ({time.monotonic() - user_started:.1f}s)')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {sum(totals.values()):,} rows in {time.monotonic() - started:.1f}s: {totals}'
+        ))
@@ -0,0 +1,49 @@
+import os
+import time
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from renovation.documents import DOCUMENTS, GENERATE_CHUNK_SIZE, generate
+
+
+class Command(BaseCommand):
+    help = (
+        'Render and store the PDFs of estimates or invoices (e.g. a month-end invoice run) '
+        'in parallel worker processes. Documents already stored at their current version are skipped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(DOCUMENTS))
+        parser.add_argument('--user', help='Only documents owned by this username.')
+        parser.add_argument('--status', action='append', help='Only documents with this status (repeatable).')
+        parser.add_argument('--since', type=date.fromisoformat, help='Created on or after (YYYY-MM-DD).')
+        parser.add_argument('--until', type=date.fromisoformat, help='Created on or before (YYYY-MM-DD).')
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count(), help='Worker processes (default: one per CPU).',
+        )
+        parser.add_argument('--chunk-size', type=int, default=GENERATE_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        queryset = DOCUMENTS[options['kind']][0].objects.all()
+        if options['user']:
+            try:
+                queryset = queryset.for_user(User.objects.get(username=options['user']))
+            except User.DoesNotExist:
+                raise CommandError(f'Unknown user: {options["user"]}')
+        if options['status']:
+            queryset = queryset.filter(status__in=options['status'])
+        if options['since']:
+            queryset = queryset.filter(created_at__date__gte=options['since'])
+        if options['until']:
+            queryset = queryset.filter(created_at__date__lte=options['until'])
+
+        started = time.perf_counter()
+        rendered, current = generate(
+            options['kind'], queryset, processes=max(1, options['processes']), chunk_size=options['chunk_size'],
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered {rendered} {options["kind"]} PDFs in {elapsed:.1f}s; {current} were already current.'
+        ))
@@ -0,0 +1,39 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from renovation.imports import IMPORT_BATCH_SIZE, IMPORTERS
+
+
+class Command(BaseCommand):
+    help = 'Import customers or leads for a user from a CSV file, in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORTERS))
+        parser.add_argument('path', help='CSV file with a header row.')
+        parser.add_argument('--user', required=True, help='Username that will own the imported records.')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument('--max-errors', type=int, default=50, help='Per-row errors to print.')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f'Unknown user: {options["user"]}')
+
+        started = time.monotonic()
+
+        def progress(result):
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'{result} ({result.rows / max(elapsed, 1e-6):,.0f} rows/s)')
+
+        importer = IMPORTERS[options['kind']](user, batch_size=options['batch_size'], progress=progress)
+        with open(options['path'], newline='', encoding='utf-8-sig') as fh:
+            result = importer.run(fh)
+
+        for line, message in result.errors[:options['max_errors']]:
+            self.stderr.write(f'line {line}: {message}')
+        if len(result.errors) > options['max_errors']:
+            self.stderr.write(f'... and {len(result.errors) - options["max_errors"]} more errors')
+        self.stdout.write(self.style.SUCCESS(f'Done in {time.monotonic() - started:.1f}s: {result}'))
@@ -0,0 +1,22 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from renovation.reporting import rebuild_summaries
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the materialized status summaries used by the reports view.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help='Only rebuild these users (default: everyone).')
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options['usernames']:
+            users = dict(User.objects.filter(username__in=options['usernames']).values_list('username', 'pk'))
+            missing = set(options['usernames']) - set(users)
+            if missing:
+                raise CommandError(f'Unknown users: {", ".join(sorted(missing))}')
+            user_ids = list(users.values())
+        rows = rebuild_summaries(user_ids)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} summary rows.'))
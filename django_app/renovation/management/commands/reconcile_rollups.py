@@ -0,0 +1,40 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from renovation.rollups import RECONCILE_BATCH_SIZE, reconcile
+
+
+class Command(BaseCommand):
+    help = (
+        'Check the denormalized money totals (invoice paid amounts, job costs and '
+        'revenue, customer lifetime value) against the live tables, and repair drift.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help='Only check these users (default: everyone).')
+        parser.add_argument('--repair', action='store_true', help='Rewrite the totals that disagree.')
+        parser.add_argument('--batch-size', type=int, default=RECONCILE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options['usernames']:
+            users = dict(User.objects.filter(username__in=options['usernames']).values_list('username', 'pk'))
+            missing = set(options['usernames']) - set(users)
+            if missing:
+                raise CommandError(f'Unknown users: {", ".join(sorted(missing))}')
+            user_ids = list(users.values())
+
+        report = reconcile(user_ids, repair=options['repair'], batch_size=options['batch_size'])
+        drifted = 0
+        for model, fields in report.items():
+            for field, rows in fields.items():
+                drifted += rows
+                line = f'{model}.{field}: {rows} rows out of step'
+                self.stdout.write(self.style.WARNING(line) if rows else line)
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS('All rollups match.'))
+        elif options['repair']:
+            self.stdout.write(self.style.SUCCESS('Repaired.'))
+        else:
+            self.stdout.write('Run again with --repair to fix them.')
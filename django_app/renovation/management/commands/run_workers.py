@@ -0,0 +1,99 @@
+import logging
+import multiprocessing
+import signal
+import threading
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from renovation.tasks import claim, run_task, worker_name
+
+logger = logging.getLogger('renovation.tasks')
+
+
+def work(stop, once, poll_interval, timeout):
+    """Claim and run tasks in this thread until `stop` is set"""
+    worker = worker_name()
+    try:
+        while not stop.is_set():
+            # What the request cycle does: drop connections past CONN_MAX_AGE or broken
+            close_old_connections()
+            try:
+                task = claim(worker, timeout)
+                if task is not None:
+                    run_task(task, worker)
+                    continue
+            except Exception:
+                # A task caught mid-claim or mid-record is due again after its timeout
+                logger.exception('Worker %s could not reach the task queue', worker)
+            else:
+                if once:
+                    break
+            stop.wait(poll_interval)
+    finally:
+        connections.close_all()
+
+
+def serve(stop, threads, once, poll_interval, timeout):
+    """Run `threads` workers in this process"""
+    django.setup()  # a no-op unless this process was spawned rather than forked
+    workers = [
+        threading.Thread(target=work, args=(stop, once, poll_interval, timeout), name=f'worker-{i}')
+        for i in range(threads)
+    ]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+
+def child(stop, *args):
+    # Ctrl+C reaches the whole process group; the parent relays it as `stop`
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    serve(stop, *args)
+
+
+class Command(BaseCommand):
+    help = (
+        'Run background tasks (PDFs, exports, sweeps, recomputations) from the task queue '
+        'in a pool of worker processes and threads.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1, help='Worker processes (default 1).')
+        parser.add_argument('--threads', type=int, default=4, help='Worker threads per process (default 4).')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait when no task is due.')
+        parser.add_argument(
+            '--visibility-timeout', type=int,
+            help='Seconds a task stays claimed before another worker may retry it.',
+        )
+        parser.add_argument('--once', action='store_true', help='Exit once no task is due.')
+
+    def handle(self, *args, **options):
+        processes, threads = max(1, options['processes']), max(1, options['threads'])
+        context = multiprocessing.get_context()
+        stop = context.Event()
+        serve_args = (threads, options['once'], options['poll_interval'], options['visibility_timeout'])
+
+        def shutdown(signum, frame):
+            self.stderr.write('Stopping after the tasks in progress...')
+            stop.set()
+
+        previous = {signum: signal.signal(signum, shutdown) for signum in (signal.SIGINT, signal.SIGTERM)}
+        self.stdout.write(f'Running {processes} process(es) x {threads} thread(s)')
+        try:
+            if processes == 1:
+                serve(stop, *serve_args)
+                return
+            # Children must not inherit the parent's open connections
+            connections.close_all()
+            pool = [context.Process(target=child, args=(stop, *serve_args)) for _ in range(processes)]
+            for process in pool:
+                process.start()
+            for process in pool:
+                process.join()
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
@@ -0,0 +1,32 @@
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from renovation.overdue import preview_overdue, sweep_overdue
+
+
+class Command(BaseCommand):
+    help = (
+        'Mark every sent invoice past its due date as overdue with one set-based UPDATE, '
+        'and print what was marked per user. Meant to run daily from cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=date.fromisoformat, help='Sweep as of this day (default: today).')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be marked.')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            report = preview_overdue(options['date'])
+        else:
+            report = sweep_overdue(options['date'])
+
+        usernames = dict(User.objects.filter(pk__in=report).values_list('pk', 'username'))
+        for user_id, line in sorted(report.items(), key=lambda item: usernames.get(item[0], '')):
+            self.stdout.write(
+                f'{usernames.get(user_id, user_id)}: {line["count"]} invoices, ${line["balance"]:,.2f} outstanding'
+            )
+        total = sum(line['count'] for line in report.values())
+        verb = 'Would mark' if options['dry_run'] else 'Marked'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {total} invoices overdue for {len(report)} users.'))
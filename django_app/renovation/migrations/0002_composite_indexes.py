@@ -0,0 +1,119 @@
+# Generated by Django 5.2.7 on 2026-10-18 00:33
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("renovation", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="customer",
+            index=models.Index(
+                fields=["user", "-created_at", "-id"], name="customers_user_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="estimate",
+            index=models.Index(
+                fields=["user", "status"], name="estimates_user_status_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="estimate",
+            index=models.Index(
+                fields=["user", "-created_at", "-id"], name="estimates_user_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="estimate",
+            index=models.Index(
+                condition=models.Q(("status__in", ["draft", "sent"])),
+                fields=["user", "-created_at"],
+                name="estimates_user_open_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="invoice",
+            index=models.Index(
+                fields=["user", "status"], name="invoices_user_status_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="invoice",
+            index=models.Index(
+                fields=["user", "-created_at", "-id"], name="invoices_user_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="invoice",
+            index=models.Index(
+                condition=models.Q(("status", "paid")),
+                fields=["user", "paid_amount"],
+                name="invoices_user_paid_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="invoice",
+            index=models.Index(
+                condition=models.Q(("status__in", ["sent", "overdue"])),
+                fields=["user", "due_date"],
+                name="invoices_user_open_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="job",
+            index=models.Index(fields=["user", "status"], name="jobs_user_status_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="job",
+            index=models.Index(
+                fields=["user", "-created_at", "-id"], name="jobs_user_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="job",
+            index=models.Index(
+                condition=models.Q(("status", "in_progress")),
+                fields=["user", "start_date"],
+                name="jobs_user_active_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="lead",
+            index=models.Index(fields=["user", "status"], name="leads_user_status_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="lead",
+            index=models.Index(
+                fields=["user", "-created_at", "-id"], name="leads_user_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="lead",
+            index=models.Index(
+                condition=models.Q(
+                    ("status__in", ["new", "contacted", "qualified", "estimate_sent"])
+                ),
+                fields=["user", "-created_at"],
+                name="leads_user_open_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                fields=["user", "-payment_date"], name="payments_user_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                fields=["user", "-created_at"], name="payments_user_created_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.7 on 2026-10-18 00:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("renovation", "0002_composite_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StatusSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "entity",
+                    models.CharField(
+                        choices=[
+                            ("lead", "Lead"),
+                            ("estimate", "Estimate"),
+                            ("job", "Job"),
+                            ("invoice", "Invoice"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("status", models.CharField(max_length=20)),
+                ("day", models.DateField()),
+                ("count", models.IntegerField(default=0)),
+                (
+                    "amount",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="status_summaries",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "status_summaries",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("user", "entity", "status", "day"),
+                        name="status_summaries_key",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.2.7 on 2026-10-18 00:51
+
+import django.db.models.expressions
+from django.db import migrations, models
+from django.db.models import DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def _total(queryset, parent, field):
+    totals = (
+        queryset.filter(**{parent: OuterRef("pk")})
+        .order_by()
+        .values(parent)
+        .annotate(total=Sum(field))
+        .values("total")
+    )
+    output = DecimalField(max_digits=14, decimal_places=2)
+    return Coalesce(
+        Subquery(totals, output_field=output), Value(0), output_field=output
+    )
+
+
+def backfill_rollups(apps, schema_editor):
+    Customer = apps.get_model("renovation", "Customer")
+    Job = apps.get_model("renovation", "Job")
+    Material = apps.get_model("renovation", "Material")
+    Invoice = apps.get_model("renovation", "Invoice")
+    Payment = apps.get_model("renovation", "Payment")
+    Job.objects.update(
+        material_cost=_total(Material.objects.all(), "job", "total_cost"),
+        invoiced_total=_total(
+            Invoice.objects.exclude(status="cancelled"), "job", "total_amount"
+        ),
+        paid_total=_total(Payment.objects.all(), "invoice__job", "amount"),
+    )
+    Customer.objects.update(
+        lifetime_value=_total(
+            Payment.objects.all(), "invoice__job__estimate__lead__customer", "amount"
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("renovation", "0004_updated_at_timestamps"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customer",
+            name="lifetime_value",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name="invoice",
+            name="balance_due",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=django.db.models.expressions.CombinedExpression(
+                    models.F("total_amount"), "-", models.F("paid_amount")
+                ),
+                output_field=models.DecimalField(decimal_places=2, max_digits=10),
+            ),
+        ),
+        migrations.AddField(
+            model_name="job",
+            name="invoiced_total",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name="job",
+            name="material_cost",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name="job",
+            name="paid_total",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
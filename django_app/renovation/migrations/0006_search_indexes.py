@@ -0,0 +1,61 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.operations import BtreeGinExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import F
+
+# model -> (index name, leads with user_id, [(field, weight)]); the queries of
+# renovation.search use the same expressions. SQLite gets FTS5 tables instead
+# (renovation.search.install_fts_tables).
+SEARCH_INDEXES = {
+    "customer": (
+        "customers_search_idx",
+        True,
+        [("name", "A"), ("address", "B"), ("notes", "C")],
+    ),
+    "lead": ("leads_search_idx", True, [("project_name", "A"), ("description", "B")]),
+    "sitevisit": (
+        "site_visits_search_idx",
+        True,
+        [("notes", "B"), ("measurements", "C")],
+    ),
+    "estimateitem": ("estimate_items_search_idx", False, [("description", "B")]),
+}
+
+
+def _indexes(apps):
+    for model_name, (name, by_user, fields) in SEARCH_INDEXES.items():
+        vector = None
+        for field, weight in fields:
+            part = SearchVector(field, weight=weight, config="english")
+            vector = part if vector is None else vector + part
+        expressions = [F("user"), vector] if by_user else [vector]
+        yield apps.get_model("renovation", model_name), GinIndex(
+            *expressions, name=name
+        )
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for model, index in _indexes(apps):
+        schema_editor.add_index(model, index)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for model, index in _indexes(apps):
+        schema_editor.remove_index(model, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("renovation", "0005_money_rollups"),
+    ]
+
+    operations = [
+        BtreeGinExtension(),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
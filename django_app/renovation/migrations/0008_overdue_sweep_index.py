@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 01:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("renovation", "0007_task_queue"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="invoice",
+            index=models.Index(
+                condition=models.Q(("status", "sent")),
+                fields=["due_date"],
+                name="invoices_sent_due_idx",
+            ),
+        ),
+    ]
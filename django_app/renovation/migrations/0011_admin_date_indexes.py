@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-18 01:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("renovation", "0010_site_visit_photos"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="customer",
+            index=models.Index(fields=["-created_at"], name="customers_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="estimate",
+            index=models.Index(fields=["-created_at"], name="estimates_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="invoice",
+            index=models.Index(fields=["-created_at"], name="invoices_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="job",
+            index=models.Index(fields=["-created_at"], name="jobs_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="lead",
+            index=models.Index(fields=["-created_at"], name="leads_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(fields=["-payment_date"], name="payments_date_idx"),
+        ),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 5.2.7 on 2026-10-18 01:58
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def backfill_current_status(apps, schema_editor):
+    # Earlier changes were never recorded; each record has been in its
+    # current status at least since it was last updated
+    StatusEvent = apps.get_model("renovation", "StatusEvent")
+    for name in ("Lead", "Estimate", "Job", "Invoice"):
+        model = apps.get_model("renovation", name)
+        rows = model.objects.values_list("user_id", "pk", "status", "updated_at")
+        events = []
+        for user_id, pk, status, updated_at in rows.iterator(
+            chunk_size=BACKFILL_BATCH_SIZE
+        ):
+            events.append(
+                StatusEvent(
+                    user_id=user_id,
+                    entity=name.lower(),
+                    object_id=pk,
+                    to_status=status,
+                    at=updated_at,
+                )
+            )
+            if len(events) == BACKFILL_BATCH_SIZE:
+                StatusEvent.objects.bulk_create(events)
+                events = []
+        StatusEvent.objects.bulk_create(events)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("renovation", "0011_admin_date_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StatusEvent",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                (
+                    "entity",
+                    models.CharField(
+                        choices=[
+                            ("lead", "Lead"),
+                            ("estimate", "Estimate"),
+                            ("job", "Job"),
+                            ("invoice", "Invoice"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("object_id", models.UUIDField()),
+                ("from_status", models.CharField(blank=True, max_length=20, null=True)),
+                ("to_status", models.CharField(blank=True, max_length=20, null=True)),
+                ("at", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="status_events",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "status_events",
+                "indexes": [
+                    models.Index(
+                        fields=["user", "entity", "at"], name="status_events_user_idx"
+                    ),
+                    models.Index(
+                        fields=["object_id", "at"], name="status_events_object_idx"
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_current_status, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,110 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:03
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("renovation", "0012_status_events"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Tombstone",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("entity", models.CharField(max_length=20)),
+                ("object_id", models.UUIDField()),
+                ("deleted_at", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                "db_table": "tombstones",
+            },
+        ),
+        migrations.AddField(
+            model_name="sitevisitphoto",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name="customer",
+            index=models.Index(
+                fields=["user", "updated_at", "id"], name="customers_user_updated_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="estimate",
+            index=models.Index(
+                fields=["user", "updated_at", "id"], name="estimates_user_updated_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="estimateitem",
+            index=models.Index(
+                fields=["updated_at", "id"], name="estimate_items_updated_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="invoice",
+            index=models.Index(
+                fields=["user", "updated_at", "id"], name="invoices_user_updated_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="job",
+            index=models.Index(
+                fields=["user", "updated_at", "id"], name="jobs_user_updated_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="lead",
+            index=models.Index(
+                fields=["user", "updated_at", "id"], name="leads_user_updated_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="material",
+            index=models.Index(
+                fields=["user", "updated_at", "id"], name="materials_user_updated_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                fields=["user", "updated_at", "id"], name="payments_user_updated_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="sitevisit",
+            index=models.Index(
+                fields=["user", "updated_at", "id"], name="site_visits_user_updated_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="sitevisitphoto",
+            index=models.Index(
+                fields=["user", "updated_at", "id"],
+                name="visit_photos_user_updated_idx",
+            ),
+        ),
+        migrations.AddField(
+            model_name="tombstone",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="tombstones",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="tombstone",
+            index=models.Index(
+                fields=["user", "deleted_at", "id"], name="tombstones_user_deleted_idx"
+            ),
+        ),
+    ]
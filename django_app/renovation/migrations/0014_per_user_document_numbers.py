@@ -0,0 +1,48 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("renovation", "0013_change_feed"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="estimate",
+            name="estimate_number",
+            field=models.CharField(blank=True, default="", max_length=50),
+        ),
+        migrations.AlterField(
+            model_name="invoice",
+            name="invoice_number",
+            field=models.CharField(blank=True, default="", max_length=50),
+        ),
+        migrations.AlterField(
+            model_name="job",
+            name="job_number",
+            field=models.CharField(blank=True, default="", max_length=50),
+        ),
+        migrations.AddConstraint(
+            model_name="estimate",
+            constraint=models.UniqueConstraint(
+                fields=("user", "estimate_number"), name="estimates_number_key"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="invoice",
+            constraint=models.UniqueConstraint(
+                fields=("user", "invoice_number"), name="invoices_number_key"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="job",
+            constraint=models.UniqueConstraint(
+                fields=("user", "job_number"), name="jobs_number_key"
+            ),
+        ),
+    ]
@@ -1,9 +1,164 @@
-from django.db import models
+from decimal import Decimal
+
+from django.core.files.storage import default_storage
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 from django.contrib.postgres.fields import ArrayField
+from django.utils import timezone
 import uuid
 
 
+class UserOwnedQuerySet(models.QuerySet):
+    """Base queryset for records owned by a single user"""
+
+    def for_user(self, user):
+        return self.filter(user=user)
+
+
+class CustomerQuerySet(UserOwnedQuerySet):
+    """Query builders for the customer views"""
+
+    def for_list(self):
+        return self.only('id', 'name', 'email', 'phone', 'city', 'state', 'created_at')
+
+
+class LeadQuerySet(UserOwnedQuerySet):
+    """Query builders for the lead views"""
+
+    def for_list(self):
+        return self.select_related('customer').only(
+            'id', 'project_name', 'status', 'estimated_value', 'created_at',
+            'customer', 'customer__name',
+        )
+
+    def for_detail(self):
+        return self.select_related('customer')
+
+    def summary(self):
+        return self.only('id', 'customer', 'project_name', 'status', 'estimated_value', 'created_at')
+
+
+class SiteVisitQuerySet(UserOwnedQuerySet):
+    """Query builders for the site visit panels"""
+
+    def summary(self):
+        return self.only('id', 'lead', 'visit_date', 'notes')
+
+    def with_photos(self):
+        photos = SiteVisitPhoto.objects.only('id', 'site_visit', 'sha256', 'extension', 'name', 'variants_ready')
+        return self.prefetch_related(models.Prefetch('photos', queryset=photos))
+
+
+class EstimateQuerySet(UserOwnedQuerySet):
+    """Query builders for the estimate views"""
+
+    def for_list(self):
+        return self.select_related('lead').only(
+            'id', 'estimate_number', 'status', 'total_amount', 'valid_until', 'created_at',
+            'lead', 'lead__project_name',
+        )
+
+    def for_detail(self):
+        return self.select_related('lead')
+
+    def for_pdf(self):
+        return self.select_related('lead__customer', 'user__profile').prefetch_related(
+            models.Prefetch('items', queryset=EstimateItem.objects.order_by('created_at', 'pk'))
+        )
+
+    def summary(self):
+        return self.only('id', 'lead', 'estimate_number', 'status', 'total_amount', 'created_at')
+
+
+class EstimateItemQuerySet(models.QuerySet):
+    """Line items are owned through their estimate"""
+
+    def for_user(self, user):
+        return self.filter(estimate__user=user)
+
+
+class JobQuerySet(UserOwnedQuerySet):
+    """Query builders for the job views"""
+
+    def for_list(self):
+        return self.only('id', 'job_number', 'status', 'start_date', 'end_date', 'created_at')
+
+    def for_detail(self):
+        return self.only(
+            'id', 'job_number', 'status', 'start_date', 'end_date', 'actual_start_date', 'actual_end_date',
+            'notes', *Job.ROLLUP_FIELDS,
+        )
+
+    def summary(self):
+        return self.for_list()
+
+
+class MaterialQuerySet(UserOwnedQuerySet):
+    """Query builders for the materials panel"""
+
+    def summary(self):
+        return self.only('id', 'job', 'name', 'quantity', 'unit', 'total_cost')
+
+
+class InvoiceQuerySet(UserOwnedQuerySet):
+    """Query builders for the invoice views"""
+
+    def for_list(self):
+        return self.select_related('job').only(
+            'id', 'invoice_number', 'status', 'total_amount', 'paid_amount', 'due_date', 'created_at',
+            'job', 'job__job_number',
+        )
+
+    def for_detail(self):
+        return self.select_related('job')
+
+    def for_pdf(self):
+        return self.select_related('job__estimate__lead__customer', 'user__profile').prefetch_related(
+            models.Prefetch('payments', queryset=Payment.objects.order_by('payment_date', 'pk'))
+        )
+
+    def summary(self):
+        return self.only('id', 'job', 'invoice_number', 'status', 'total_amount', 'created_at')
+
+
+class PaymentQuerySet(UserOwnedQuerySet):
+    """Query builders for the payments panel"""
+
+    def summary(self):
+        return self.only('id', 'invoice', 'payment_date', 'amount', 'payment_method', 'reference_number')
+
+
+class TaskQuerySet(UserOwnedQuerySet):
+    """Query builders for the task queue"""
+
+    def due(self, now):
+        """Queued tasks whose time has come, and running ones whose claim expired"""
+        return self.filter(status__in=['queued', 'running'], available_at__lte=now)
+
+
+class RollupModel(models.Model):
+    """Base for models that carry or feed totals kept by renovation.rollups"""
+
+    # Totals moved with F() updates as related rows change; save() never
+    # writes back the possibly stale copy loaded with the instance
+    ROLLUP_FIELDS = ()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if self.ROLLUP_FIELDS and not self._state.adding and kwargs.get('update_fields') is None:
+            skipped = self.get_deferred_fields() | set(self.ROLLUP_FIELDS)
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and not field.generated and field.name not in skipped
+            ]
+        # The row and the rollup updates made by its signals commit together
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+
 class Profile(models.Model):
     """User profile with extended information"""
     ROLE_CHOICES = [
@@ -30,7 +185,7 @@ class Profile(models.Model):
         db_table = 'profiles'
 
 
-class Customer(models.Model):
+class Customer(RollupModel):
     """Customer information"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='customers')
@@ -42,15 +197,25 @@ class Customer(models.Model):
     state = models.CharField(max_length=50, blank=True, null=True)
     zip_code = models.CharField(max_length=20, blank=True, null=True)
     notes = models.TextField(blank=True, null=True)
+    lifetime_value = models.DecimalField(max_digits=14, decimal_places=2, default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    ROLLUP_FIELDS = ('lifetime_value',)
+
+    objects = CustomerQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
     class Meta:
         db_table = 'customers'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at'], name='customers_created_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='customers_user_created_idx'),
+            models.Index(fields=['user', 'updated_at', 'id'], name='customers_user_updated_idx'),
+        ]
 
 
 class Lead(models.Model):
@@ -74,12 +239,24 @@ class Lead(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = LeadQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.project_name} ({self.status})"
 
     class Meta:
         db_table = 'leads'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at'], name='leads_created_idx'),
+            models.Index(fields=['user', 'status'], name='leads_user_status_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='leads_user_created_idx'),
+            models.Index(fields=['user', 'updated_at', 'id'], name='leads_user_updated_idx'),
+            models.Index(
+                fields=['user', '-created_at'], name='leads_user_open_idx',
+                condition=models.Q(status__in=['new', 'contacted', 'qualified', 'estimate_sent']),
+            ),
+        ]
 
 
 class SiteVisit(models.Model):
@@ -94,12 +271,69 @@ class SiteVisit(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = SiteVisitQuerySet.as_manager()
+
     def __str__(self):
         return f"Site Visit for {self.lead.project_name} on {self.visit_date.strftime('%Y-%m-%d')}"
 
     class Meta:
         db_table = 'site_visits'
         ordering = ['-visit_date']
+        indexes = [
+            models.Index(fields=['user', 'updated_at', 'id'], name='site_visits_user_updated_idx'),
+        ]
+
+
+class SiteVisitPhoto(models.Model):
+    """A photo uploaded to a site visit, stored once per content hash (renovation.photos)"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='site_visit_photos')
+    site_visit = models.ForeignKey(SiteVisit, on_delete=models.CASCADE, related_name='photos')
+    sha256 = models.CharField(max_length=64)
+    extension = models.CharField(max_length=10)
+    name = models.CharField(max_length=255, blank=True)
+    size = models.PositiveBigIntegerField()
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    variants_ready = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = UserOwnedQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.name or self.sha256[:12]} ({self.width}x{self.height})"
+
+    @staticmethod
+    def storage_name(sha256, extension):
+        return f'photos/{sha256[:2]}/{sha256}.{extension}'
+
+    @staticmethod
+    def variant_name(sha256, variant):
+        return f'photos/{sha256[:2]}/{sha256}-{variant}.webp'
+
+    @property
+    def url(self):
+        return default_storage.url(self.storage_name(self.sha256, self.extension))
+
+    @property
+    def thumbnail_url(self):
+        return default_storage.url(self.variant_name(self.sha256, 'thumb'))
+
+    @property
+    def large_url(self):
+        return default_storage.url(self.variant_name(self.sha256, 'large'))
+
+    class Meta:
+        db_table = 'site_visit_photos'
+        ordering = ['created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['site_visit', 'sha256'], name='site_visit_photos_key'),
+        ]
+        indexes = [
+            models.Index(fields=['sha256'], name='site_visit_photos_sha_idx'),
+            models.Index(fields=['user', 'updated_at', 'id'], name='visit_photos_user_updated_idx'),
+        ]
 
 
 class Estimate(models.Model):
@@ -114,7 +348,8 @@ class Estimate(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='estimates')
     lead = models.ForeignKey(Lead, on_delete=models.CASCADE, related_name='estimates')
-    estimate_number = models.CharField(max_length=50, unique=True)
+    # Left blank, the next number is allocated on save (renovation.numbering)
+    estimate_number = models.CharField(max_length=50, blank=True, default='')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft')
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
     labor_cost = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
@@ -125,12 +360,41 @@ class Estimate(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = EstimateQuerySet.as_manager()
+
     def __str__(self):
         return f"Estimate {self.estimate_number} - ${self.total_amount}"
 
+    def recalculate_totals(self):
+        """Roll the line items up into the cost fields with one aggregate query"""
+        zero = models.Value(Decimal('0'))
+        totals = self.items.aggregate(
+            subtotal=Coalesce(models.Sum('total_price'), zero),
+            labor=Coalesce(models.Sum('total_price', filter=models.Q(category='labor')), zero),
+            material=Coalesce(models.Sum('total_price', filter=models.Q(category='material')), zero),
+        )
+        self.labor_cost = totals['labor']
+        self.material_cost = totals['material']
+        self.total_amount = totals['subtotal'] + (self.tax_amount or 0)
+        self.save(update_fields=['labor_cost', 'material_cost', 'total_amount', 'updated_at'])
+
     class Meta:
         db_table = 'estimates'
         ordering = ['-created_at']
+        # Numbers run per user, so they are only unique within an account
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'estimate_number'], name='estimates_number_key'),
+        ]
+        indexes = [
+            models.Index(fields=['-created_at'], name='estimates_created_idx'),
+            models.Index(fields=['user', 'status'], name='estimates_user_status_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='estimates_user_created_idx'),
+            models.Index(fields=['user', 'updated_at', 'id'], name='estimates_user_updated_idx'),
+            models.Index(
+                fields=['user', '-created_at'], name='estimates_user_open_idx',
+                condition=models.Q(status__in=['draft', 'sent']),
+            ),
+        ]
 
 
 class EstimateItem(models.Model):
@@ -143,15 +407,21 @@ class EstimateItem(models.Model):
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
     category = models.CharField(max_length=100, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = EstimateItemQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.description} - ${self.total_price}"
 
     class Meta:
         db_table = 'estimate_items'
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='estimate_items_updated_idx'),
+        ]
 
 
-class Job(models.Model):
+class Job(RollupModel):
     """Construction/Renovation jobs"""
     STATUS_CHOICES = [
         ('scheduled', 'Scheduled'),
@@ -164,25 +434,47 @@ class Job(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='jobs')
     estimate = models.ForeignKey(Estimate, on_delete=models.CASCADE, related_name='jobs')
-    job_number = models.CharField(max_length=50, unique=True)
+    # Left blank, the next number is allocated on save (renovation.numbering)
+    job_number = models.CharField(max_length=50, blank=True, default='')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='scheduled')
     start_date = models.DateField(blank=True, null=True)
     end_date = models.DateField(blank=True, null=True)
     actual_start_date = models.DateField(blank=True, null=True)
     actual_end_date = models.DateField(blank=True, null=True)
     notes = models.TextField(blank=True, null=True)
+    material_cost = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    invoiced_total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    paid_total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    ROLLUP_FIELDS = ('material_cost', 'invoiced_total', 'paid_total')
+
+    objects = JobQuerySet.as_manager()
+
     def __str__(self):
         return f"Job {self.job_number} ({self.status})"
 
     class Meta:
         db_table = 'jobs'
         ordering = ['-created_at']
-
-
-class Material(models.Model):
+        # Numbers run per user, so they are only unique within an account
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'job_number'], name='jobs_number_key'),
+        ]
+        indexes = [
+            models.Index(fields=['-created_at'], name='jobs_created_idx'),
+            models.Index(fields=['user', 'status'], name='jobs_user_status_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='jobs_user_created_idx'),
+            models.Index(fields=['user', 'updated_at', 'id'], name='jobs_user_updated_idx'),
+            models.Index(
+                fields=['user', 'start_date'], name='jobs_user_active_idx',
+                condition=models.Q(status='in_progress'),
+            ),
+        ]
+
+
+class Material(RollupModel):
     """Materials used in jobs"""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='materials')
@@ -196,15 +488,21 @@ class Material(models.Model):
     delivery_date = models.DateField(blank=True, null=True)
     notes = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = MaterialQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.name} - {self.quantity} {self.unit}"
 
     class Meta:
         db_table = 'materials'
+        indexes = [
+            models.Index(fields=['user', 'updated_at', 'id'], name='materials_user_updated_idx'),
+        ]
 
 
-class Invoice(models.Model):
+class Invoice(RollupModel):
     """Invoices for jobs"""
     STATUS_CHOICES = [
         ('draft', 'Draft'),
@@ -217,26 +515,59 @@ class Invoice(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='invoices')
     job = models.ForeignKey(Job, on_delete=models.CASCADE, related_name='invoices')
-    invoice_number = models.CharField(max_length=50, unique=True)
+    # Left blank, the next number is allocated on save (renovation.numbering)
+    invoice_number = models.CharField(max_length=50, blank=True, default='')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft')
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
     tax_amount = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
     paid_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    balance_due = models.GeneratedField(
+        expression=models.F('total_amount') - models.F('paid_amount'),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        db_persist=True,
+    )
     due_date = models.DateField()
     paid_date = models.DateField(blank=True, null=True)
     notes = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    ROLLUP_FIELDS = ('paid_amount',)
+
+    objects = InvoiceQuerySet.as_manager()
+
     def __str__(self):
         return f"Invoice {self.invoice_number} - ${self.total_amount}"
 
     class Meta:
         db_table = 'invoices'
         ordering = ['-created_at']
-
-
-class Payment(models.Model):
+        # Numbers run per user, so they are only unique within an account
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'invoice_number'], name='invoices_number_key'),
+        ]
+        indexes = [
+            models.Index(fields=['-created_at'], name='invoices_created_idx'),
+            models.Index(fields=['user', 'status'], name='invoices_user_status_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='invoices_user_created_idx'),
+            models.Index(fields=['user', 'updated_at', 'id'], name='invoices_user_updated_idx'),
+            models.Index(
+                fields=['user', 'paid_amount'], name='invoices_user_paid_idx',
+                condition=models.Q(status='paid'),
+            ),
+            models.Index(
+                fields=['user', 'due_date'], name='invoices_user_open_idx',
+                condition=models.Q(status__in=['sent', 'overdue']),
+            ),
+            # The overdue sweep's range scan across all users
+            models.Index(
+                fields=['due_date'], name='invoices_sent_due_idx',
+                condition=models.Q(status='sent'),
+            ),
+        ]
+
+
+class Payment(RollupModel):
     """Payment records for invoices"""
     PAYMENT_METHOD_CHOICES = [
         ('cash', 'Cash'),
@@ -255,6 +586,9 @@ class Payment(models.Model):
     reference_number = models.CharField(max_length=100, blank=True, null=True)
     notes = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = PaymentQuerySet.as_manager()
 
     def __str__(self):
         return f"Payment ${self.amount} for Invoice {self.invoice.invoice_number}"
@@ -262,3 +596,138 @@ class Payment(models.Model):
     class Meta:
         db_table = 'payments'
         ordering = ['-payment_date']
+        indexes = [
+            models.Index(fields=['-payment_date'], name='payments_date_idx'),
+            models.Index(fields=['user', '-payment_date'], name='payments_user_date_idx'),
+            models.Index(fields=['user', '-created_at'], name='payments_user_created_idx'),
+            models.Index(fields=['user', 'updated_at', 'id'], name='payments_user_updated_idx'),
+        ]
+
+
+class StatusSummary(models.Model):
+    """Per-user, per-day row counts and amounts by entity status, for reports"""
+    ENTITY_CHOICES = [
+        ('lead', 'Lead'),
+        ('estimate', 'Estimate'),
+        ('job', 'Job'),
+        ('invoice', 'Invoice'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='status_summaries')
+    entity = models.CharField(max_length=20, choices=ENTITY_CHOICES)
+    status = models.CharField(max_length=20)
+    day = models.DateField()
+    count = models.IntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.entity} {self.status} on {self.day}: {self.count}"
+
+    class Meta:
+        db_table = 'status_summaries'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'entity', 'status', 'day'], name='status_summaries_key'),
+        ]
+
+
+class StatusEvent(models.Model):
+    """One status change of a lead, estimate, job or invoice (renovation.history).
+
+    Rows are only ever appended. from_status is null when the record was
+    created and to_status when it was deleted.
+    """
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='status_events')
+    entity = models.CharField(max_length=20, choices=StatusSummary.ENTITY_CHOICES)
+    object_id = models.UUIDField()
+    from_status = models.CharField(max_length=20, blank=True, null=True)
+    to_status = models.CharField(max_length=20, blank=True, null=True)
+    at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.entity} {self.object_id}: {self.from_status} -> {self.to_status}"
+
+    class Meta:
+        db_table = 'status_events'
+        indexes = [
+            models.Index(fields=['user', 'entity', 'at'], name='status_events_user_idx'),
+            models.Index(fields=['object_id', 'at'], name='status_events_object_idx'),
+        ]
+
+
+class Tombstone(models.Model):
+    """A deleted record, kept for clients syncing through the change feed (renovation.changes)"""
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tombstones')
+    entity = models.CharField(max_length=20)
+    object_id = models.UUIDField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.entity} {self.object_id} deleted {self.deleted_at}"
+
+    class Meta:
+        db_table = 'tombstones'
+        indexes = [
+            models.Index(fields=['user', 'deleted_at', 'id'], name='tombstones_user_deleted_idx'),
+        ]
+
+
+class Task(models.Model):
+    """Background work run by the run_workers command (renovation.tasks)"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tasks', blank=True, null=True)
+    name = models.CharField(max_length=100)
+    args = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    # When a queued task may run next; for a running task, when its worker's
+    # claim expires and another worker may take it over
+    available_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=255, blank=True)
+    result = models.JSONField(blank=True, null=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    objects = TaskQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
+
+    class Meta:
+        db_table = 'tasks'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(
+                fields=['available_at'], name='tasks_due_idx',
+                condition=models.Q(status__in=['queued', 'running']),
+            ),
+            models.Index(fields=['user', '-created_at'], name='tasks_user_created_idx'),
+        ]
+
+
+class NumberSequence(models.Model):
+    """Last document number handed out per user, kind and year, on databases without sequences"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='number_sequences')
+    kind = models.CharField(max_length=20)
+    year = models.PositiveSmallIntegerField()
+    last = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.kind} {self.year}: {self.last}"
+
+    class Meta:
+        db_table = 'number_sequences'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'kind', 'year'], name='number_sequences_key'),
+        ]
@@ -0,0 +1,105 @@
+"""Document numbers for estimates, jobs and invoices.
+
+Numbers run per user and per calendar year, e.g. EST-2026-00042 is the
+user's 42nd estimate numbered in 2026. They are unique per user (the
+models' *_number_key constraints), so customers of different accounts can
+hold the same number. The number shows nothing about the account or how
+many accounts exist, and allocating one never needs a retry on
+IntegrityError.
+
+On PostgreSQL each (kind, user, year) has its own sequence, created on first
+use. nextval() is not transactional, so concurrent requests never wait on
+each other; a rolled back transaction leaves a gap in the numbers instead.
+
+Elsewhere the counter is a NumberSequence row, moved with one UPDATE in the
+caller's transaction. SQLite locks the whole database for that write, so
+allocations are serialized until the transaction ends, and the numbers of a
+rolled back transaction are handed out again.
+
+Records saved one at a time are numbered by a pre_save signal. bulk_create()
+skips it, so imports and seeding call assign_numbers() first, which reserves
+a block per user in one statement.
+"""
+from collections import defaultdict
+
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Estimate, Invoice, Job, NumberSequence
+
+NUMBERED = {
+    'estimate': (Estimate, 'estimate_number', 'EST'),
+    'job': (Job, 'job_number', 'JOB'),
+    'invoice': (Invoice, 'invoice_number', 'INV'),
+}
+NUMBER_KINDS = {model: kind for kind, (model, _, _) in NUMBERED.items()}
+
+# PostgreSQL sequences created by a committed transaction of this process,
+# whose nextval() needs no CREATE SEQUENCE first
+_sequences = set()
+
+
+def format_number(kind, year, value):
+    return f'{NUMBERED[kind][2]}-{year}-{value:05d}'
+
+
+def _sequence_values(connection, kind, user_id, year, count):
+    name = f'renovation_{kind}_number_{user_id}_{year}'
+    key = (connection.alias, name)
+    with connection.cursor() as cursor:
+        if key not in _sequences:
+            try:
+                with transaction.atomic(using=connection.alias):
+                    cursor.execute(f'CREATE SEQUENCE IF NOT EXISTS {connection.ops.quote_name(name)}')
+            except IntegrityError:
+                pass  # created by a concurrent transaction that has since committed
+            transaction.on_commit(lambda: _sequences.add(key), using=connection.alias)
+        cursor.execute('SELECT nextval(%s) FROM generate_series(1, %s)', [name, count])
+        return sorted(value for value, in cursor.fetchall())
+
+
+def _counter_values(using, kind, user_id, year, count):
+    counters = NumberSequence.objects.using(using).filter(user_id=user_id, kind=kind, year=year)
+    with transaction.atomic(using=using):
+        if not counters.update(last=F('last') + count):
+            try:
+                with transaction.atomic(using=using):
+                    NumberSequence.objects.using(using).create(user_id=user_id, kind=kind, year=year, last=count)
+            except IntegrityError:
+                # Another connection created the row first (not on SQLite,
+                # whose write lock already serializes the two)
+                counters.update(last=F('last') + count)
+        last = counters.values_list('last', flat=True).get()
+    return list(range(last - count + 1, last + 1))
+
+
+def reserve_numbers(kind, user_id, count, year=None):
+    """`count` unused `kind` numbers for the user, in ascending order"""
+    if count < 1:
+        return []
+    year = year or timezone.localdate().year
+    using = router.db_for_write(NUMBERED[kind][0])
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        values = _sequence_values(connection, kind, user_id, year, count)
+    else:
+        values = _counter_values(using, kind, user_id, year, count)
+    return [format_number(kind, year, value) for value in values]
+
+
+def next_number(kind, user_id):
+    return reserve_numbers(kind, user_id, 1)[0]
+
+
+def assign_numbers(instances):
+    """Number the estimates, jobs or invoices that have no number yet, a block per user"""
+    pending = defaultdict(list)
+    for instance in instances:
+        kind = NUMBER_KINDS[type(instance)]
+        if not getattr(instance, NUMBERED[kind][1]):
+            pending[kind, instance.user_id].append(instance)
+    for (kind, user_id), unnumbered in pending.items():
+        field = NUMBERED[kind][1]
+        for instance, number in zip(unnumbered, reserve_numbers(kind, user_id, len(unnumbered))):
+            setattr(instance, field, number)
@@ -0,0 +1,94 @@
+"""Marking sent invoices past their due date as overdue.
+
+sweep_overdue() moves them in a single UPDATE ... RETURNING, which
+PostgreSQL and SQLite 3.35+ support. The UPDATE finds its rows through the
+partial index invoices_sent_due_idx, which holds only sent invoices, so
+its cost depends on the invoices still outstanding and not on the paid,
+draft or already overdue ones. The ids it returns are grouped by user and
+day in batches of SWEEP_BATCH_SIZE, which reports the sweep per user,
+moves the status summary buckets and records the status history.
+
+A queryset update() sends no model signals, so the summary buckets and
+the cached invoice pages that the signals would have kept in step are
+updated here, in the same transaction or once it commits. Money rollups
+and the dashboard do not depend on the sent/overdue distinction.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connections, router, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.db.models.sql import UpdateQuery
+from django.utils import timezone
+
+from .models import Invoice
+from .fragments import bump_versions
+from .history import record_moves
+from .reporting import apply_delta
+
+# Swept ids per grouped summary query
+SWEEP_BATCH_SIZE = 1000
+
+
+def overdue_candidates(today=None):
+    """Sent invoices whose due date has passed"""
+    today = today or timezone.localdate()
+    return Invoice._base_manager.filter(status='sent', due_date__lt=today)
+
+
+def _update_returning_ids(queryset, **values):
+    """queryset.update(**values), returning the primary keys of the rows changed"""
+    using = router.db_for_write(queryset.model)
+    query = queryset.query.chain(UpdateQuery)
+    query.add_update_values(values)
+    sql, params = query.get_compiler(using).as_sql()
+    pk = queryset.model._meta.pk
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        cursor.execute(f'{sql} RETURNING {connection.ops.quote_name(pk.column)}', params)
+        return [pk.to_python(value) for value, in cursor.fetchall()]
+
+
+def _per_user(rows):
+    report = defaultdict(lambda: {'count': 0, 'balance': Decimal('0')})
+    for row in rows:
+        report[row['user_id']]['count'] += row['n']
+        report[row['user_id']]['balance'] += row['balance']
+    return dict(report)
+
+
+def _grouped(queryset):
+    # Summary buckets are per created day and carry the paid amounts
+    return queryset.order_by().values('user_id', day=TruncDate('created_at')).annotate(
+        n=Count('pk'), paid=Sum('paid_amount'), balance=Sum('balance_due'),
+    )
+
+
+def preview_overdue(today=None):
+    """{user_id: {'count', 'balance'}} that sweep_overdue() would mark now"""
+    return _per_user(_grouped(overdue_candidates(today)))
+
+
+def sweep_overdue(today=None):
+    """Mark every sent invoice past due as overdue; returns {user_id: {'count', 'balance'}}"""
+    with transaction.atomic(using=router.db_for_write(Invoice)):
+        now = timezone.now()
+        swept = _update_returning_ids(overdue_candidates(today), status='overdue', updated_at=now)
+        rows = []
+        for start in range(0, len(swept), SWEEP_BATCH_SIZE):
+            batch = Invoice._base_manager.filter(pk__in=swept[start:start + SWEEP_BATCH_SIZE])
+            rows.extend(_grouped(batch))
+            record_moves(batch, 'overdue', from_status='sent', at=now)
+        for row in rows:
+            for status, sign in (('sent', -1), ('overdue', 1)):
+                key = (row['user_id'], status, row['day'], row['paid'] or 0)
+                apply_delta('invoice', key, sign, count=row['n'])
+        report = _per_user(rows)
+
+        def refresh_pages():
+            for user_id in report:
+                bump_versions(user_id, 'invoice')
+
+        transaction.on_commit(refresh_pages)
+    return report
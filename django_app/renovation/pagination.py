@@ -0,0 +1,124 @@
+import base64
+import binascii
+import json
+import uuid
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from django.http import Http404
+
+
+class KeysetPage:
+    """One page of a keyset-paginated queryset"""
+
+    def __init__(self, request, object_list, page_size, next_cursor=None, previous_cursor=None):
+        self.request = request
+        self.object_list = object_list
+        self.page_size = page_size
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    @property
+    def next_url(self):
+        return self._url(self.next_cursor)
+
+    @property
+    def previous_url(self):
+        return self._url(self.previous_cursor)
+
+    def _url(self, cursor):
+        if cursor is None:
+            return None
+        params = self.request.GET.copy()
+        params['cursor'] = cursor
+        return f'?{params.urlencode()}'
+
+
+def encode_cursor(obj, direction):
+    return _encode_key(obj.created_at, obj.pk, direction)
+
+
+def _encode_key(created_at, pk, direction):
+    payload = json.dumps([created_at.isoformat(), str(pk), direction])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, pk, direction = json.loads(base64.urlsafe_b64decode(padded))
+        if direction not in ('n', 'p'):
+            raise ValueError(direction)
+        return datetime.fromisoformat(created_at), uuid.UUID(pk), direction
+    except (binascii.Error, TypeError, ValueError):
+        raise Http404('Invalid page cursor.')
+
+
+def get_page_size(request):
+    page_size = settings.RENOVATION_PAGE_SIZE
+    try:
+        page_size = int(request.GET.get('page_size', page_size))
+    except ValueError:
+        pass
+    return max(1, min(page_size, settings.RENOVATION_MAX_PAGE_SIZE))
+
+
+def paginate_keyset(request, queryset):
+    """Paginate `queryset` newest first, keyed on (created_at, id).
+
+    Each page is a single indexed range scan of page_size + 1 rows, so deep
+    pages cost the same as the first one. The extra row only tells us
+    whether another page exists in the direction of travel. A page that
+    comes back empty, because the rows past the cursor were deleted, links
+    back the way it came from the cursor's own key.
+    """
+    page_size = get_page_size(request)
+    cursor = request.GET.get('cursor')
+
+    if not cursor:
+        rows = list(queryset.order_by('-created_at', '-id')[:page_size + 1])
+        more = len(rows) > page_size
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(rows[-1], 'n') if more else None
+        return KeysetPage(request, rows, page_size, next_cursor=next_cursor)
+
+    created_at, pk, direction = decode_cursor(cursor)
+    if direction == 'n':
+        rows = list(
+            queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+            .order_by('-created_at', '-id')[:page_size + 1]
+        )
+        more = len(rows) > page_size
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(rows[-1], 'n') if more and rows else None
+        previous_cursor = encode_cursor(rows[0], 'p') if rows else _encode_key(created_at, pk, 'p')
+    else:
+        rows = list(
+            queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk))
+            .order_by('created_at', 'id')[:page_size + 1]
+        )
+        more = len(rows) > page_size
+        rows = rows[:page_size][::-1]
+        next_cursor = encode_cursor(rows[-1], 'n') if rows else _encode_key(created_at, pk, 'n')
+        previous_cursor = encode_cursor(rows[0], 'p') if more and rows else None
+    return KeysetPage(request, rows, page_size, next_cursor=next_cursor, previous_cursor=previous_cursor)
+
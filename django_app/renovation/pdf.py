@@ -0,0 +1,177 @@
+"""A small PDF writer for the estimate and invoice documents.
+
+It draws text in the standard Helvetica fonts, which every PDF viewer
+provides, so nothing is embedded. It also draws lines and filled boxes, and
+compresses each page. That is all the documents need, and it renders a page
+in well under a millisecond without a third-party dependency.
+
+The standard fonts only cover WinAnsi (cp1252) text. Other letters are
+printed without their accents where Unicode can take them off, and
+anything else as '?'. The document keeps the characters it could not print
+exactly in PDFDocument.missing, so the caller can report them.
+
+Coordinates are PDF points from the bottom-left corner of a US Letter page.
+"""
+import unicodedata
+import zlib
+
+PAGE_WIDTH = 612
+PAGE_HEIGHT = 792
+
+FONTS = {
+    False: ('F1', 'Helvetica'),
+    True: ('F2', 'Helvetica-Bold'),
+}
+
+# Glyph widths in 1/1000 em for ASCII 32-126 (the fonts' AFM metrics)
+_ASCII = [chr(code) for code in range(32, 127)]
+_WIDTHS = {
+    False: dict(zip(_ASCII, [
+        278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+        556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+        1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+        667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+        333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+        556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+    ])),
+    True: dict(zip(_ASCII, [
+        278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+        556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+        975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+        667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+        333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+        611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584,
+    ])),
+}
+_DEFAULT_WIDTH = 556
+
+
+def text_width(text, size, bold=False):
+    widths = _WIDTHS[bold]
+    return sum(widths.get(char, _DEFAULT_WIDTH) for char in text) * size / 1000
+
+
+def wrap(text, width, size, bold=False):
+    """Split `text` into lines no wider than `width` points"""
+    space = text_width(' ', size, bold)
+    lines = []
+    for paragraph in str(text).splitlines() or ['']:
+        words, used = [], 0
+        for word in paragraph.split():
+            needed = text_width(word, size, bold)
+            if words and used + space + needed > width:
+                lines.append(' '.join(words))
+                words, used = [], 0
+            used += (space if words else 0) + needed
+            words.append(word)
+        lines.append(' '.join(words))
+    return lines
+
+
+def encode(text):
+    """(`text` in the fonts' WinAnsi encoding, the characters it could not encode exactly)"""
+    text = str(text)
+    try:
+        return text.encode('cp1252'), set()
+    except UnicodeEncodeError:
+        pass
+    data, missing = bytearray(), set()
+    for char in text:
+        try:
+            data += char.encode('cp1252')
+        except UnicodeEncodeError:
+            missing.add(char)
+            # The letter without its accents (ő -> o), or '?'
+            data += unicodedata.normalize('NFKD', char).encode('cp1252', errors='ignore') or b'?'
+    return bytes(data), missing
+
+
+def _literal(data):
+    return b'(' + data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+def _number(value):
+    return f'{value:.2f}'.rstrip('0').rstrip('.')
+
+
+class PDFDocument:
+    """Pages of drawing operations, written out by render()"""
+
+    def __init__(self, title=''):
+        self.title = title
+        self.pages = []
+        # Characters drawn that the fonts cannot show
+        self.missing = set()
+        self.new_page()
+
+    def new_page(self):
+        self.ops = []
+        self.pages.append(self.ops)
+
+    def text(self, x, y, text, size=10, bold=False, align='left'):
+        if align == 'right':
+            x -= text_width(text, size, bold)
+        elif align == 'center':
+            x -= text_width(text, size, bold) / 2
+        font = FONTS[bold][0]
+        data, missing = encode(text)
+        self.missing |= missing
+        self.ops.append(
+            f'BT /{font} {_number(size)} Tf {_number(x)} {_number(y)} Td '.encode() + _literal(data) + b' Tj ET'
+        )
+
+    def line(self, x1, y1, x2, y2, width=0.5):
+        self.ops.append(f'{_number(width)} w {_number(x1)} {_number(y1)} m {_number(x2)} {_number(y2)} l S'.encode())
+
+    def box(self, x, y, width, height, gray=0.92):
+        self.ops.append(
+            f'{_number(gray)} g {_number(x)} {_number(y)} {_number(width)} {_number(height)} re f 0 g'.encode()
+        )
+
+    def render(self):
+        """The document as PDF bytes"""
+        objects = []  # object number n is objects[n - 1]
+
+        def add(body):
+            objects.append(body)
+            return len(objects)
+
+        catalog = add(None)
+        pages = add(None)
+        fonts = b' '.join(
+            f'/{name} '.encode() + f'{add(self._font(base))} 0 R'.encode()
+            for name, base in FONTS.values()
+        )
+        kids = []
+        for ops in self.pages:
+            content = zlib.compress(b'\n'.join(ops))
+            stream = add(
+                f'<< /Length {len(content)} /Filter /FlateDecode >>\nstream\n'.encode() + content + b'\nendstream'
+            )
+            kids.append(add((
+                f'<< /Type /Page /Parent {pages} 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] '
+                f'/Resources << /Font << '
+            ).encode() + fonts + f' >> >> /Contents {stream} 0 R >>'.encode()))
+        objects[catalog - 1] = f'<< /Type /Catalog /Pages {pages} 0 R >>'.encode()
+        objects[pages - 1] = (
+            f'<< /Type /Pages /Kids [{" ".join(f"{kid} 0 R" for kid in kids)}] /Count {len(kids)} >>'.encode()
+        )
+        info = add(b'<< /Title ' + _literal(encode(self.title)[0]) + b' /Producer (Bidii) >>')
+
+        out = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        offsets = []
+        for number, body in enumerate(objects, 1):
+            offsets.append(len(out))
+            out += f'{number} 0 obj\n'.encode() + body + b'\nendobj\n'
+        xref = len(out)
+        out += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode()
+        out += b''.join(f'{offset:010d} 00000 n \n'.encode() for offset in offsets)
+        out += (
+            f'trailer\n<< /Size {len(objects) + 1} /Root {catalog} 0 R /Info {info} 0 R >>\n'
+            f'startxref\n{xref}\n%%EOF\n'
+        ).encode()
+        return bytes(out)
+
+    @staticmethod
+    def _font(base):
+        return f'<< /Type /Font /Subtype /Type1 /BaseFont /{base} /Encoding /WinAnsiEncoding >>'.encode()
@@ -0,0 +1,127 @@
+"""Uploading site visit photos.
+
+Crews upload a visit's photos in one multi-file POST. HashingUploadHandler
+streams each file to a temporary file and hashes it as the chunks arrive,
+so an 8 MB photo is neither held in memory nor read twice. The image is
+stored once under its SHA-256 (SiteVisitPhoto.storage_name). A photo already
+stored, by this or another visit, is not written again, and one already on
+the visit is skipped.
+
+Only the image header is read while the request waits. The WebP variants
+that pages show are made afterwards by the photo_variants task
+(renovation.thumbnails). Photos whose image already has variants are ready
+at once.
+"""
+import hashlib
+
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.db import router, transaction
+from PIL import Image
+
+from .models import SiteVisitPhoto
+from .fragments import bump_versions
+from .tasks import enqueue
+
+# Pillow format -> stored file extension
+PHOTO_FORMATS = {'JPEG': 'jpg', 'MPO': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}
+EXIF_ORIENTATION = 0x0112
+
+
+class HashingUploadHandler(TemporaryFileUploadHandler):
+    """Streams uploads to temporary files, setting each file's sha256 on the way"""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.digest = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.digest.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        upload = super().file_complete(file_size)
+        upload.sha256 = self.digest.hexdigest()
+        return upload
+
+
+class PhotoUploadResult:
+    """Outcome of one add_photos() call"""
+
+    def __init__(self):
+        self.added = []
+        self.duplicates = 0
+        self.errors = []
+
+    def __str__(self):
+        return f'{len(self.added)} added, {self.duplicates} duplicates, {len(self.errors)} errors'
+
+
+def _sha256(upload):
+    if getattr(upload, 'sha256', None):
+        return upload.sha256
+    digest = hashlib.sha256()
+    for chunk in upload.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _identify(upload):
+    """(extension, width, height) of an uploaded image, or None if it is not a photo"""
+    try:
+        with Image.open(upload) as image:
+            extension = PHOTO_FORMATS.get(image.format)
+            width, height = image.size
+            if image.getexif().get(EXIF_ORIENTATION) in (5, 6, 7, 8):
+                # Shown turned a quarter, as the variants will be
+                width, height = height, width
+    except (OSError, Image.DecompressionBombError):
+        return None
+    finally:
+        upload.seek(0)
+    return (extension, width, height) if extension else None
+
+
+def _store(upload, name):
+    if default_storage.exists(name):
+        return
+    stored = default_storage.save(name, upload)
+    if stored != name:
+        # Another request stored the same image first
+        default_storage.delete(stored)
+
+
+def add_photos(site_visit, uploads):
+    """Store the uploaded images on `site_visit` and queue their variants"""
+    result = PhotoUploadResult()
+    seen = set(site_visit.photos.values_list('sha256', flat=True))
+    for upload in uploads:
+        sha256 = _sha256(upload)
+        if sha256 in seen:
+            result.duplicates += 1
+            continue
+        identified = _identify(upload)
+        if identified is None:
+            result.errors.append((upload.name, 'Not a JPEG, PNG or WebP image.'))
+            continue
+        extension, width, height = identified
+        _store(upload, SiteVisitPhoto.storage_name(sha256, extension))
+        seen.add(sha256)
+        result.added.append(SiteVisitPhoto(
+            user_id=site_visit.user_id, site_visit=site_visit, sha256=sha256, extension=extension,
+            name=(upload.name or '')[:255], size=upload.size, width=width, height=height,
+        ))
+    if not result.added:
+        return result
+
+    shas = {photo.sha256 for photo in result.added}
+    ready = set(SiteVisitPhoto.objects.filter(sha256__in=shas, variants_ready=True).values_list('sha256', flat=True))
+    for photo in result.added:
+        photo.variants_ready = photo.sha256 in ready
+    user_id = site_visit.user_id
+    with transaction.atomic(using=router.db_for_write(SiteVisitPhoto)):
+        SiteVisitPhoto.objects.bulk_create(result.added)
+        if shas - ready:
+            enqueue('photo_variants', site_visit.user, shas=sorted(shas - ready))
+        transaction.on_commit(lambda: bump_versions(user_id, 'sitevisitphoto'))
+    return result
@@ -0,0 +1,178 @@
+"""Materialized status summaries behind the reports view.
+
+StatusSummary holds one row per (user, entity, status, day) with the number
+of records in that state and the sum of their headline amount. Rows are
+adjusted in place by the model signals whenever a tracked record is created,
+changes status/amount, or is deleted, and can be rebuilt from scratch with
+the rebuild_reports management command after bulk changes.
+"""
+from datetime import date
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, DateField, DecimalField, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate, TruncMonth
+from django.utils import timezone
+
+from .models import Lead, Estimate, Job, Invoice, StatusSummary
+
+# model -> (entity name, amount field summed into StatusSummary.amount)
+SUMMARY_SOURCES = {
+    Lead: ('lead', 'estimated_value'),
+    Estimate: ('estimate', 'total_amount'),
+    Job: ('job', None),
+    Invoice: ('invoice', 'paid_amount'),
+}
+
+
+def tracked_fields(model):
+    entity, amount_field = SUMMARY_SOURCES[model]
+    fields = ['user_id', 'status', 'created_at']
+    if amount_field:
+        fields.append(amount_field)
+    if model is Invoice:
+        fields.append('paid_date')
+    return fields
+
+
+def summary_key(model, values):
+    """(user_id, status, day, amount) bucket for a record's field values.
+
+    Invoices are bucketed on the day they were paid so that revenue lands in
+    the right month; everything else on the day it was created.
+    """
+    if values['created_at'] is None:
+        return None
+    day = timezone.localdate(values['created_at'])
+    if model is Invoice and values['status'] == 'paid' and values['paid_date']:
+        day = values['paid_date']
+    amount_field = SUMMARY_SOURCES[model][1]
+    amount = values[amount_field] if amount_field else None
+    return values['user_id'], values['status'], day, amount or 0
+
+
+def instance_key(instance):
+    model = type(instance)
+    return summary_key(model, {name: getattr(instance, name) for name in tracked_fields(model)})
+
+
+def stored_key(instance):
+    """Bucket of the row as currently stored, for instances loaded with only()"""
+    model = type(instance)
+    values = model._base_manager.filter(pk=instance.pk).values(*tracked_fields(model)).first()
+    return summary_key(model, values) if values else None
+
+
+def bucket_day(model, status=None, paid_date=None):
+    """summary_key()'s day as an expression over the rows of `model`.
+
+    Given a `status` (and `paid_date` expression) it is the day the rows
+    will have once moved to that status, for bulk updates that send no
+    signals.
+    """
+    created = TruncDate('created_at')
+    if model is not Invoice or status not in (None, 'paid'):
+        return created
+    paid_day = Coalesce(F('paid_date') if paid_date is None else paid_date, created, output_field=DateField())
+    if status == 'paid':
+        return paid_day
+    return Case(When(status='paid', then=paid_day), default=created, output_field=DateField())
+
+
+def apply_delta(entity, key, sign, count=1):
+    """Add (sign=1) or remove (sign=-1) `count` records, together worth the
+    key's amount, from their summary bucket"""
+    user_id, status, day, amount = key
+    rows = StatusSummary.objects.filter(user_id=user_id, entity=entity, status=status, day=day)
+    changes = {'count': F('count') + count * sign, 'amount': F('amount') + amount * sign}
+    if rows.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            StatusSummary.objects.create(
+                user_id=user_id, entity=entity, status=status, day=day,
+                count=count * sign, amount=amount * sign,
+            )
+    except IntegrityError:
+        # Another writer created the bucket between our UPDATE and INSERT
+        rows.update(**changes)
+
+
+def move(entity, old_key, new_key):
+    if old_key == new_key:
+        return
+    if old_key is not None:
+        apply_delta(entity, old_key, -1)
+    if new_key is not None:
+        apply_delta(entity, new_key, 1)
+
+
+def rebuild_summaries(user_ids=None):
+    """Recompute StatusSummary from the live tables; returns the row count"""
+    rows = []
+    with transaction.atomic():
+        existing = StatusSummary.objects.all()
+        if user_ids is not None:
+            existing = existing.filter(user_id__in=user_ids)
+        existing.delete()
+
+        for model, (entity, amount_field) in SUMMARY_SOURCES.items():
+            queryset = model._base_manager.order_by()
+            if user_ids is not None:
+                queryset = queryset.filter(user_id__in=user_ids)
+            amount = Sum(amount_field) if amount_field else Value(0)
+            buckets = queryset.values('user_id', 'status', bucket_day=bucket_day(model)).annotate(
+                n=Count('pk'),
+                total=Coalesce(amount, Value(0), output_field=DecimalField(max_digits=14, decimal_places=2)),
+            )
+            for bucket in buckets.iterator(chunk_size=2000):
+                rows.append(StatusSummary(
+                    user_id=bucket['user_id'], entity=entity, status=bucket['status'],
+                    day=bucket['bucket_day'], count=bucket['n'], amount=bucket['total'],
+                ))
+        StatusSummary.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def month_start(months_back, today=None):
+    today = today or timezone.localdate()
+    month_index = today.year * 12 + today.month - 1 - months_back
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def status_breakdowns(user):
+    """{entity: [{'status': ..., 'count': ...}, ...]} for every tracked entity"""
+    breakdowns = {entity: [] for entity, _ in SUMMARY_SOURCES.values()}
+    rows = (
+        StatusSummary.objects.filter(user=user)
+        .values('entity', 'status')
+        .annotate(total=Sum('count'))
+        .filter(total__gt=0)
+        .order_by('entity', 'status')
+    )
+    for row in rows:
+        breakdowns[row['entity']].append({'status': row['status'], 'count': row['total']})
+    return breakdowns
+
+
+def monthly_trends(user, months=12):
+    """Paid revenue and lead win rate per month over the last `months` months"""
+    since = month_start(months - 1)
+    rows = (
+        StatusSummary.objects.filter(user=user, day__gte=since)
+        .filter(Q(entity='invoice', status='paid') | Q(entity='lead', status__in=['won', 'lost']))
+        .annotate(month=TruncMonth('day'))
+        .values('month', 'entity', 'status')
+        .annotate(total_count=Sum('count'), total_amount=Sum('amount'))
+        .order_by('month')
+    )
+    trends = {}
+    for row in rows:
+        month = trends.setdefault(row['month'], {'month': row['month'], 'revenue': 0, 'won': 0, 'lost': 0})
+        if row['entity'] == 'invoice':
+            month['revenue'] += row['total_amount']
+        else:
+            month[row['status']] += row['total_count']
+    for month in trends.values():
+        closed = month['won'] + month['lost']
+        month['win_rate'] = round(100 * month['won'] / closed, 1) if closed else None
+    return list(trends.values())
@@ -0,0 +1,194 @@
+"""Denormalized money totals.
+
+Each payment, material and invoice contributes an amount to a few rollup
+columns further up the chain:
+
+    Payment.amount        -> Invoice.paid_amount, Job.paid_total, Customer.lifetime_value
+    Material.total_cost   -> Job.material_cost
+    Invoice.total_amount  -> Job.invoiced_total (unless cancelled)
+    Invoice.paid_amount   -> Job.paid_total, Customer.lifetime_value
+
+An invoice carries the amount paid on it to the job it belongs to, so
+moving it to another job moves its payments' share of the totals with it.
+
+The model signals compare a record's contributions before and after a write
+and apply the difference with ``F()`` updates inside the write's
+transaction, so concurrent writers never overwrite each other's totals.
+Invoice.balance_due is a generated column. reconcile() recomputes every
+rollup from the live tables to find and repair drift left by bulk writes.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Customer, Job, Material, Invoice, Payment
+from .fragments import bump_versions
+from .reporting import SUMMARY_SOURCES, move, rebuild_summaries, stored_key
+
+RECONCILE_BATCH_SIZE = 1000
+
+# source model -> fields its contributions are computed from
+SOURCE_FIELDS = {
+    Payment: ('invoice_id', 'amount'),
+    Material: ('job_id', 'total_cost'),
+    Invoice: ('job_id', 'status', 'total_amount'),
+}
+# source model -> its own rollups it passes on; always read as currently stored
+CARRIED_FIELDS = {
+    Invoice: ('paid_amount',),
+}
+
+
+def sources(instance):
+    """The instance's SOURCE_FIELDS values, to price it later as it is now"""
+    return {name: getattr(instance, name) for name in SOURCE_FIELDS[type(instance)]}
+
+
+def contributions(instance, **stored):
+    """{(target model, lookup, value): {rollup field: amount}} for one record.
+
+    `stored` replaces some of the instance's SOURCE_FIELDS values, to price
+    the record as it was loaded rather than as it is about to be saved.
+    """
+    if type(instance) not in SOURCE_FIELDS:
+        raise TypeError(f'{type(instance).__name__} does not feed any rollup')
+    values = {**sources(instance), **stored}
+    if isinstance(instance, Payment):
+        amount = values['amount'] or 0
+        return {
+            (Invoice, 'pk', values['invoice_id']): {'paid_amount': amount},
+            (Job, 'invoices', values['invoice_id']): {'paid_total': amount},
+            (Customer, 'leads__estimates__jobs__invoices', values['invoice_id']): {'lifetime_value': amount},
+        }
+    if isinstance(instance, Material):
+        return {(Job, 'pk', values['job_id']): {'material_cost': values['total_cost'] or 0}}
+    amount = 0 if values['status'] == 'cancelled' else values['total_amount'] or 0
+    paid = instance.paid_amount or 0
+    return {
+        (Job, 'pk', values['job_id']): {'invoiced_total': amount, 'paid_total': paid},
+        (Customer, 'leads__estimates__jobs', values['job_id']): {'lifetime_value': paid},
+    }
+
+
+def stored_contributions(instance):
+    """Contributions of the row as currently stored, for instances loaded with only()"""
+    model = type(instance)
+    fields = SOURCE_FIELDS[model] + CARRIED_FIELDS.get(model, ())
+    stored = model._base_manager.filter(pk=instance.pk).only(*fields).first()
+    return contributions(stored) if stored else {}
+
+
+def apply(old, new):
+    """Move the totals from the `old` contributions to the `new` ones"""
+    now = timezone.now()
+    for target in old.keys() | new.keys():
+        before, after = old.get(target, {}), new.get(target, {})
+        deltas = {
+            name: after.get(name, 0) - before.get(name, 0)
+            for name in before.keys() | after.keys()
+        }
+        deltas = {name: delta for name, delta in deltas.items() if delta}
+        model, lookup, value = target
+        if not deltas or value is None:
+            continue
+        if model is Invoice:
+            _shift_invoice_summary(value, deltas['paid_amount'])
+        model._base_manager.filter(**{lookup: value}).update(
+            updated_at=now, **{name: F(name) + delta for name, delta in deltas.items()}
+        )
+
+
+def _shift_invoice_summary(invoice_id, delta):
+    # paid_amount is the amount the reports total for invoices
+    key = stored_key(Invoice(pk=invoice_id))
+    if key is not None:
+        move(SUMMARY_SOURCES[Invoice][0], key, key[:3] + (key[3] + delta,))
+
+
+def _total(queryset, parent, field):
+    """Correlated SUM(field) of `queryset` rows belonging to the outer row"""
+    totals = (
+        queryset.filter(**{parent: OuterRef('pk')})
+        .order_by()
+        .values(parent)
+        .annotate(total=Sum(field))
+        .values('total')
+    )
+    output = DecimalField(max_digits=14, decimal_places=2)
+    return Coalesce(Subquery(totals, output_field=output), Value(Decimal('0')), output_field=output)
+
+
+def expected_totals():
+    """model -> {rollup field: expression computing it from the live tables}"""
+    return {
+        Invoice: {
+            'paid_amount': _total(Payment._base_manager.all(), 'invoice', 'amount'),
+        },
+        Job: {
+            'material_cost': _total(Material._base_manager.all(), 'job', 'total_cost'),
+            'invoiced_total': _total(
+                Invoice._base_manager.exclude(status='cancelled'), 'job', 'total_amount'
+            ),
+            'paid_total': _total(Payment._base_manager.all(), 'invoice__job', 'amount'),
+        },
+        Customer: {
+            'lifetime_value': _total(
+                Payment._base_manager.all(), 'invoice__job__estimate__lead__customer', 'amount'
+            ),
+        },
+    }
+
+
+def recompute(queryset, *fields):
+    """Rewrite the rollups of `queryset` rows from the live tables in one UPDATE"""
+    expressions = expected_totals()[queryset.model]
+    if fields:
+        expressions = {name: expressions[name] for name in fields}
+    return queryset.update(updated_at=timezone.now(), **expressions)
+
+
+def reconcile(user_ids=None, repair=False, batch_size=RECONCILE_BATCH_SIZE):
+    """Compare every rollup with its recomputed value; optionally fix the drift.
+
+    Returns {model name: {field: rows that disagreed}}. Repairs are written
+    in batches of `batch_size` rows, each batch one UPDATE with the
+    correlated sums, so the repair itself is set-based too.
+    """
+    report = {}
+    for model, expressions in expected_totals().items():
+        queryset = model._base_manager.all()
+        if user_ids is not None:
+            queryset = queryset.filter(user_id__in=user_ids)
+        annotated = queryset.annotate(**{f'expected_{name}': expr for name, expr in expressions.items()})
+        drift = Q()
+        for name in expressions:
+            drift |= ~Q(**{name: F(f'expected_{name}')})
+        rows = annotated.filter(drift).values_list(
+            'pk', 'user_id', *[name for name in expressions], *[f'expected_{name}' for name in expressions]
+        )
+
+        counts = {name: 0 for name in expressions}
+        drifted, owners = [], set()
+        width = len(expressions)
+        for row in rows.iterator(chunk_size=batch_size):
+            pk, user_id, actual, expected = row[0], row[1], row[2:2 + width], row[2 + width:]
+            for name, have, want in zip(expressions, actual, expected):
+                if have != want:
+                    counts[name] += 1
+            drifted.append(pk)
+            owners.add(user_id)
+        report[model.__name__] = counts
+
+        if repair:
+            for start in range(0, len(drifted), batch_size):
+                with transaction.atomic():
+                    recompute(model._base_manager.filter(pk__in=drifted[start:start + batch_size]))
+            for user_id in owners:
+                bump_versions(user_id, model._meta.model_name)
+            if model is Invoice and drifted:
+                # The invoice summaries total paid_amount
+                rebuild_summaries(sorted(owners))
+    return report
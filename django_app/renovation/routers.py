@@ -0,0 +1,97 @@
+"""Read replica routing for the read-only views.
+
+Reads made by a view wrapped in @use_replica go to the ``replica`` database
+alias when one is configured. Every write, and every read outside those
+views, goes to ``default``. Through a context variable the choice follows
+the view into the worker threads of gather_queries().
+
+A replica trails the primary a little. After a user writes something,
+PrimaryAfterWriteMiddleware sets a cookie that keeps that user's reads on
+the primary for RENOVATION_REPLICA_LAG seconds, so they never see a page
+older than their own change, nor cache one under the new data versions.
+"""
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA = 'replica'
+PRIMARY_COOKIE = 'renovation_primary'
+
+reading_replica = ContextVar('renovation_reading_replica', default=False)
+
+
+def replica_configured():
+    return REPLICA in connections.settings
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if reading_replica.get() and replica_configured():
+            return REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Explicit, or rows read from the replica would be saved back to it
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        if {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, REPLICA}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica receives its schema from the primary
+        return db != REPLICA
+
+
+def use_replica(view):
+    """Send the reads of `view` to the replica unless its user wrote recently"""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            token = reading_replica.set(PRIMARY_COOKIE not in request.COOKIES)
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                reading_replica.reset(token)
+    else:
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            token = reading_replica.set(PRIMARY_COOKIE not in request.COOKIES)
+            try:
+                return view(request, *args, **kwargs)
+            finally:
+                reading_replica.reset(token)
+    return wrapper
+
+
+class PrimaryAfterWriteMiddleware:
+    """Pin a user's reads to the primary for a while after each write"""
+
+    sync_capable = True
+    async_capable = True
+
+    SAFE_METHODS = {'GET', 'HEAD', 'OPTIONS', 'TRACE'}
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.lag = getattr(settings, 'RENOVATION_REPLICA_LAG', 5)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.pin(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.pin(request, await self.get_response(request))
+
+    def pin(self, request, response):
+        if request.method not in self.SAFE_METHODS and response.status_code < 400 and replica_configured():
+            response.set_cookie(PRIMARY_COOKIE, '1', max_age=self.lag, httponly=True, samesite='Lax')
+        return response
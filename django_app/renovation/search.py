@@ -0,0 +1,247 @@
+"""Ranked full-text search over customers, leads, site visits and estimate items.
+
+On PostgreSQL every searchable table has a GIN index on the weighted
+tsvector that document() builds (migration 0006; customers, leads and site
+visits lead the index with user_id through btree_gin). The queries filter
+and rank with exactly that expression, so the planner answers them from the
+index instead of parsing every row.
+
+On SQLite, used for local development, each table is mirrored into an
+external-content FTS5 table that triggers keep in step and bm25() ranks.
+install_fts_tables() runs after every migrate: SQLite drops a table's
+triggers whenever a migration rebuilds the table, so missing triggers are
+recreated and the mirror reindexed.
+
+Each kind is searched with its own LIMITed query, ranking at most
+SEARCH_CANDIDATES matches, and the hits are merged by rank.
+"""
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections
+from django.db.models.expressions import RawSQL
+from django.urls import reverse
+
+from .concurrency import gather_queries
+from .models import Customer, Lead, SiteVisit, EstimateItem
+
+SEARCH_CONFIG = 'english'
+SEARCH_LIMIT = 20
+MAX_QUERY_LENGTH = 200
+
+# A common word can match most of a user's rows; only this many matches are
+# ranked, which keeps such searches as fast as rare ones at the price of an
+# approximate order among them
+SEARCH_CANDIDATES = 1000
+
+# PostgreSQL's default ts_rank() weights, reused for the bm25() columns
+RANK_WEIGHTS = {'A': 1.0, 'B': 0.4, 'C': 0.2, 'D': 0.1}
+
+# kind -> (model, [(field, weight)], select_related lookups); the fields and
+# weights must match the indexes of migration 0006
+SEARCHABLE = {
+    'customer': (Customer, [('name', 'A'), ('address', 'B'), ('notes', 'C')], []),
+    'lead': (Lead, [('project_name', 'A'), ('description', 'B')], ['customer']),
+    'site_visit': (SiteVisit, [('notes', 'B'), ('measurements', 'C')], ['lead']),
+    'estimate_item': (EstimateItem, [('description', 'B')], ['estimate']),
+}
+
+LABELS = {
+    'customer': 'Customer',
+    'lead': 'Lead',
+    'site_visit': 'Site visit',
+    'estimate_item': 'Estimate item',
+}
+
+
+class SearchHit:
+    """One ranked match, described for the results page and the API"""
+
+    def __init__(self, kind, obj, rank):
+        self.kind = kind
+        self.label = LABELS[kind]
+        self.obj = obj
+        self.rank = rank
+        self.title, self.context, self.url = DESCRIBE[kind](obj)
+
+    def as_dict(self):
+        return {
+            'type': self.kind,
+            'id': str(self.obj.pk),
+            'title': self.title,
+            'context': self.context,
+            'url': self.url,
+            'rank': round(self.rank, 6),
+        }
+
+
+DESCRIBE = {
+    'customer': lambda customer: (
+        customer.name,
+        customer.address or customer.email,
+        reverse('customer_detail', args=[customer.pk]),
+    ),
+    'lead': lambda lead: (
+        lead.project_name,
+        lead.customer.name if lead.customer_id else '',
+        reverse('lead_detail', args=[lead.pk]),
+    ),
+    'site_visit': lambda visit: (
+        f'Site visit: {visit.lead.project_name}',
+        visit.notes or visit.measurements or '',
+        reverse('lead_detail', args=[visit.lead_id]),
+    ),
+    'estimate_item': lambda item: (
+        item.description,
+        f'Estimate {item.estimate.estimate_number}',
+        reverse('estimate_detail', args=[item.estimate_id]),
+    ),
+}
+
+
+def document(fields):
+    """The weighted tsvector indexed for `fields`"""
+    vector = None
+    for name, weight in fields:
+        part = SearchVector(name, weight=weight, config=SEARCH_CONFIG)
+        vector = part if vector is None else vector + part
+    return vector
+
+
+def fts5_query(text):
+    """Quote every word so user input cannot use FTS5 query syntax"""
+    return ' '.join(f'"{word}"' for word in re.findall(r'\w+', text))
+
+
+def _rows(model, related):
+    """Unordered rows with the relations their hit describes; the default
+    ordering would steer SQLite to an index walk instead of the primary key"""
+    rows = model._base_manager.order_by()
+    return rows.select_related(*related) if related else rows
+
+
+def _search_postgresql(owned, fields, related, text, limit):
+    query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+    candidates = owned.alias(document=document(fields)).filter(document=query).values('pk')
+    matches = (
+        _rows(owned.model, related)
+        .filter(pk__in=candidates[:SEARCH_CANDIDATES])
+        .annotate(rank=SearchRank(document(fields), query))
+        .order_by('-rank')[:limit]
+    )
+    return [(obj, obj.rank) for obj in matches]
+
+
+def _search_sqlite(owned, fields, related, text, limit):
+    match = fts5_query(text)
+    if not match:
+        return []
+    model = owned.model
+    table = model._meta.db_table
+    fts = f'{table}_fts'
+    weights = ', '.join(str(RANK_WEIGHTS[weight]) for _, weight in fields)
+    # Correlated on the outer row: a plain IN (owned rows) would list every
+    # row the user owns on each search
+    owner, owner_params = owned.filter(pk=RawSQL('t.id', ())).values('pk').query.sql_with_params()
+    with connections[owned.db].cursor() as cursor:
+        cursor.execute(
+            f'SELECT id, score FROM ('
+            f'SELECT t.id, bm25({fts}, {weights}) AS score FROM {fts} '
+            f'JOIN {table} t ON t.rowid = {fts}.rowid '
+            f'WHERE {fts} MATCH %s AND EXISTS ({owner}) LIMIT %s'
+            f') ORDER BY score LIMIT %s',
+            [match, *owner_params, SEARCH_CANDIDATES, limit],
+        )
+        ranked = cursor.fetchall()
+    objects = _rows(model, related).in_bulk([pk for pk, _ in ranked])
+    # bm25() is lower for better matches
+    return [(objects[model._meta.pk.to_python(pk)], -score) for pk, score in ranked]
+
+
+def search_kind(kind, user, text, limit=SEARCH_LIMIT):
+    """[SearchHit] of one kind, best first"""
+    model, fields, related = SEARCHABLE[kind]
+    owned = model.objects.for_user(user).order_by()
+    if connections[owned.db].vendor == 'postgresql':
+        matches = _search_postgresql(owned, fields, related, text, limit)
+    else:
+        matches = _search_sqlite(owned, fields, related, text, limit)
+    return [SearchHit(kind, obj, rank) for obj, rank in matches]
+
+
+def _clean_query(text):
+    return (text or '').strip()[:MAX_QUERY_LENGTH]
+
+
+def _merge(results, limit):
+    hits = [hit for hits in results for hit in hits]
+    hits.sort(key=lambda hit: hit.rank, reverse=True)
+    return hits[:limit]
+
+
+def search(user, text, kinds=None, limit=SEARCH_LIMIT):
+    """The `limit` best hits for `text` across `kinds` (default: all)"""
+    text = _clean_query(text)
+    if not text:
+        return []
+    return _merge([search_kind(kind, user, text, limit) for kind in kinds or SEARCHABLE], limit)
+
+
+async def asearch(user, text, kinds=None, limit=SEARCH_LIMIT):
+    """search() with the per-kind queries run concurrently"""
+    text = _clean_query(text)
+    if not text:
+        return []
+    results = await gather_queries(*(
+        lambda kind=kind: search_kind(kind, user, text, limit) for kind in kinds or SEARCHABLE
+    ))
+    return _merge(results, limit)
+
+
+def _fts_statements(model, fields):
+    table = model._meta.db_table
+    fts = f'{table}_fts'
+    columns = [model._meta.get_field(name).column for name, _ in fields]
+    names = ', '.join(columns)
+    new = ', '.join(f'new.{column}' for column in columns)
+    old = ', '.join(f'old.{column}' for column in columns)
+    triggers = {
+        f'{fts}_insert': (
+            f'CREATE TRIGGER {fts}_insert AFTER INSERT ON {table} BEGIN '
+            f'INSERT INTO {fts}(rowid, {names}) VALUES (new.rowid, {new}); END'
+        ),
+        f'{fts}_delete': (
+            f'CREATE TRIGGER {fts}_delete AFTER DELETE ON {table} BEGIN '
+            f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.rowid, {old}); END"
+        ),
+        f'{fts}_update': (
+            f'CREATE TRIGGER {fts}_update AFTER UPDATE OF {names} ON {table} BEGIN '
+            f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.rowid, {old}); "
+            f'INSERT INTO {fts}(rowid, {names}) VALUES (new.rowid, {new}); END'
+        ),
+    }
+    create = (
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5('
+        f"{names}, content='{table}', tokenize='porter unicode61')"
+    )
+    return fts, create, triggers
+
+
+def install_fts_tables(using='default', **kwargs):
+    """post_migrate receiver creating the SQLite FTS5 mirrors and their triggers"""
+    db = connections[using]
+    if db.vendor != 'sqlite':
+        return
+    with db.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+        existing = {name for (name,) in cursor.fetchall()}
+        for model, fields, _ in SEARCHABLE.values():
+            fts, create, triggers = _fts_statements(model, fields)
+            if triggers.keys() <= existing:
+                continue
+            cursor.execute(create)
+            for name, sql in triggers.items():
+                if name not in existing:
+                    cursor.execute(sql)
+            # Index the rows written while the triggers were missing
+            cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
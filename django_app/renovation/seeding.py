@@ -0,0 +1,241 @@
+"""Synthetic data for benchmarks and load tests.
+
+Rows are written with bulk_create() and then back-dated over the requested
+history window, so per-user tables look like a contractor that has been
+trading for a while rather than one that signed up a second ago.
+"""
+import random
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import (
+    Customer, Lead, SiteVisit, Estimate,
+    EstimateItem, Job, Material, Invoice, Payment
+)
+from .fragments import bump_versions
+from .history import record_created
+from .numbering import assign_numbers
+from .reporting import rebuild_summaries
+
+LEAD_STATUS_WEIGHTS = {
+    'new': 20, 'contacted': 20, 'qualified': 15, 'estimate_sent': 15, 'won': 20, 'lost': 10,
+}
+JOB_STATUS_WEIGHTS = {
+    'scheduled': 15, 'in_progress': 20, 'completed': 55, 'on_hold': 5, 'cancelled': 5,
+}
+INVOICE_STATUS_WEIGHTS = {
+    'draft': 10, 'sent': 20, 'paid': 60, 'overdue': 7, 'cancelled': 3,
+}
+PROJECTS = ['Kitchen remodel', 'Bathroom refit', 'Roof repair', 'Basement finish', 'Deck build', 'Window replacement']
+STREETS = ['Oak St', 'Maple Ave', 'Pine Rd', 'Cedar Ln', 'Elm Dr', 'Birch Ct']
+CITIES = [('Austin', 'TX'), ('Denver', 'CO'), ('Portland', 'OR'), ('Raleigh', 'NC'), ('Madison', 'WI')]
+ITEM_CATEGORIES = ['labor', 'material', 'permit', 'disposal']
+MATERIALS = [('Drywall sheet', 'sheet'), ('Lumber 2x4', 'piece'), ('Tile', 'sqft'), ('Paint', 'gallon')]
+
+
+def _pick(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def _money(rng, low, high):
+    return Decimal(rng.randint(low * 100, high * 100)) / 100
+
+
+def _skewed_money(rng, median, low, high):
+    """Log-normal amount: mostly near `median` with a long tail of big projects"""
+    value = min(max(rng.lognormvariate(0, 0.8) * median, low), high)
+    return Decimal(round(value * 100)) / 100
+
+
+def _backdate(model, objs, stamps, batch_size):
+    """Overwrite the auto_now(_add) timestamps that bulk_create() filled in"""
+    fields = [f.name for f in model._meta.concrete_fields if f.name in ('created_at', 'updated_at')]
+    for obj, stamp in zip(objs, stamps):
+        for name in fields:
+            setattr(obj, name, stamp)
+    model.objects.bulk_update(objs, fields, batch_size=batch_size)
+
+
+def seed_portfolio(user, customers=100, days=730, items_per_estimate=8, batch_size=500, seed=None,
+                   leads_per_customer=(1, 3), materials_per_job=(2, 6), invoices_per_job=(1, 2),
+                   split_payment_rate=0.4):
+    """Create `customers` customers for `user` with the downstream pipeline.
+
+    Each customer gets a number of leads drawn from `leads_per_customer`;
+    leads that reached the estimate stage get an estimate with line items,
+    won leads get a job with materials, and active or finished jobs get
+    invoices, a share of which are paid in two instalments. The ``(low,
+    high)`` ranges are inclusive. Returns a dict of row counts per model.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    run = uuid.uuid4().hex[:8]
+
+    def stamp_after(start):
+        span = max(int((now - start).total_seconds()), 1)
+        return start + timedelta(seconds=rng.randint(0, span))
+
+    with transaction.atomic():
+        customer_rows, customer_stamps = [], []
+        for i in range(customers):
+            city, state = rng.choice(CITIES)
+            customer_rows.append(Customer(
+                user=user, name=f'Customer {run}-{i}', email=f'customer{i}.{run}@example.com',
+                phone=f'555-{rng.randint(1000000, 9999999)}',
+                address=f'{rng.randint(1, 9999)} {rng.choice(STREETS)}', city=city, state=state,
+            ))
+            customer_stamps.append(now - timedelta(seconds=rng.randint(0, days * 86400)))
+        Customer.objects.bulk_create(customer_rows, batch_size=batch_size)
+        _backdate(Customer, customer_rows, customer_stamps, batch_size)
+
+        lead_rows, lead_stamps = [], []
+        for customer, stamp in zip(customer_rows, customer_stamps):
+            for _ in range(rng.randint(*leads_per_customer)):
+                lead_rows.append(Lead(
+                    user=user, customer=customer, status=_pick(rng, LEAD_STATUS_WEIGHTS),
+                    project_name=f'{rng.choice(PROJECTS)} at {customer.address}',
+                    description='Customer wants a quote before the end of the quarter.',
+                    estimated_value=_skewed_money(rng, 12000, 500, 250000),
+                ))
+                lead_stamps.append(stamp_after(stamp))
+        Lead.objects.bulk_create(lead_rows, batch_size=batch_size)
+        _backdate(Lead, lead_rows, lead_stamps, batch_size)
+
+        visit_rows = []
+        if connection.vendor == 'postgresql':
+            # photos_url is an ArrayField, which only PostgreSQL can store
+            for lead, stamp in zip(lead_rows, lead_stamps):
+                if lead.status != 'new':
+                    visit_rows.append(SiteVisit(
+                        user=user, lead=lead, visit_date=stamp_after(stamp),
+                        notes='Walked the site with the owner.', measurements='12ft x 14ft',
+                    ))
+            SiteVisit.objects.bulk_create(visit_rows, batch_size=batch_size)
+
+        estimate_rows, estimate_stamps, item_rows = [], [], []
+        for lead, stamp in zip(lead_rows, lead_stamps):
+            if lead.status not in ('estimate_sent', 'won', 'lost'):
+                continue
+            status = {'estimate_sent': 'sent', 'won': 'accepted', 'lost': 'rejected'}[lead.status]
+            estimate = Estimate(
+                user=user, lead=lead, status=status, total_amount=Decimal('0'),
+                valid_until=(stamp + timedelta(days=30)).date(),
+            )
+            labor = material = Decimal('0')
+            for _ in range(items_per_estimate):
+                category = rng.choice(ITEM_CATEGORIES)
+                quantity = Decimal(rng.randint(1, 40))
+                unit_price = _money(rng, 5, 400)
+                item = EstimateItem(
+                    estimate=estimate, description=f'{category.title()} for {lead.project_name}',
+                    quantity=quantity, unit_price=unit_price, total_price=quantity * unit_price,
+                    category=category,
+                )
+                item_rows.append(item)
+                if category == 'labor':
+                    labor += item.total_price
+                elif category == 'material':
+                    material += item.total_price
+                estimate.total_amount += item.total_price
+            estimate.labor_cost, estimate.material_cost = labor, material
+            estimate_rows.append(estimate)
+            estimate_stamps.append(stamp_after(stamp))
+        assign_numbers(estimate_rows)
+        Estimate.objects.bulk_create(estimate_rows, batch_size=batch_size)
+        _backdate(Estimate, estimate_rows, estimate_stamps, batch_size)
+        EstimateItem.objects.bulk_create(item_rows, batch_size=batch_size)
+
+        job_rows, job_stamps = [], []
+        for estimate, stamp in zip(estimate_rows, estimate_stamps):
+            if estimate.status != 'accepted':
+                continue
+            start = stamp_after(stamp)
+            job_rows.append(Job(
+                user=user, estimate=estimate, status=_pick(rng, JOB_STATUS_WEIGHTS), start_date=start.date(),
+                end_date=(start + timedelta(days=rng.randint(3, 60))).date(),
+            ))
+            job_stamps.append(start)
+        assign_numbers(job_rows)
+        Job.objects.bulk_create(job_rows, batch_size=batch_size)
+        _backdate(Job, job_rows, job_stamps, batch_size)
+
+        material_rows, invoice_rows, invoice_stamps = [], [], []
+        for job, stamp in zip(job_rows, job_stamps):
+            for _ in range(rng.randint(*materials_per_job)):
+                name, unit = rng.choice(MATERIALS)
+                quantity = Decimal(rng.randint(1, 50))
+                cost_per_unit = _money(rng, 2, 80)
+                material_rows.append(Material(
+                    user=user, job=job, name=name, unit=unit, quantity=quantity,
+                    cost_per_unit=cost_per_unit, total_cost=quantity * cost_per_unit,
+                    supplier=rng.choice(['BuildMart', 'LumberCo', 'TileHouse']),
+                ))
+            if job.status in ('scheduled', 'cancelled'):
+                continue
+            for _ in range(rng.randint(*invoices_per_job)):
+                status = _pick(rng, INVOICE_STATUS_WEIGHTS)
+                issued = stamp_after(stamp)
+                total = _skewed_money(rng, 6000, 250, 120000)
+                invoice_rows.append(Invoice(
+                    user=user, job=job, status=status, total_amount=total,
+                    tax_amount=(total * Decimal('0.08')).quantize(Decimal('0.01')),
+                    paid_amount=total if status == 'paid' else Decimal('0'),
+                    due_date=(issued + timedelta(days=30)).date(),
+                    paid_date=(issued + timedelta(days=rng.randint(1, 45))).date() if status == 'paid' else None,
+                ))
+                invoice_stamps.append(issued)
+        Material.objects.bulk_create(material_rows, batch_size=batch_size)
+        assign_numbers(invoice_rows)
+        Invoice.objects.bulk_create(invoice_rows, batch_size=batch_size)
+        _backdate(Invoice, invoice_rows, invoice_stamps, batch_size)
+
+        payment_rows = []
+        for invoice, stamp in zip(invoice_rows, invoice_stamps):
+            if invoice.status != 'paid':
+                continue
+            amounts = [invoice.total_amount]
+            if rng.random() < split_payment_rate:
+                deposit = (invoice.total_amount / 2).quantize(Decimal('0.01'))
+                amounts = [deposit, invoice.total_amount - deposit]
+            for amount in amounts:
+                payment_rows.append(Payment(
+                    user=user, invoice=invoice, amount=amount,
+                    payment_method=rng.choice(['cash', 'check', 'credit_card', 'bank_transfer']),
+                    payment_date=stamp_after(stamp),
+                ))
+        Payment.objects.bulk_create(payment_rows, batch_size=batch_size)
+
+        # bulk_create() bypasses the model signals that maintain the money
+        # rollups, the summaries and the status history, so fill those in here
+        for job in job_rows:
+            job.material_cost = job.invoiced_total = job.paid_total = Decimal('0')
+        for material in material_rows:
+            material.job.material_cost += material.total_cost
+        for invoice in invoice_rows:
+            if invoice.status != 'cancelled':
+                invoice.job.invoiced_total += invoice.total_amount
+        for payment in payment_rows:
+            job = payment.invoice.job
+            job.paid_total += payment.amount
+            job.estimate.lead.customer.lifetime_value += payment.amount
+        Job.objects.bulk_update(job_rows, Job.ROLLUP_FIELDS, batch_size=batch_size)
+        Customer.objects.bulk_update(customer_rows, Customer.ROLLUP_FIELDS, batch_size=batch_size)
+        rebuild_summaries([user.pk])
+        record_created(lead_rows + estimate_rows + job_rows + invoice_rows, batch_size)
+    bump_versions(user.pk)
+
+    return {
+        'customers': len(customer_rows),
+        'leads': len(lead_rows),
+        'site_visits': len(visit_rows),
+        'estimates': len(estimate_rows),
+        'estimate_items': len(item_rows),
+        'jobs': len(job_rows),
+        'materials': len(material_rows),
+        'invoices': len(invoice_rows),
+        'payments': len(payment_rows),
+    }
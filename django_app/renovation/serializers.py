@@ -0,0 +1,222 @@
+from decimal import Decimal
+
+from django.conf import settings
+from rest_framework import serializers
+
+from .models import (
+    Customer, Lead, SiteVisit, SiteVisitPhoto, Estimate, EstimateItem,
+    Job, Material, Invoice, Payment, StatusSummary, Task
+)
+from .exports import EXPORTS
+
+
+class OwnedRelatedField(serializers.PrimaryKeyRelatedField):
+    """Related field that only accepts records owned by the requesting user"""
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        request = self.context.get('request')
+        if request is None:
+            return queryset.none()
+        return queryset.for_user(request.user).only('pk')
+
+
+class SparseFieldsetMixin:
+    """Restrict the serialized fields with a ``?fields=a,b,c`` query parameter"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = self.requested_fields(self.context)
+        if requested:
+            for name in set(self.fields) - requested:
+                self.fields.pop(name)
+
+    @staticmethod
+    def requested_fields(context):
+        request = context.get('request')
+        if request is None or request.method != 'GET' or 'fields' not in request.query_params:
+            return None
+        return {name.strip() for name in request.query_params['fields'].split(',') if name.strip()}
+
+
+class OwnedModelSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """Base serializer for the per-user renovation models"""
+
+    serializer_related_field = OwnedRelatedField
+    user = serializers.HiddenField(default=serializers.CurrentUserDefault())
+
+
+class CustomerSerializer(OwnedModelSerializer):
+    class Meta:
+        model = Customer
+        fields = [
+            'id', 'user', 'name', 'email', 'phone', 'address', 'city', 'state', 'zip_code',
+            'notes', 'lifetime_value', 'created_at', 'updated_at',
+        ]
+        read_only_fields = ['lifetime_value']
+
+
+class LeadSerializer(OwnedModelSerializer):
+    class Meta:
+        model = Lead
+        fields = [
+            'id', 'user', 'customer', 'project_name', 'description', 'status', 'estimated_value',
+            'created_at', 'updated_at',
+        ]
+
+
+class SiteVisitSerializer(OwnedModelSerializer):
+    class Meta:
+        model = SiteVisit
+        fields = [
+            'id', 'user', 'lead', 'visit_date', 'notes', 'photos_url', 'measurements', 'created_at', 'updated_at',
+        ]
+
+
+class SiteVisitPhotoSerializer(OwnedModelSerializer):
+    url = serializers.ReadOnlyField()
+    thumbnail_url = serializers.ReadOnlyField()
+    large_url = serializers.ReadOnlyField()
+
+    class Meta:
+        model = SiteVisitPhoto
+        fields = [
+            'id', 'user', 'site_visit', 'sha256', 'name', 'size', 'width', 'height', 'variants_ready',
+            'url', 'thumbnail_url', 'large_url', 'created_at', 'updated_at',
+        ]
+
+
+class EstimateItemSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    estimate = OwnedRelatedField(queryset=Estimate.objects.all())
+
+    class Meta:
+        model = EstimateItem
+        fields = [
+            'id', 'estimate', 'description', 'quantity', 'unit_price', 'total_price', 'category',
+            'created_at', 'updated_at',
+        ]
+
+
+class NestedEstimateItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = EstimateItem
+        fields = ['id', 'description', 'quantity', 'unit_price', 'total_price', 'category']
+
+
+class EstimateSerializer(OwnedModelSerializer):
+    items = NestedEstimateItemSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Estimate
+        fields = [
+            'id', 'user', 'lead', 'estimate_number', 'status', 'total_amount', 'labor_cost',
+            'material_cost', 'tax_amount', 'notes', 'valid_until', 'items', 'created_at', 'updated_at',
+        ]
+
+
+class JobSerializer(OwnedModelSerializer):
+    class Meta:
+        model = Job
+        fields = [
+            'id', 'user', 'estimate', 'job_number', 'status', 'start_date', 'end_date',
+            'actual_start_date', 'actual_end_date', 'notes', 'material_cost', 'invoiced_total',
+            'paid_total', 'created_at', 'updated_at',
+        ]
+        read_only_fields = ['material_cost', 'invoiced_total', 'paid_total']
+
+
+class MaterialSerializer(OwnedModelSerializer):
+    class Meta:
+        model = Material
+        fields = [
+            'id', 'user', 'job', 'name', 'quantity', 'unit', 'cost_per_unit', 'total_cost',
+            'supplier', 'delivery_date', 'notes', 'created_at', 'updated_at',
+        ]
+
+
+class InvoiceSerializer(OwnedModelSerializer):
+    class Meta:
+        model = Invoice
+        fields = [
+            'id', 'user', 'job', 'invoice_number', 'status', 'total_amount', 'tax_amount',
+            'paid_amount', 'balance_due', 'due_date', 'paid_date', 'notes', 'created_at', 'updated_at',
+        ]
+        read_only_fields = ['paid_amount', 'balance_due']
+
+
+class PaymentSerializer(OwnedModelSerializer):
+    class Meta:
+        model = Payment
+        fields = [
+            'id', 'user', 'invoice', 'amount', 'payment_method', 'payment_date', 'reference_number',
+            'notes', 'created_at', 'updated_at',
+        ]
+
+
+class TaskSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Task
+        fields = [
+            'id', 'name', 'args', 'status', 'attempts', 'max_attempts', 'result', 'error',
+            'created_at', 'updated_at', 'finished_at',
+        ]
+        read_only_fields = fields
+
+
+class ExportRequestSerializer(serializers.Serializer):
+    export = serializers.ChoiceField(choices=sorted(EXPORTS))
+    since = serializers.DateField(required=False, allow_null=True)
+    until = serializers.DateField(required=False, allow_null=True)
+
+
+class ChangesRequestSerializer(serializers.Serializer):
+    since = serializers.CharField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=settings.RENOVATION_MAX_PAGE_SIZE, required=False)
+
+
+class HistoryRequestSerializer(serializers.Serializer):
+    entity = serializers.ChoiceField(choices=StatusSummary.ENTITY_CHOICES, required=False)
+    since = serializers.DateField(required=False)
+    until = serializers.DateField(required=False)
+
+
+class BulkRowSerializer(serializers.ModelSerializer):
+    """One row of a bulk write; ``id`` selects an existing row to update"""
+
+    id = serializers.UUIDField(required=False)
+    quantity_field = 'quantity'
+    price_field = None
+    total_field = None
+
+    @classmethod
+    def writable_fields(cls):
+        """Model fields a bulk write sets, including the computed total"""
+        return [name for name in cls.Meta.fields if name != 'id']
+
+    def validate(self, attrs):
+        total = attrs[self.quantity_field] * attrs[self.price_field]
+        attrs[self.total_field] = total.quantize(Decimal('0.01'))
+        return attrs
+
+
+class EstimateItemBulkSerializer(BulkRowSerializer):
+    price_field = 'unit_price'
+    total_field = 'total_price'
+
+    class Meta:
+        model = EstimateItem
+        fields = ['id', 'description', 'quantity', 'unit_price', 'total_price', 'category']
+        read_only_fields = ['total_price']
+
+
+class MaterialBulkSerializer(BulkRowSerializer):
+    price_field = 'cost_per_unit'
+    total_field = 'total_cost'
+
+    class Meta:
+        model = Material
+        fields = [
+            'id', 'name', 'quantity', 'unit', 'cost_per_unit', 'total_cost', 'supplier',
+            'delivery_date', 'notes',
+        ]
+        read_only_fields = ['total_cost']
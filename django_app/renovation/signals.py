@@ -0,0 +1,206 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .changes import record_deletion
+from .fragments import bump_versions
+from .history import record_change
+from .instrumentation import install_query_recorder
+from .models import (
+    Customer, Lead, SiteVisit, SiteVisitPhoto, Estimate, EstimateItem, Job, Material, Invoice, Payment
+)
+from .numbering import assign_numbers
+from .reporting import SUMMARY_SOURCES, instance_key, move, stored_key, tracked_fields
+from .rollups import SOURCE_FIELDS, apply, contributions, sources, stored_contributions
+from .stats import invalidate_dashboard
+
+
+connection_created.connect(install_query_recorder, dispatch_uid='renovation_query_recorder')
+
+
+@receiver(pre_save, sender=Estimate)
+@receiver(pre_save, sender=Job)
+@receiver(pre_save, sender=Invoice)
+def assign_document_number(sender, instance, raw=False, **kwargs):
+    """Give an estimate, job or invoice saved without a number the owner's next one"""
+    if not raw:
+        assign_numbers([instance])
+
+
+@receiver([post_save, post_delete], sender=Customer)
+@receiver([post_save, post_delete], sender=Lead)
+@receiver([post_save, post_delete], sender=Job)
+@receiver([post_save, post_delete], sender=Invoice)
+@receiver([post_save, post_delete], sender=Payment)
+def drop_dashboard_cache(sender, instance, **kwargs):
+    """Recompute the owner's dashboard once the change is committed"""
+    user_id = instance.user_id
+    transaction.on_commit(lambda: invalidate_dashboard(user_id))
+
+
+@receiver([post_save, post_delete], sender=Customer)
+@receiver([post_save, post_delete], sender=Lead)
+@receiver([post_save, post_delete], sender=SiteVisit)
+@receiver([post_save, post_delete], sender=SiteVisitPhoto)
+@receiver([post_save, post_delete], sender=Estimate)
+@receiver([post_save, post_delete], sender=EstimateItem)
+@receiver([post_save, post_delete], sender=Job)
+@receiver([post_save, post_delete], sender=Material)
+@receiver([post_save, post_delete], sender=Invoice)
+@receiver([post_save, post_delete], sender=Payment)
+def bump_fragment_version(sender, instance, **kwargs):
+    """Move the owner's cached pages showing this model to a new key once committed"""
+    user_id = _owner_id(instance)
+    if user_id is None:
+        return
+    entity = sender._meta.model_name
+    transaction.on_commit(lambda: bump_versions(user_id, entity))
+
+
+def _owner_id(instance):
+    if not isinstance(instance, EstimateItem):
+        return instance.user_id
+    # Line items are owned through their estimate, which may be gone already
+    if not hasattr(instance, '_owner_id'):
+        if EstimateItem.estimate.is_cached(instance):
+            instance._owner_id = instance.estimate.user_id
+        else:
+            instance._owner_id = Estimate.objects.filter(pk=instance.estimate_id).values_list(
+                'user_id', flat=True
+            ).first()
+    return instance._owner_id
+
+
+@receiver(post_delete, sender=Customer)
+@receiver(post_delete, sender=Lead)
+@receiver(post_delete, sender=SiteVisit)
+@receiver(post_delete, sender=SiteVisitPhoto)
+@receiver(post_delete, sender=Estimate)
+@receiver(post_delete, sender=EstimateItem)
+@receiver(post_delete, sender=Job)
+@receiver(post_delete, sender=Material)
+@receiver(post_delete, sender=Invoice)
+@receiver(post_delete, sender=Payment)
+def leave_tombstone(sender, instance, origin=None, **kwargs):
+    """Tell syncing clients about the deletion through the change feed"""
+    if isinstance(origin, User):
+        # The user's tombstones go with them
+        return
+    user_id = _owner_id(instance)
+    if user_id is not None:
+        record_deletion(instance, user_id)
+
+
+# Status summaries for the reports view. The bucket a record counts towards
+# is remembered when it is loaded, so a save only costs the summary UPDATEs.
+# An amount that is itself a rollup (Invoice.paid_amount) moves without the
+# instance knowing, so those buckets are always read back from the row.
+
+def _rollup_amount_field(model):
+    amount_field = SUMMARY_SOURCES[model][1]
+    return amount_field if amount_field in getattr(model, 'ROLLUP_FIELDS', ()) else None
+
+
+def _previous_key(instance):
+    if hasattr(instance, '_summary_key'):
+        return instance._summary_key
+    key = stored_key(instance)
+    amount_field = _rollup_amount_field(type(instance))
+    if amount_field and key is not None:
+        # save() leaves the rollup alone; keep the instance's copy current
+        setattr(instance, amount_field, key[3])
+    return key
+
+
+@receiver(post_init, sender=Lead)
+@receiver(post_init, sender=Estimate)
+@receiver(post_init, sender=Job)
+@receiver(post_init, sender=Invoice)
+def remember_summary_key(sender, instance, **kwargs):
+    deferred = instance.get_deferred_fields()
+    if not _rollup_amount_field(sender) and not deferred.intersection(tracked_fields(sender)):
+        instance._summary_key = instance_key(instance)
+
+
+@receiver(pre_save, sender=Lead)
+@receiver(pre_save, sender=Estimate)
+@receiver(pre_save, sender=Job)
+@receiver(pre_save, sender=Invoice)
+def capture_summary_key(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance._summary_old = None if instance._state.adding else _previous_key(instance)
+
+
+@receiver(post_save, sender=Lead)
+@receiver(post_save, sender=Estimate)
+@receiver(post_save, sender=Job)
+@receiver(post_save, sender=Invoice)
+def update_status_summary(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    key = instance_key(instance)
+    old_key = instance._summary_old
+    move(SUMMARY_SOURCES[sender][0], old_key, key)
+    if not _rollup_amount_field(sender):
+        instance._summary_key = key
+    # The bucket also tells the status history where the record came from
+    record_change(instance, old_key and old_key[1], instance.status, at=instance.updated_at)
+
+
+@receiver(pre_delete, sender=Lead)
+@receiver(pre_delete, sender=Estimate)
+@receiver(pre_delete, sender=Job)
+@receiver(pre_delete, sender=Invoice)
+def remove_from_status_summary(sender, instance, origin=None, **kwargs):
+    old_key = _previous_key(instance)
+    move(SUMMARY_SOURCES[sender][0], old_key, None)
+    if not isinstance(origin, User):
+        # A deleted user's history goes with them
+        record_change(instance, old_key and old_key[1], None)
+
+
+# Money rollups (renovation.rollups). The fields contributions are computed
+# from are remembered at load time like the summary buckets; each write
+# applies the difference between the contributions before and after it. An
+# invoice's paid_amount has just been read back by capture_summary_key, so
+# both sides carry the same amount and only a move to another job shifts it.
+
+def _previous_contributions(instance):
+    if hasattr(instance, '_rollup_sources'):
+        return contributions(instance, **instance._rollup_sources)
+    return stored_contributions(instance)
+
+
+@receiver(post_init, sender=Payment)
+@receiver(post_init, sender=Material)
+@receiver(post_init, sender=Invoice)
+def remember_contributions(sender, instance, **kwargs):
+    if not instance.get_deferred_fields().intersection(SOURCE_FIELDS[sender]):
+        instance._rollup_sources = sources(instance)
+
+
+@receiver(pre_save, sender=Payment)
+@receiver(pre_save, sender=Material)
+@receiver(pre_save, sender=Invoice)
+def capture_contributions(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance._rollup_old = {} if instance._state.adding else _previous_contributions(instance)
+
+
+@receiver(post_save, sender=Payment)
+@receiver(post_save, sender=Material)
+@receiver(post_save, sender=Invoice)
+def update_rollups(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    apply(instance._rollup_old, contributions(instance))
+    instance._rollup_sources = sources(instance)
+
+
+@receiver(pre_delete, sender=Payment)
+@receiver(pre_delete, sender=Material)
+@receiver(pre_delete, sender=Invoice)
+def remove_from_rollups(sender, instance, **kwargs):
+    apply(_previous_contributions(instance), {})
@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Count, DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .concurrency import gather_queries
+from .models import Customer, Lead, Job, Invoice
+
+DASHBOARD_CACHE_KEY = 'renovation:dashboard:{user_id}'
+
+
+def _per_user(queryset, aggregate, output_field=None):
+    """Correlated scalar subquery computing `aggregate` for the outer user"""
+    subquery = (
+        queryset.filter(user=OuterRef('pk'))
+        .order_by()
+        .values('user')
+        .annotate(value=aggregate)
+        .values('value')
+    )
+    return Coalesce(Subquery(subquery, output_field=output_field), Value(0), output_field=output_field)
+
+
+def dashboard_counters(user):
+    """All dashboard statistics for `user` in a single SELECT"""
+    money = DecimalField(max_digits=12, decimal_places=2)
+    return User.objects.filter(pk=user.pk).values(
+        total_customers=_per_user(Customer.objects.all(), Count('pk')),
+        total_leads=_per_user(Lead.objects.all(), Count('pk')),
+        active_jobs=_per_user(Job.objects.filter(status='in_progress'), Count('pk')),
+        total_revenue=_per_user(Invoice.objects.filter(status='paid'), Sum('paid_amount'), money),
+    ).get()
+
+
+async def aget_dashboard(user):
+    """Dashboard context for `user`, served from the cache when possible.
+
+    The cached entry is dropped by the model signals in renovation.signals
+    whenever one of the underlying tables changes for this user. On a miss
+    the counters and the two recent lists are queried concurrently.
+    """
+    key = DASHBOARD_CACHE_KEY.format(user_id=user.pk)
+    data = await cache.aget(key)
+    if data is None:
+        counters, recent_leads, recent_jobs = await gather_queries(
+            lambda: dashboard_counters(user),
+            lambda: list(Lead.objects.for_user(user).summary()[:5]),
+            lambda: list(Job.objects.for_user(user).summary()[:5]),
+        )
+        data = {**counters, 'recent_leads': recent_leads, 'recent_jobs': recent_jobs}
+        await cache.aset(key, data, settings.RENOVATION_DASHBOARD_CACHE_TIMEOUT)
+    return data
+
+
+def invalidate_dashboard(user_id):
+    cache.delete(DASHBOARD_CACHE_KEY.format(user_id=user_id))
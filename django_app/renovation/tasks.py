@@ -0,0 +1,181 @@
+"""Database-backed queue for work that should not hold up a request.
+
+enqueue() adds a Task row in the caller's transaction, so no worker sees a
+task before the data it needs is committed. The run_workers command claims
+due tasks one at a time. On PostgreSQL it selects candidates with FOR UPDATE
+SKIP LOCKED, so workers never wait on each other. Everywhere the claim is a
+conditional UPDATE that only one worker can win.
+
+A claimed task stays hidden from other workers for its visibility timeout.
+If its worker dies, the task becomes due again once that runs out. A task
+that raises is retried after an exponential backoff until it has run
+max_attempts times, and is then marked failed with the traceback.
+
+Handlers are plain functions registered with @handler. They take the task's
+JSON args as keyword arguments and return a JSON value, stored as the
+task's result.
+"""
+import logging
+import os
+import socket
+import tempfile
+import threading
+import traceback
+from contextlib import nullcontext
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import connections, router, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Task
+from .documents import DOCUMENTS, generate
+from .exports import export_rows, stream_csv
+from .overdue import sweep_overdue
+from .reporting import rebuild_summaries
+from .rollups import reconcile
+from .thumbnails import generate_variants
+
+logger = logging.getLogger(__name__)
+
+HANDLERS = {}
+
+# Due tasks a worker tries to claim before giving up for this poll; others
+# may win the first few when many workers poll at once
+CLAIM_CANDIDATES = 10
+
+
+def handler(name):
+    """Register the decorated function as the handler of tasks called `name`"""
+    def register(func):
+        HANDLERS[name] = func
+        return func
+    return register
+
+
+def enqueue(name, user=None, *, delay=0, max_attempts=3, **args):
+    """Queue a `name` task with keyword `args`, to run after `delay` seconds"""
+    if name not in HANDLERS:
+        raise ValueError(f'Unknown task {name!r}')
+    return Task.objects.create(
+        name=name, user=user, args=args, max_attempts=max_attempts,
+        available_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}'
+
+
+def claim(worker, timeout=None):
+    """The next due task, marked running for `worker`, or None"""
+    if timeout is None:
+        timeout = settings.RENOVATION_TASK_VISIBILITY_TIMEOUT
+    now = timezone.now()
+    using = router.db_for_write(Task)
+    skip_locked = connections[using].features.has_select_for_update_skip_locked
+    # SQLite has no row locks; its conditional UPDATE alone decides the race
+    with transaction.atomic(using=using) if skip_locked else nullcontext():
+        due = Task.objects.using(using).due(now).order_by('available_at')
+        if skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        for pk in due.values_list('pk', flat=True)[:CLAIM_CANDIDATES]:
+            claimed = Task.objects.using(using).due(now).filter(pk=pk).update(
+                status='running', locked_by=worker, attempts=F('attempts') + 1,
+                available_at=now + timedelta(seconds=timeout), updated_at=now,
+            )
+            if claimed:
+                return Task.objects.using(using).get(pk=pk)
+    return None
+
+
+def _record(task, worker, **fields):
+    # Only the worker still holding the claim records the outcome; one whose
+    # visibility timeout ran out has lost the task to another worker
+    return Task.objects.filter(
+        pk=task.pk, status='running', locked_by=worker, attempts=task.attempts,
+    ).update(locked_by='', updated_at=timezone.now(), **fields)
+
+
+def run_task(task, worker):
+    """Run a claimed task and record its outcome; returns True on success"""
+    try:
+        func = HANDLERS.get(task.name)
+        if func is None:
+            raise LookupError(f'No handler for task {task.name!r}')
+        result = func(**task.args)
+    except Exception:
+        now = timezone.now()
+        error = traceback.format_exc()
+        if task.attempts < task.max_attempts:
+            delay = settings.RENOVATION_TASK_RETRY_DELAY * 2 ** (task.attempts - 1)
+            logger.warning('Task %s %s failed, retrying in %ss', task.name, task.pk, delay, exc_info=True)
+            _record(task, worker, status='queued', error=error, available_at=now + timedelta(seconds=delay))
+        else:
+            logger.error('Task %s %s failed for good', task.name, task.pk, exc_info=True)
+            _record(task, worker, status='failed', error=error, finished_at=now)
+        return False
+    _record(task, worker, status='done', result=result, error='', finished_at=timezone.now())
+    return True
+
+
+def run_pending(worker=None, limit=None):
+    """Run due tasks in this thread until none is left; returns how many ran"""
+    worker = worker or worker_name()
+    ran = 0
+    while limit is None or ran < limit:
+        task = claim(worker)
+        if task is None:
+            break
+        run_task(task, worker)
+        ran += 1
+    return ran
+
+
+# Handlers
+@handler('rebuild_summaries')
+def rebuild_summaries_task(user_ids=None):
+    return {'rows': rebuild_summaries(user_ids)}
+
+
+@handler('reconcile_rollups')
+def reconcile_rollups_task(user_ids=None, repair=True):
+    return reconcile(user_ids, repair=repair)
+
+
+@handler('export_csv')
+def export_csv_task(export, user_id, since=None, until=None):
+    """Write an export to the default storage; returns its file name"""
+    since = date.fromisoformat(since) if since else None
+    until = date.fromisoformat(until) if until else None
+    rows = export_rows(export, user_id, since, until)
+    written = -1  # the header is not a data row
+    with tempfile.TemporaryFile() as fh:
+        for line in stream_csv(rows):
+            fh.write(line.encode())
+            written += 1
+        fh.seek(0)
+        name = default_storage.save(f'exports/{user_id}/{export}.csv', File(fh))
+    return {'file': name, 'rows': written}
+
+
+@handler('render_pdfs')
+def render_pdfs_task(kind, pks):
+    """Store the PDFs of the `kind` documents with `pks` ahead of their download"""
+    rendered, current = generate(kind, DOCUMENTS[kind][0].objects.filter(pk__in=pks), processes=1)
+    return {'rendered': rendered, 'current': current}
+
+
+@handler('sweep_overdue')
+def sweep_overdue_task():
+    report = sweep_overdue()
+    return {'invoices': sum(line['count'] for line in report.values()), 'users': len(report)}
+
+
+@handler('photo_variants')
+def photo_variants_task(shas):
+    rendered, failed = generate_variants(shas)
+    return {'rendered': rendered, 'failed': failed}
@@ -0,0 +1,73 @@
+"""Resized WebP copies of site visit photos.
+
+Pages show these variants instead of the originals, which come straight off
+a phone at several megabytes each. Each variant is made once per stored
+image, however many visits it is attached to, and saved next to it under
+the same content hash (SiteVisitPhoto.variant_name).
+
+Decoding and resampling are CPU-bound. generate_variants() renders in the
+calling thread: it runs as the photo_variants task, and run_workers already
+spreads tasks over its threads and processes. JPEGs are decoded at a reduced
+scale close to the largest variant (Image.draft), which is most of the
+saving on a 12 megapixel photo.
+"""
+import io
+import logging
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import router, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import SiteVisitPhoto
+from .fragments import bump_versions
+
+logger = logging.getLogger(__name__)
+
+# Longest side of each variant in pixels, largest first: each is resized
+# from the one before
+PHOTO_VARIANTS = {'large': 1600, 'thumb': 320}
+WEBP_QUALITY = 80
+
+
+def render_variants(sha256, extension):
+    """Write the WebP variants of a stored photo; returns whether it could be read"""
+    longest = max(PHOTO_VARIANTS.values())
+    try:
+        with default_storage.open(SiteVisitPhoto.storage_name(sha256, extension)) as fh, Image.open(fh) as image:
+            image.draft('RGB', (longest, longest))
+            image = ImageOps.exif_transpose(image)
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+            for variant, size in PHOTO_VARIANTS.items():
+                image.thumbnail((size, size), Image.Resampling.LANCZOS)
+                buffer = io.BytesIO()
+                image.save(buffer, 'WEBP', quality=WEBP_QUALITY)
+                name = SiteVisitPhoto.variant_name(sha256, variant)
+                if default_storage.exists(name):
+                    default_storage.delete(name)
+                default_storage.save(name, ContentFile(buffer.getvalue()))
+    except (OSError, Image.DecompressionBombError):
+        logger.warning('Cannot make variants of photo %s', sha256, exc_info=True)
+        return False
+    return True
+
+
+def generate_variants(shas):
+    """Make the variants of the stored photos with these hashes; returns (rendered, failed)"""
+    photos = SiteVisitPhoto.objects.filter(sha256__in=shas, variants_ready=False)
+    pending = sorted(set(photos.values_list('sha256', 'extension')))
+    rendered = [sha256 for sha256, extension in pending if render_variants(sha256, extension)]
+
+    with transaction.atomic(using=router.db_for_write(SiteVisitPhoto)):
+        ready = SiteVisitPhoto.objects.filter(sha256__in=rendered)
+        user_ids = set(ready.values_list('user_id', flat=True))
+        ready.update(variants_ready=True, updated_at=timezone.now())
+
+        def refresh_pages():
+            for user_id in user_ids:
+                bump_versions(user_id, 'sitevisitphoto')
+
+        transaction.on_commit(refresh_pages)
+    return len(rendered), len(pending) - len(rendered)
@@ -1,5 +1,6 @@
-from django.urls import path
+from django.urls import include, path
 from . import views
+from .api import router
 
 urlpatterns = [
     # Authentication
@@ -12,15 +13,20 @@ urlpatterns = [
 
     # Customers
     path('customers/', views.customer_list, name='customer_list'),
+    path('customers/import/', views.customer_import, name='customer_import'),
     path('customers/<uuid:customer_id>/', views.customer_detail, name='customer_detail'),
 
     # Leads
     path('leads/', views.lead_list, name='lead_list'),
     path('leads/<uuid:lead_id>/', views.lead_detail, name='lead_detail'),
 
+    # Site visits
+    path('site-visits/<uuid:visit_id>/photos/', views.site_visit_photos, name='site_visit_photos'),
+
     # Estimates
     path('estimates/', views.estimate_list, name='estimate_list'),
     path('estimates/<uuid:estimate_id>/', views.estimate_detail, name='estimate_detail'),
+    path('estimates/<uuid:estimate_id>/pdf/', views.estimate_pdf, name='estimate_pdf'),
 
     # Jobs
     path('jobs/', views.job_list, name='job_list'),
@@ -29,7 +35,20 @@ urlpatterns = [
     # Invoices
     path('invoices/', views.invoice_list, name='invoice_list'),
     path('invoices/<uuid:invoice_id>/', views.invoice_detail, name='invoice_detail'),
+    path('invoices/<uuid:invoice_id>/pdf/', views.invoice_pdf, name='invoice_pdf'),
 
     # Reports
     path('reports/', views.reports, name='reports'),
+
+    # Search
+    path('search/', views.search, name='search'),
+
+    # Exports
+    path('exports/<str:export>.csv', views.export_csv, name='export_csv'),
+
+    # Metrics
+    path('metrics/', views.metrics, name='metrics'),
+
+    # REST API
+    path('api/', include(router.urls)),
 ]
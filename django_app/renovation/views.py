@@ -1,13 +1,80 @@
+import codecs
+from datetime import date
+
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth import login, authenticate, logout
+from django.template.loader import render_to_string
+from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib import messages
-from django.db.models import Sum, Count
+from django.db import router
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.views.decorators.http import require_POST
 from .models import (
     Profile, Customer, Lead, SiteVisit, Estimate,
     EstimateItem, Job, Material, Invoice, Payment
 )
+from .concurrency import gather_queries
+from .documents import pdf_bytes, versions
+from .exports import EXPORTS, export_rows, stream_csv
+from .fragments import acached_fragment, cached_fragment
+from .imports import IMPORTERS
+from .instrumentation import registry
+from .pagination import paginate_keyset
+from .photos import HashingUploadHandler, add_photos
+from .reporting import monthly_trends, status_breakdowns
+from .routers import use_replica
+from .search import LABELS, SEARCHABLE, asearch
+from .stats import aget_dashboard
+
+
+# Entities whose changes show on each cached page: its own rows, the related
+# names it prints and the rollup totals other rows feed into it
+PAGE_ENTITIES = {
+    'customer_list': ['customer'],
+    'customer_detail': ['customer', 'lead', 'payment'],
+    'lead_list': ['lead', 'customer'],
+    'lead_detail': ['lead', 'customer', 'sitevisit', 'sitevisitphoto', 'estimate'],
+    'estimate_list': ['estimate', 'lead'],
+    'estimate_detail': ['estimate', 'estimateitem', 'lead'],
+    'job_list': ['job'],
+    'job_detail': ['job', 'material', 'invoice', 'payment'],
+    'invoice_list': ['invoice', 'job', 'payment'],
+    'invoice_detail': ['invoice', 'job', 'payment'],
+}
+
+
+def _list_page(request, name, template, queryset, context_name):
+    """A list page whose table is cached per user, data version and query string"""
+    def table():
+        page = paginate_keyset(request, queryset)
+        return render_to_string(f'{template}/list_table.html', {context_name: page.object_list, 'page': page}, request)
+
+    fragment = cached_fragment(request.user, name, PAGE_ENTITIES[name], table, request.GET.urlencode())
+    return render(request, f'{template}/list.html', {'table': fragment})
+
+
+def _detail_page(request, template, fragment):
+    return render(request, f'{template}/detail.html', fragment)
+
+
+def _detail_fragment(request, template, title, context):
+    return {
+        'title': title,
+        'content': render_to_string(f'{template}/detail_content.html', context, request),
+    }
+
+
+async def _auser(request):
+    """The logged-in user, loaded without blocking the event loop"""
+    user = await request.auser()
+    # Templates read request.user; hand them the user already loaded
+    request.user = user
+    return user
 
 
 # Home and Authentication Views
@@ -42,14 +109,13 @@ def login_view(request):
     """User login"""
     if request.method == 'POST':
         form = AuthenticationForm(request, data=request.POST)
+        # Validating the form authenticates the user, running the password
+        # hasher once; the user it found is reused rather than checked again
         if form.is_valid():
-            username = form.cleaned_data.get('username')
-            password = form.cleaned_data.get('password')
-            user = authenticate(username=username, password=password)
-            if user is not None:
-                login(request, user)
-                messages.success(request, f'Welcome back, {username}!')
-                return redirect('dashboard')
+            user = form.get_user()
+            login(request, user)
+            messages.success(request, f'Welcome back, {user.get_username()}!')
+            return redirect('dashboard')
     else:
         form = AuthenticationForm()
     return render(request, 'auth/login.html', {'form': form})
@@ -64,149 +130,314 @@ def logout_view(request):
 
 # Dashboard Views
 @login_required
-def dashboard(request):
+async def dashboard(request):
     """Main dashboard with statistics"""
-    # Get user's data statistics
-    total_customers = Customer.objects.filter(user=request.user).count()
-    total_leads = Lead.objects.filter(user=request.user).count()
-    active_jobs = Job.objects.filter(user=request.user, status='in_progress').count()
-    total_revenue = Invoice.objects.filter(
-        user=request.user,
-        status='paid'
-    ).aggregate(Sum('paid_amount'))['paid_amount__sum'] or 0
-
-    # Recent leads
-    recent_leads = Lead.objects.filter(user=request.user)[:5]
-
-    # Recent jobs
-    recent_jobs = Job.objects.filter(user=request.user)[:5]
-
-    context = {
-        'total_customers': total_customers,
-        'total_leads': total_leads,
-        'active_jobs': active_jobs,
-        'total_revenue': total_revenue,
-        'recent_leads': recent_leads,
-        'recent_jobs': recent_jobs,
-    }
+    context = await aget_dashboard(await _auser(request))
     return render(request, 'dashboard/index.html', context)
 
 
 # Customer Views
 @login_required
+@use_replica
 def customer_list(request):
     """List all customers"""
-    customers = Customer.objects.filter(user=request.user)
-    return render(request, 'customers/list.html', {'customers': customers})
+    queryset = Customer.objects.for_user(request.user).for_list()
+    return _list_page(request, 'customer_list', 'customers', queryset, 'customers')
+
+
+@login_required
+def customer_import(request):
+    """Upload a CSV of customers or leads"""
+    result = None
+    if request.method == 'POST':
+        kind = request.POST.get('kind')
+        upload = request.FILES.get('file')
+        if kind not in IMPORTERS or upload is None:
+            messages.error(request, 'Choose what to import and a CSV file.')
+        else:
+            # Decode the upload line by line instead of reading it whole
+            result = IMPORTERS[kind](request.user).run(codecs.iterdecode(upload, 'utf-8-sig'))
+            messages.success(request, f'Import finished: {result}.')
+    return render(request, 'customers/import.html', {
+        'result': result,
+        'errors': result.errors[:100] if result else [],
+        'kinds': sorted(IMPORTERS),
+    })
 
 
 @login_required
 def customer_detail(request, customer_id):
     """Customer detail view"""
-    customer = get_object_or_404(Customer, id=customer_id, user=request.user)
-    leads = customer.leads.all()
-    return render(request, 'customers/detail.html', {
-        'customer': customer,
-        'leads': leads
-    })
+    def content():
+        customer = get_object_or_404(Customer, id=customer_id, user=request.user)
+        leads = customer.leads.summary()
+        return _detail_fragment(request, 'customers', customer.name, {
+            'customer': customer,
+            'leads': leads
+        })
+
+    fragment = cached_fragment(
+        request.user, 'customer_detail', PAGE_ENTITIES['customer_detail'], content, str(customer_id)
+    )
+    return _detail_page(request, 'customers', fragment)
 
 
 # Lead Views
 @login_required
+@use_replica
 def lead_list(request):
     """List all leads"""
-    leads = Lead.objects.filter(user=request.user)
-    return render(request, 'leads/list.html', {'leads': leads})
+    queryset = Lead.objects.for_user(request.user).for_list()
+    return _list_page(request, 'lead_list', 'leads', queryset, 'leads')
 
 
 @login_required
-def lead_detail(request, lead_id):
+async def lead_detail(request, lead_id):
     """Lead detail view"""
-    lead = get_object_or_404(Lead, id=lead_id, user=request.user)
-    site_visits = lead.site_visits.all()
-    estimates = lead.estimates.all()
-    return render(request, 'leads/detail.html', {
-        'lead': lead,
-        'site_visits': site_visits,
-        'estimates': estimates
-    })
+    user = await _auser(request)
+
+    async def content():
+        lead, site_visits, estimates = await gather_queries(
+            lambda: Lead.objects.for_detail().filter(id=lead_id, user=user).first(),
+            lambda: list(SiteVisit.objects.filter(lead_id=lead_id, user=user).summary().with_photos()),
+            lambda: list(Estimate.objects.filter(lead_id=lead_id, user=user).summary()),
+        )
+        if lead is None:
+            raise Http404('No Lead matches the given query.')
+        fragment = _detail_fragment(request, 'leads', lead.project_name, {
+            'lead': lead,
+            'site_visits': site_visits,
+            'estimates': estimates
+        })
+        # The upload forms carry a CSRF token, so they are rendered outside the cached content
+        fragment['photo_visits'] = [(visit.id, visit.visit_date) for visit in site_visits]
+        return fragment
+
+    fragment = await acached_fragment(user, 'lead_detail', PAGE_ENTITIES['lead_detail'], content, str(lead_id))
+    return _detail_page(request, 'leads', fragment)
+
+
+# Site Visit Views
+@csrf_exempt
+@login_required
+@require_POST
+def site_visit_photos(request, visit_id):
+    """Upload photos to a site visit"""
+    # Uploads are hashed as they stream in. The handlers must be in place
+    # before anything reads request.POST, which the CSRF check does.
+    request.upload_handlers = [HashingUploadHandler(request)]
+    return _site_visit_photos(request, visit_id)
+
+
+@csrf_protect
+def _site_visit_photos(request, visit_id):
+    visit = get_object_or_404(SiteVisit.objects.select_related('user'), id=visit_id, user=request.user)
+    uploads = request.FILES.getlist('photos')
+    if not uploads:
+        messages.error(request, 'Choose one or more photos to upload.')
+    else:
+        result = add_photos(visit, uploads)
+        messages.success(request, f'Photos uploaded: {result}.')
+        for name, error in result.errors[:10]:
+            messages.error(request, f'{name}: {error}')
+    return redirect('lead_detail', lead_id=visit.lead_id)
 
 
 # Estimate Views
 @login_required
+@use_replica
 def estimate_list(request):
     """List all estimates"""
-    estimates = Estimate.objects.filter(user=request.user)
-    return render(request, 'estimates/list.html', {'estimates': estimates})
+    queryset = Estimate.objects.for_user(request.user).for_list()
+    return _list_page(request, 'estimate_list', 'estimates', queryset, 'estimates')
 
 
 @login_required
 def estimate_detail(request, estimate_id):
     """Estimate detail view"""
-    estimate = get_object_or_404(Estimate, id=estimate_id, user=request.user)
-    items = estimate.items.all()
-    return render(request, 'estimates/detail.html', {
-        'estimate': estimate,
-        'items': items
-    })
+    def content():
+        estimate = get_object_or_404(Estimate.objects.for_detail(), id=estimate_id, user=request.user)
+        items = estimate.items.all()
+        return _detail_fragment(request, 'estimates', f'Estimate {estimate.estimate_number}', {
+            'estimate': estimate,
+            'items': items
+        })
+
+    fragment = cached_fragment(
+        request.user, 'estimate_detail', PAGE_ENTITIES['estimate_detail'], content, str(estimate_id)
+    )
+    return _detail_page(request, 'estimates', fragment)
 
 
 # Job Views
 @login_required
+@use_replica
 def job_list(request):
     """List all jobs"""
-    jobs = Job.objects.filter(user=request.user)
-    return render(request, 'jobs/list.html', {'jobs': jobs})
+    queryset = Job.objects.for_user(request.user).for_list()
+    return _list_page(request, 'job_list', 'jobs', queryset, 'jobs')
 
 
 @login_required
-def job_detail(request, job_id):
+async def job_detail(request, job_id):
     """Job detail view"""
-    job = get_object_or_404(Job, id=job_id, user=request.user)
-    materials = job.materials.all()
-    invoices = job.invoices.all()
-    return render(request, 'jobs/detail.html', {
-        'job': job,
-        'materials': materials,
-        'invoices': invoices
-    })
+    user = await _auser(request)
+
+    async def content():
+        job, materials, invoices = await gather_queries(
+            lambda: Job.objects.for_detail().filter(id=job_id, user=user).first(),
+            lambda: list(Material.objects.filter(job_id=job_id, user=user).summary()),
+            lambda: list(Invoice.objects.filter(job_id=job_id, user=user).summary()),
+        )
+        if job is None:
+            raise Http404('No Job matches the given query.')
+        return _detail_fragment(request, 'jobs', f'Job {job.job_number}', {
+            'job': job,
+            'materials': materials,
+            'invoices': invoices
+        })
+
+    fragment = await acached_fragment(user, 'job_detail', PAGE_ENTITIES['job_detail'], content, str(job_id))
+    return _detail_page(request, 'jobs', fragment)
 
 
 # Invoice Views
 @login_required
+@use_replica
 def invoice_list(request):
     """List all invoices"""
-    invoices = Invoice.objects.filter(user=request.user)
-    return render(request, 'invoices/list.html', {'invoices': invoices})
+    queryset = Invoice.objects.for_user(request.user).for_list()
+    return _list_page(request, 'invoice_list', 'invoices', queryset, 'invoices')
 
 
 @login_required
 def invoice_detail(request, invoice_id):
     """Invoice detail view"""
-    invoice = get_object_or_404(Invoice, id=invoice_id, user=request.user)
-    payments = invoice.payments.all()
-    return render(request, 'invoices/detail.html', {
-        'invoice': invoice,
-        'payments': payments
-    })
+    def content():
+        invoice = get_object_or_404(Invoice.objects.for_detail(), id=invoice_id, user=request.user)
+        payments = invoice.payments.summary()
+        return _detail_fragment(request, 'invoices', f'Invoice {invoice.invoice_number}', {
+            'invoice': invoice,
+            'payments': payments
+        })
+
+    fragment = cached_fragment(
+        request.user, 'invoice_detail', PAGE_ENTITIES['invoice_detail'], content, str(invoice_id)
+    )
+    return _detail_page(request, 'invoices', fragment)
 
 
 # Reports View
-@login_required
-def reports(request):
-    """Reports and analytics"""
-    # Lead status breakdown
-    lead_stats = Lead.objects.filter(user=request.user).values('status').annotate(count=Count('id'))
+REPORT_RANGES = [3, 6, 12, 24]
 
-    # Job status breakdown
-    job_stats = Job.objects.filter(user=request.user).values('status').annotate(count=Count('id'))
 
-    # Invoice status breakdown
-    invoice_stats = Invoice.objects.filter(user=request.user).values('status').annotate(count=Count('id'))
+@login_required
+@use_replica
+async def reports(request):
+    """Reports and analytics"""
+    try:
+        months = int(request.GET.get('months', 12))
+    except ValueError:
+        months = 12
+    if months not in REPORT_RANGES:
+        months = 12
+
+    # Status breakdowns and trends come from the materialized summaries
+    user = await _auser(request)
+    breakdowns, trends = await gather_queries(
+        lambda: status_breakdowns(user),
+        lambda: monthly_trends(user, months),
+    )
 
     context = {
-        'lead_stats': lead_stats,
-        'job_stats': job_stats,
-        'invoice_stats': invoice_stats,
+        'lead_stats': breakdowns['lead'],
+        'job_stats': breakdowns['job'],
+        'invoice_stats': breakdowns['invoice'],
+        'monthly_trends': trends,
+        'months': months,
+        'report_ranges': REPORT_RANGES,
     }
     return render(request, 'reports/index.html', context)
+
+
+# Search View
+@login_required
+@use_replica
+async def search(request):
+    """Ranked full-text matches across customers, leads, site visits and estimate items"""
+    user = await _auser(request)
+    query = request.GET.get('q', '').strip()
+    kind = request.GET.get('type')
+    hits = await asearch(user, query, [kind] if kind in SEARCHABLE else None)
+    return render(request, 'search/results.html', {
+        'query': query,
+        'kind': kind if kind in SEARCHABLE else '',
+        'kinds': LABELS.items(),
+        'hits': hits,
+    })
+
+
+# Export Views
+def _parse_day(value):
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        raise Http404('Invalid date.')
+
+
+@login_required
+@use_replica
+def export_csv(request, export):
+    """Stream one of the CSV exports for the current user"""
+    if export not in EXPORTS:
+        raise Http404('Unknown export.')
+    rows = export_rows(
+        export, request.user,
+        since=_parse_day(request.GET.get('since')),
+        until=_parse_day(request.GET.get('until')),
+        # The rows are read while streaming, after the view has returned
+        using=router.db_for_read(EXPORTS[export][0]),
+    )
+    response = StreamingHttpResponse(stream_csv(rows), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{export}.csv"'
+    return response
+
+
+# PDF Views
+def _pdf_response(request, kind, pk):
+    """The stored PDF of a document, or a 304 if the client's copy is current"""
+    version = versions(kind, [pk], request.user).get(pk)
+    if version is None:
+        raise Http404(f'No such {kind}.')
+    etag = quote_etag(version.etag)
+    timestamp = version.last_modified.timestamp()
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = HttpResponse(pdf_bytes(kind, pk, version), content_type='application/pdf')
+        response['Content-Disposition'] = f'inline; filename="{version.filename}"'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(timestamp)
+    # Browsers keep the file but check back each time
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@login_required
+def estimate_pdf(request, estimate_id):
+    """Estimate as a PDF"""
+    return _pdf_response(request, 'estimate', estimate_id)
+
+
+@login_required
+def invoice_pdf(request, invoice_id):
+    """Invoice as a PDF"""
+    return _pdf_response(request, 'invoice', invoice_id)
+
+
+# Metrics View
+@login_required
+def metrics(request):
+    """Per-view request metrics in the Prometheus text format, for staff"""
+    if not request.user.is_staff:
+        raise PermissionDenied
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')